@@ -0,0 +1,248 @@
+import json
+import os
+import warnings
+from typing import Dict, Iterable, List, Optional
+
+from filelock import SoftFileLock
+from wdmtoolbox.wdmtoolbox import WDM as _WDM
+
+from MetUtils import WDM_IO_LOCK
+
+"""
+WDM文件的DSN目录
+1. 目录记录每个DSN的站点(IDLOCN)、时序类型(TSTYPE)等属性，按(站点, 时序类型)建立索引，查询DSN不需要再读WDM文件
+2. 目录保存在WDM文件旁边的索引文件中(wdm路径 + .dsnidx.json)，记录WDM文件的修改时间和大小，
+   两者与WDM文件一致时直接加载，否则重新扫描WDM文件生成
+3. WdmWriteSession和SaveDataToWdm写入DSN后会同步更新目录，后续步骤不需要重新扫描
+"""
+
+CATALOG_SUFFIX = ".dsnidx.json"
+CATALOG_VERSION = 1
+MAX_DSN = 32000
+# 目录中保存的属性：(属性名, 属性序号, 属性类型 1整型/3字符, 长度)
+CATALOG_ATTRS = (
+    ("IDLOCN", 290, 3, 8),
+    ("TSTYPE", 1, 3, 4),
+    ("IDSCEN", 288, 3, 8),
+    ("IDCONS", 289, 3, 8),
+    ("TCODE", 17, 1, 1),
+    ("TSSTEP", 33, 1, 1),
+)
+
+_catalogs = {}
+
+
+def _file_stamp(wdmpath: str) -> list:
+    """WDM文件的修改时间和大小，用来判断目录是否过期"""
+    stat = os.stat(wdmpath)
+    return [stat.st_mtime_ns, stat.st_size]
+
+
+class WdmCatalog:
+    """
+    WDM文件的DSN目录，(站点, 时序类型)到DSN的查询为O(1)。
+    一般通过 get_catalog 获取，同一个WDM文件在进程内共享一个目录。
+    """
+    # wdmtoolbox使用50~58号Fortran单元，WdmWriteSession使用60号
+    # 目录在多线程运行的处理步骤之间共享，修改和遍历都持有WDM_IO_LOCK
+    UNIT = 61
+
+    def __init__(self, wdmpath: str, index_path: str = None):
+        """
+        :param wdmpath: WDM文件路径
+        :param index_path: 索引文件路径，默认为wdm路径 + .dsnidx.json
+        """
+        self.wdmpath = str(wdmpath).strip()
+        self.index_path = index_path or self.wdmpath + CATALOG_SUFFIX
+        self._entries = {}
+        self._by_type = {}
+        self._stamp = None
+
+    def __repr__(self):
+        return f"WdmCatalog({self.wdmpath!r}, dsns={len(self._entries)})"
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, dsn):
+        return int(dsn) in self._entries
+
+    def __iter__(self):
+        return iter(sorted(self._entries))
+
+    @property
+    def is_current(self) -> bool:
+        """目录是否与WDM文件一致"""
+        return self._stamp is not None and os.path.exists(self.wdmpath) and self._stamp == _file_stamp(self.wdmpath)
+
+    def _index(self, dsn: int, attrs: dict):
+        """把一个DSN加入(时序类型, 站点)索引，同一站点同一类型有多个DSN时取编号最大的，与get_stns_dsn一致"""
+        stations = self._by_type.setdefault(attrs["TSTYPE"], {})
+        if stations.get(attrs["IDLOCN"], 0) < dsn:
+            stations[attrs["IDLOCN"]] = dsn
+
+    def _set_entries(self, entries: Dict[int, dict]):
+        self._entries = {}
+        self._by_type = {}
+        for dsn in sorted(entries):
+            self._entries[dsn] = entries[dsn]
+            self._index(dsn, entries[dsn])
+
+    def rebuild(self) -> "WdmCatalog":
+        """打开一次WDM文件扫描所有DSN并读取属性，然后写入索引文件"""
+        entries = {}
+        with WDM_IO_LOCK, SoftFileLock(self.wdmpath + ".lock", timeout=30):
+            messfp = _WDM.wmsgop()
+            wdmfp = _WDM._open(self.wdmpath, self.UNIT, ronwfg=1)
+            try:
+                for dsn in range(1, MAX_DSN + 1):
+                    if _WDM.wdckdt(wdmfp, dsn) == 0:
+                        continue
+                    attrs = {"DSN": dsn}
+                    for name, index, attr_type, length in CATALOG_ATTRS:
+                        if attr_type == 1:
+                            value, retcode = _WDM.wdbsgi(wdmfp, dsn, index, length)
+                            attrs[name] = int(value[0]) if retcode == 0 else None
+                        else:
+                            value, retcode = _WDM.wdbsgc(wdmfp, dsn, index, length)
+                            attrs[name] = b"".join(value).strip().decode("ascii") if retcode == 0 else ""
+                    entries[dsn] = attrs
+            finally:
+                _WDM._close(self.wdmpath)
+            self._stamp = _file_stamp(self.wdmpath)
+            self._set_entries(entries)
+            self.save()
+        return self
+
+    def load(self) -> bool:
+        """
+        从索引文件加载目录
+        :return: 索引文件存在且与WDM文件一致时返回True
+        """
+        if not os.path.exists(self.index_path) or not os.path.exists(self.wdmpath):
+            return False
+        try:
+            with open(self.index_path, "r", encoding="utf-8") as f:
+                index = json.load(f)
+        except (OSError, ValueError):
+            return False
+        if index.get("version") != CATALOG_VERSION or index.get("stamp") != _file_stamp(self.wdmpath):
+            return False
+        self._set_entries({int(attrs["DSN"]): attrs for attrs in index["entries"]})
+        self._stamp = index["stamp"]
+        return True
+
+    def save(self):
+        """写入索引文件，目录不可写时只保留内存中的目录"""
+        index = {"version": CATALOG_VERSION, "stamp": self._stamp,
+                 "entries": [self._entries[dsn] for dsn in sorted(self._entries)]}
+        temp_path = self.index_path + ".tmp"
+        try:
+            with open(temp_path, "w", encoding="utf-8") as f:
+                json.dump(index, f, ensure_ascii=False)
+            os.replace(temp_path, self.index_path)
+        except OSError as e:
+            warnings.warn(f"DSN索引文件写入失败，仅使用内存中的目录: {e}")
+
+    def refresh(self) -> "WdmCatalog":
+        """目录过期时先尝试加载索引文件，仍然过期则重新扫描WDM文件"""
+        with WDM_IO_LOCK:
+            if not self.is_current and not self.load():
+                self.rebuild()
+        return self
+
+    def record(self, dsn: int, attrs: dict):
+        """
+        记录新写入的DSN，覆盖同编号的旧记录。
+        写入完成后需要调用 mark_written 更新文件时间戳并保存索引文件。
+        """
+        dsn = int(dsn)
+        attrs = dict(attrs, DSN=dsn)
+        if dsn in self._entries:
+            self.remove(dsn)
+        self._entries[dsn] = attrs
+        self._index(dsn, attrs)
+
+    def remove(self, dsn: int):
+        """删除一个DSN的记录"""
+        attrs = self._entries.pop(int(dsn), None)
+        if attrs is None:
+            return
+        stations = self._by_type.get(attrs["TSTYPE"], {})
+        if stations.get(attrs["IDLOCN"]) == int(dsn):
+            del stations[attrs["IDLOCN"]]
+            # 同一站点同一类型可能还有其他DSN
+            for other, other_attrs in self._entries.items():
+                if other_attrs["TSTYPE"] == attrs["TSTYPE"] and other_attrs["IDLOCN"] == attrs["IDLOCN"]:
+                    self._index(other, other_attrs)
+
+    def mark_written(self):
+        """WDM文件写入完成后更新时间戳并保存索引文件"""
+        self._stamp = _file_stamp(self.wdmpath)
+        self.save()
+
+    def get(self, dsn: int) -> Optional[dict]:
+        """DSN的属性，不存在时返回None"""
+        return self._entries.get(int(dsn))
+
+    def entries(self) -> List[dict]:
+        """所有DSN的属性，按DSN编号排序，可以直接传给checkStatios和get_stns_dsn"""
+        with WDM_IO_LOCK:
+            return [self._entries[dsn] for dsn in sorted(self._entries)]
+
+    def find(self, location: str, tstype: str) -> Optional[int]:
+        """
+        查询站点某个时序类型的DSN
+        :param location: 站点ID
+        :param tstype: 时序类型
+        :return: DSN，不存在时返回None
+        """
+        return self._by_type.get(tstype, {}).get(str(location))
+
+    def stations_dsn(self, stations: Iterable[str], tstype: str) -> Dict[str, int]:
+        """
+        查询多个站点某个时序类型的DSN，与MetUtils.get_stns_dsn结果一致
+        :param stations: 站点ID
+        :param tstype: 时序类型
+        :return: 站点ID到DSN的字典，没有该类型数据的站点不在字典中
+        """
+        with WDM_IO_LOCK:
+            by_station = self._by_type.get(tstype, {})
+            return {station: by_station[station] for station in map(str, stations) if station in by_station}
+
+    def check_stations(self, stations: Iterable[str], tstype: str):
+        """与MetUtils.checkStatios一致：WDM中有该时序类型但不在stations中的站点会引发ValueError"""
+        stations = set(map(str, stations))
+        with WDM_IO_LOCK:
+            not_in = [station for station in self._by_type.get(tstype, {}) if station not in stations]
+        if not_in:
+            all_stations = [attrs["IDLOCN"] for attrs in self.entries()]
+            raise ValueError(f"{not_in}没有在{all_stations}其中")
+
+
+def get_catalog(wdmpath: str, refresh: bool = True) -> WdmCatalog:
+    """
+    获取WDM文件的DSN目录，同一个文件在进程内共享
+    :param wdmpath: WDM文件路径
+    :param refresh: 是否检查目录是否过期，过期时加载索引文件或重新扫描
+    :return: 目录
+    """
+    key = os.path.abspath(str(wdmpath).strip())
+    with WDM_IO_LOCK:
+        if key not in _catalogs:
+            _catalogs[key] = WdmCatalog(wdmpath)
+        catalog = _catalogs[key]
+    return catalog.refresh() if refresh else catalog
+
+
+def peek_catalog(wdmpath: str) -> Optional[WdmCatalog]:
+    """
+    写入前获取与WDM文件一致的目录，没有时返回None且不扫描WDM文件。
+    写入方在写入后对返回的目录调用record和mark_written。
+    """
+    if not os.path.exists(str(wdmpath).strip()):
+        return None
+    catalog = get_catalog(wdmpath, refresh=False)
+    if catalog.is_current or catalog.load():
+        return catalog
+    return None
@@ -0,0 +1,340 @@
+from typing import Dict, Iterable, List, Union
+
+import numpy as np
+import pandas as pd
+
+from MetReader import iter_station_frames
+
+"""
+多站点数据集
+所有站点共用一个等间隔的时间轴，每个变量是一个 站点数×时刻数 的二维数组，缺测和站点时段以外为NaN。
+站点的元数据(站点ID、纬度、DSN偏移)与数组按行对应。
+1. Metcalalg中的逐日计算(Penman、Hamon、Magnus-Tetens、日照云量)和逐小时分解接受数据集，一次调用处理所有站点
+2. station_values、station_frame 返回单个站点的视图，不复制数据
+3. 由多个来源序列对齐建立时(from_frames、from_variables)，coverage记录每个站点每个时刻是否在所有来源序列中都有记录，
+   来源序列中的NaN是缺测值，coverage为False的时刻是来源序列中没有的日期，两者在计算中可以分别处理
+4. write 按DSN编号规则(基数 + 站点序号 × 20)把变量写入WDM
+"""
+
+# 每种时序类型的DSN基数，第i个站点的DSN为 基数 + i * DSN_STEP，与hspf_met中各步骤一致
+TSTYPE_DSN_BASE = {
+    "PREC": 11, "EVAP": 12, "ATEM": 13, "WIND": 14, "SOLR": 15, "PEVT": 16, "DEWP": 17, "CLOU": 18,
+    "TMAX": 19, "TMIN": 20, "DWND": 21, "DCLO": 22, "DPTP": 23, "DSOL": 24, "DEVT": 25, "DEVP": 26,
+}
+DSN_STEP = 20
+# 时间轴频率对应的WDM时间单位(tcode)
+FREQ_TCODE = {"h": 3, "D": 4}
+
+
+def _regular_times(times: pd.DatetimeIndex) -> pd.DatetimeIndex:
+    """检查时间轴为等间隔，返回带频率的DatetimeIndex"""
+    times = pd.DatetimeIndex(times)
+    if times.freq is not None:
+        return times
+    if len(times) < 2:
+        raise ValueError("只有一个时刻时时间轴需要指定频率，例如pd.date_range(start, periods=1, freq='D')")
+    freq = pd.infer_freq(times)
+    if freq is None:
+        raise ValueError("数据集的时间轴必须是等间隔的")
+    return pd.DatetimeIndex(times, freq=freq)
+
+
+def combine_coverage(*datasets: "MetDataset") -> Union[np.ndarray, None]:
+    """多个数据集的coverage取交集，都没有coverage时为None"""
+    coverages = [dataset.coverage for dataset in datasets if dataset.coverage is not None]
+    if not coverages:
+        return None
+    return np.logical_and.reduce(coverages) if len(coverages) > 1 else coverages[0]
+
+
+class MetDataset:
+    """
+    多站点数据集，变量为 站点数×时刻数 的数组。
+    用法:
+        ds = MetDataset.from_cma("data/temp.csv", stations, {"TMAX": "f9", "TMIN": "f10"}, invalid_value=32766,
+                                 scale=0.1, latitudes=stns_2_letdeg)
+        devt = PanEvaporationValueComputedByHamon(ds, ds, False, None)   # 所有站点的DEVT，纬度使用ds.latitudes
+        atem = DisTemp(ds, ds, 24)                                       # 所有站点的逐小时温度
+        atem.station_frame("59843")
+    """
+
+    def __init__(self, times: pd.DatetimeIndex, stations: Iterable, data: Dict[str, np.ndarray] = None,
+                 latitudes: Union[Dict[str, float], Iterable[float]] = None, dsn_offsets: Iterable[int] = None,
+                 coverage: np.ndarray = None):
+        """
+        :param times: 等间隔的时间轴
+        :param stations: 站点ID
+        :param data: 变量名到 站点数×时刻数 数组的字典，数组不复制
+        :param latitudes: 站点纬度(十进制角度)，字典或与stations等长的数组，没有的站点为NaN
+        :param dsn_offsets: 每个站点的DSN偏移，默认第i个站点为 i * DSN_STEP
+        :param coverage: 站点数×时刻数的布尔数组，各时刻是否在所有来源序列中都有记录，为None时所有时刻都有记录
+        """
+        self.times = _regular_times(times)
+        self.stations = [str(station).strip() for station in stations]
+        self._positions = {station: i for i, station in enumerate(self.stations)}
+        if len(self._positions) != len(self.stations):
+            raise ValueError(f"站点ID重复: {self.stations}")
+        n = len(self.stations)
+        if latitudes is None:
+            self.latitudes = np.full(n, np.nan)
+        elif isinstance(latitudes, dict):
+            lookup = {str(station).strip(): lat for station, lat in latitudes.items()}
+            self.latitudes = np.array([lookup.get(station, np.nan) for station in self.stations], dtype="float64")
+        else:
+            self.latitudes = np.asarray(latitudes, dtype="float64")
+        if dsn_offsets is None:
+            self.dsn_offsets = np.arange(n, dtype=np.int64) * DSN_STEP
+        else:
+            self.dsn_offsets = np.asarray(dsn_offsets, dtype=np.int64)
+        if self.latitudes.shape != (n,) or self.dsn_offsets.shape != (n,):
+            raise ValueError(f"纬度和DSN偏移的个数必须与站点数{n}相同")
+        if coverage is not None:
+            coverage = np.asarray(coverage, dtype=bool)
+            if coverage.shape != self.shape:
+                raise ValueError(f"coverage的形状{coverage.shape}与数据集{self.shape}不一致")
+        self.coverage = coverage
+        self._data = {}
+        for name, values in (data or {}).items():
+            self[name] = values
+
+    def __repr__(self):
+        return (f"MetDataset(stations={len(self.stations)}, times={len(self.times)}, freq={self.freq!r}, "
+                f"variables={self.variables})")
+
+    def __len__(self):
+        return len(self.stations)
+
+    def __contains__(self, name):
+        return name in self._data
+
+    def __getitem__(self, name: str) -> np.ndarray:
+        """变量的 站点数×时刻数 数组"""
+        if name not in self._data:
+            raise KeyError(f"数据集中没有变量{name}，可选: {', '.join(self._data)}")
+        return self._data[name]
+
+    def __setitem__(self, name: str, values):
+        values = np.asarray(values)
+        if values.shape != self.shape:
+            raise ValueError(f"变量{name}的形状{values.shape}与数据集{self.shape}不一致")
+        self._data[name] = values
+
+    @property
+    def variables(self) -> List[str]:
+        return list(self._data)
+
+    @property
+    def shape(self) -> tuple:
+        """(站点数, 时刻数)"""
+        return len(self.stations), len(self.times)
+
+    @property
+    def freq(self) -> str:
+        return self.times.freqstr
+
+    @property
+    def tcode(self) -> int:
+        """时间轴对应的WDM时间单位，3为小时，4为天"""
+        if self.freq not in FREQ_TCODE:
+            raise ValueError(f"时间轴频率{self.freq}没有对应的WDM时间单位，可选: {', '.join(FREQ_TCODE)}")
+        return FREQ_TCODE[self.freq]
+
+    @property
+    def nbytes(self) -> int:
+        return sum(values.nbytes for values in self._data.values())
+
+    def station_index(self, station) -> int:
+        """站点在数组中的行号"""
+        station = str(station).strip()
+        if station not in self._positions:
+            raise KeyError(f"数据集中没有站点{station}")
+        return self._positions[station]
+
+    def latitude(self, station) -> float:
+        return float(self.latitudes[self.station_index(station)])
+
+    def dsn(self, station, tstype: str) -> int:
+        """
+        站点某个时序类型的DSN：TSTYPE_DSN_BASE中的基数 + 站点的DSN偏移
+        :param station: 站点ID
+        :param tstype: 时序类型
+        """
+        if tstype not in TSTYPE_DSN_BASE:
+            raise ValueError(f"时序类型{tstype}没有DSN基数，可选: {', '.join(TSTYPE_DSN_BASE)}")
+        return int(TSTYPE_DSN_BASE[tstype] + self.dsn_offsets[self.station_index(station)])
+
+    def station_values(self, name: str, station) -> np.ndarray:
+        """单个站点一个变量的一维视图，不复制数据"""
+        return self[name][self.station_index(station)]
+
+    def station_frame(self, station, variables: Iterable[str] = None) -> pd.DataFrame:
+        """
+        单个站点的DataFrame，列为变量，索引为时间轴，各列直接使用数组中的行，不复制数据
+        :param station: 站点ID
+        :param variables: 变量名，为None时为所有变量
+        """
+        i = self.station_index(station)
+        variables = self.variables if variables is None else list(variables)
+        return pd.DataFrame({name: self[name][i] for name in variables}, index=self.times, copy=False)
+
+    def iter_stations(self, variables: Iterable[str] = None):
+        """依次返回(站点ID, 站点的DataFrame)"""
+        for station in self.stations:
+            yield station, self.station_frame(station, variables)
+
+    def derive(self, data: Dict[str, np.ndarray], times: pd.DatetimeIndex = None) -> "MetDataset":
+        """
+        站点和元数据相同的新数据集，用于保存计算结果
+        :param data: 变量名到数组的字典
+        :param times: 时间轴，为None时与当前数据集相同(同时保留coverage)，例如逐小时分解结果为逐小时时间轴
+        """
+        if times is None:
+            return MetDataset(self.times, self.stations, data, latitudes=self.latitudes, dsn_offsets=self.dsn_offsets,
+                              coverage=self.coverage)
+        return MetDataset(times, self.stations, data, latitudes=self.latitudes, dsn_offsets=self.dsn_offsets)
+
+    def merge(self, other: "MetDataset") -> "MetDataset":
+        """合并另一个数据集的变量，站点和时间轴必须相同，同名变量使用other中的，coverage取两者都有记录的时刻"""
+        if other.stations != self.stations or not other.times.equals(self.times):
+            raise ValueError("合并的数据集必须有相同的站点和时间轴")
+        merged = self.derive({**self._data, **other._data})
+        merged.coverage = combine_coverage(self, other)
+        return merged
+
+    def select(self, stations: Iterable) -> "MetDataset":
+        """部分站点组成的新数据集，站点按给定顺序排列，DSN偏移保持不变"""
+        rows = np.array([self.station_index(station) for station in stations], dtype=np.int64)
+        return MetDataset(self.times, [self.stations[i] for i in rows], {name: values[rows] for name, values in
+                                                                          self._data.items()},
+                          latitudes=self.latitudes[rows], dsn_offsets=self.dsn_offsets[rows],
+                          coverage=None if self.coverage is None else self.coverage[rows])
+
+    def station_coverage(self, station) -> np.ndarray:
+        """站点各时刻是否在所有来源序列中都有记录"""
+        if self.coverage is None:
+            return np.ones(len(self.times), dtype=bool)
+        return self.coverage[self.station_index(station)]
+
+    def require_latitudes(self) -> np.ndarray:
+        """所有站点的纬度，有站点没有纬度时引发ValueError"""
+        missing = [station for station, lat in zip(self.stations, self.latitudes) if np.isnan(lat)]
+        if missing:
+            raise ValueError(f"站点{missing}没有纬度")
+        return self.latitudes
+
+    def write(self, wdmpath: str, variables: Iterable[str] = None, scenario: str = "OBSERVED",
+              session=None, description: str = None):
+        """
+        把变量写入WDM文件，DSN见dsn，时间单位由时间轴决定。每个站点开头和结尾的NaN不写入，中间的NaN写入TSFILL。
+        :param wdmpath: WDM文件路径
+        :param variables: 变量名，即时序类型，为None时为所有变量
+        :param scenario: 场景
+        :param session: WDM写入会话，为None时新建一个并在写入完成后提交
+        :param description: 数据描述
+        """
+        from MetSave import WdmWriteSession
+
+        own_session = session is None
+        session = WdmWriteSession(wdmpath) if own_session else session
+        for name in (self.variables if variables is None else list(variables)):
+            values = self[name]
+            for i, station in enumerate(self.stations):
+                if np.isnan(values[i]).all():
+                    continue
+                frame = pd.DataFrame({name: values[i]}, index=self.times, copy=False)
+                session.add(frame, name, self.dsn(station, name), station, self.tcode, scenario=scenario,
+                            description=description)
+        if own_session:
+            session.flush()
+
+    @classmethod
+    def from_variables(cls, variables: Dict[str, Dict[str, Union[pd.Series, pd.DataFrame]]], stations: List[str] = None,
+                       freq: str = "D", latitudes: Dict[str, float] = None, dsn_offsets: Iterable[int] = None,
+                       dtype=np.float64) -> "MetDataset":
+        """
+        由每个变量、每个站点的序列(索引为时间)按日期对齐建立数据集。
+        时间轴从所有序列最早的时刻到最晚的时刻，序列中没有的日期为NaN，coverage为站点在所有变量中都有记录的时刻。
+        用法:
+            ds = MetDataset.from_variables({"TMIN": {"59843": tmin, ...}, "TMAX": {"59843": tmax, ...}})
+        :param variables: 变量名到 站点ID到序列的字典 的字典，DataFrame使用第一列
+        :param stations: 站点列表，为None时按第一个变量中站点的顺序
+        :param freq: 时间轴频率
+        :param latitudes: 站点纬度
+        :param dsn_offsets: 每个站点的DSN偏移，默认第i个站点为 i * DSN_STEP
+        :param dtype: 数组的数据类型
+        """
+        if stations is None:
+            stations = list(next(iter(variables.values()))) if variables else []
+        indexes = [series.index for by_station in variables.values() for series in by_station.values() if len(series)]
+        if not indexes:
+            raise ValueError("所有站点都没有数据")
+        times = pd.date_range(min(index.min() for index in indexes), max(index.max() for index in indexes), freq=freq)
+        shape = (len(stations), len(times))
+        data = {name: np.full(shape, np.nan, dtype=dtype) for name in variables}
+        coverage = np.ones(shape, dtype=bool)
+        for name, by_station in variables.items():
+            present = np.zeros(shape, dtype=bool)
+            for i, station in enumerate(stations):
+                series = by_station.get(station)
+                if series is None or not len(series):
+                    continue
+                positions = times.get_indexer(series.index)
+                if (positions < 0).any():
+                    raise ValueError(f"站点{station}的{name}时间不在频率为{freq}的时间轴上")
+                values = series.iloc[:, 0] if isinstance(series, pd.DataFrame) else series
+                data[name][i, positions] = values.to_numpy(dtype=dtype)
+                present[i, positions] = True
+            coverage &= present
+        return cls(times, stations, data, latitudes=latitudes, dsn_offsets=dsn_offsets, coverage=coverage)
+
+    @classmethod
+    def from_frames(cls, frames: Dict[str, pd.DataFrame], columns: Union[Dict[str, str], Iterable[str]] = None,
+                    freq: str = "D", latitudes: Dict[str, float] = None, dtype=np.float64) -> "MetDataset":
+        """
+        由每个站点的DataFrame(索引为时间)建立数据集，时间轴从所有站点最早的时刻到最晚的时刻
+        :param frames: 站点ID到DataFrame的字典，按字典顺序排列站点
+        :param columns: 变量名到列名的字典，或列名列表(变量名与列名相同)，为None时使用第一个站点的所有列
+        :param freq: 时间轴频率
+        :param latitudes: 站点纬度
+        :param dtype: 数组的数据类型
+        """
+        if columns is None:
+            columns = list(next(iter(frames.values())).columns) if frames else []
+        if not isinstance(columns, dict):
+            columns = {column: column for column in columns}
+        variables = {name: {station: frame[column] for station, frame in frames.items() if len(frame)}
+                     for name, column in columns.items()}
+        return cls.from_variables(variables, list(frames), freq=freq, latitudes=latitudes, dtype=dtype)
+
+    @classmethod
+    def from_cma(cls, inputfile: str, stations: List[str], columns: Dict[str, str], invalid_value=None,
+                 scale: Union[float, Dict[str, float]] = 1.0, latitudes: Dict[str, float] = None,
+                 dtype=np.float64, **kwargs) -> "MetDataset":
+        """
+        读取CMA格式(f1..f10)的逐日数据文件，逐个站点读取后放入数组，同一时间只在内存中保留一个站点的原始数据
+        :param inputfile: 输入文件路径
+        :param stations: 站点列表
+        :param columns: 变量名到数据列的字典，例如{"TMAX": "f9", "TMIN": "f10"}
+        :param invalid_value: 无效值，替换为NaN
+        :param scale: 缩放系数，或变量名到缩放系数的字典
+        :param latitudes: 站点纬度
+        :param dtype: 数组的数据类型
+        :param kwargs: 传给MetReader.iter_station_frames的其他参数，例如year_col、cache_dir
+        """
+        year_col, month_col, day_col = (kwargs.get(name, default) for name, default in
+                                        (("year_col", "f5"), ("month_col", "f6"), ("day_col", "f7")))
+        frames = {}
+        for station, frame in iter_station_frames(inputfile, stations, data_cols=list(set(columns.values())),
+                                                  invalid_value=invalid_value, **kwargs):
+            if len(frame):
+                dates = pd.to_datetime(pd.DataFrame({"year": frame[year_col], "month": frame[month_col],
+                                                     "day": frame[day_col]}))
+                frame = frame.set_axis(pd.DatetimeIndex(dates))
+                frame = frame[~frame.index.duplicated(keep="last")]
+            frames[station] = frame
+        dataset = cls.from_frames(frames, columns, freq="D", latitudes=latitudes, dtype=dtype)
+        for name in columns:
+            factor = scale.get(name, 1.0) if isinstance(scale, dict) else scale
+            if factor != 1.0:
+                dataset[name] *= factor
+        return dataset
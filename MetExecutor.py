@@ -0,0 +1,222 @@
+import os
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from typing import Callable, Iterable, Iterator, List, Union
+
+import numpy as np
+import pandas as pd
+
+try:
+    import dill
+except ImportError:  # dill为可选依赖，没有时进程执行器只能处理可被pickle的函数
+    dill = None
+
+"""
+并行执行器
+1. serial：当前进程中顺序执行，默认执行器
+2. thread：线程池，适合numpy等会释放GIL的计算
+3. process：进程池，函数使用dill序列化，可以传入闭包和lambda
+执行器在第一次使用时才创建工作线程或进程，导入模块时不会启动任何工作者。
+默认执行器可以通过 set_default_executor 或环境变量 HSPF_MET_EXECUTOR、HSPF_MET_WORKERS 设置。
+"""
+
+EXECUTOR_KINDS = ("serial", "thread", "process")
+ENV_EXECUTOR = "HSPF_MET_EXECUTOR"
+ENV_WORKERS = "HSPF_MET_WORKERS"
+
+_default_executor = None
+_named_executors = {}
+
+
+def _apply_rows(func: Callable, chunk: pd.DataFrame):
+    """对一块数据逐行调用函数"""
+    return chunk.apply(func, axis=1)
+
+
+def _run_pickled(payload: bytes):
+    """在工作进程中反序列化并执行任务"""
+    func, args = dill.loads(payload)
+    return func(*args)
+
+
+class MetExecutor:
+    """
+    执行器基类，顺序执行。子类只需要实现 _submit_one 和 _create_pool。
+    """
+    kind = "serial"
+
+    def __init__(self, workers: int = None):
+        """
+        :param workers: 工作者数量，为None时使用CPU核数
+        """
+        self.workers = max(1, int(workers)) if workers else (os.cpu_count() or 1)
+        self._pool = None
+
+    def __repr__(self):
+        return f"{type(self).__name__}(workers={self.workers})"
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.shutdown()
+
+    @property
+    def pool(self):
+        """工作池，第一次访问时创建"""
+        if self._pool is None:
+            self._pool = self._create_pool()
+        return self._pool
+
+    def _create_pool(self):
+        return None
+
+    def _submit_one(self, func: Callable, args: tuple):
+        """提交一个任务，返回Future，顺序执行的执行器不会调用"""
+        raise NotImplementedError
+
+    def _submit_all(self, func: Callable, args_list: List[tuple]):
+        if self.kind == "serial":
+            return [func(*args) for args in args_list]
+        futures = [self._submit_one(func, args) for args in args_list]
+        return [future.result() for future in futures]
+
+    def starmap(self, func: Callable, args_list: Iterable[tuple]) -> list:
+        """
+        对每组参数调用函数，结果顺序与参数顺序一致
+        :param func: 函数
+        :param args_list: 参数元组列表
+        :return: 结果列表
+        """
+        args_list = list(args_list)
+        if len(args_list) <= 1 or self.workers == 1:
+            return [func(*args) for args in args_list]
+        return self._submit_all(func, args_list)
+
+    def istarmap(self, func: Callable, args_iter: Iterable[tuple], window: int = None) -> Iterator:
+        """
+        与starmap相同，但参数按需读取、结果逐个返回，顺序与参数顺序一致。
+        最多同时提交window个任务，参数或结果较大(例如逐站点的数据)时内存占用有上限。
+        :param func: 函数
+        :param args_iter: 参数元组的可迭代对象，可以是生成器
+        :param window: 同时提交的任务数，为None时为工作者数量的2倍
+        :return: 结果的迭代器
+        """
+        if self.kind == "serial" or self.workers == 1:
+            for args in args_iter:
+                yield func(*args)
+            return
+        window = max(1, int(window)) if window else 2 * self.workers
+        futures = deque()
+        for args in args_iter:
+            futures.append(self._submit_one(func, args))
+            if len(futures) >= window:
+                yield futures.popleft().result()
+        while futures:
+            yield futures.popleft().result()
+
+    def map(self, func: Callable, iterable: Iterable) -> list:
+        """对每个元素调用函数，结果顺序与输入顺序一致"""
+        return self.starmap(func, [(item,) for item in iterable])
+
+    def apply_rows(self, df: pd.DataFrame, func: Callable) -> pd.Series:
+        """
+        逐行调用函数，替代 DataFrame.parallel_apply(func, axis=1)。
+        数据按工作者数量分块，每块在一个工作者中执行。
+        :param df: 数据
+        :param func: 以行为参数的函数
+        :return: 与df索引一致的Series
+        """
+        if self.workers == 1 or len(df) < 2 * self.workers:
+            return df.apply(func, axis=1)
+        bounds = np.linspace(0, len(df), self.workers + 1).astype(int)
+        chunks = [df.iloc[start:end] for start, end in zip(bounds[:-1], bounds[1:]) if end > start]
+        return pd.concat(self.starmap(_apply_rows, [(func, chunk) for chunk in chunks]))
+
+    def shutdown(self):
+        """关闭工作池，之后再次使用时会重新创建"""
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+
+
+class SerialExecutor(MetExecutor):
+    """顺序执行"""
+    kind = "serial"
+
+    def __init__(self, workers: int = None):
+        super().__init__(1)
+
+
+class ThreadExecutor(MetExecutor):
+    """线程池执行"""
+    kind = "thread"
+
+    def _create_pool(self):
+        return ThreadPoolExecutor(max_workers=self.workers)
+
+    def _submit_one(self, func: Callable, args: tuple):
+        return self.pool.submit(func, *args)
+
+
+class ProcessExecutor(MetExecutor):
+    """进程池执行，有dill时函数和参数使用dill序列化"""
+    kind = "process"
+
+    def _create_pool(self):
+        return ProcessPoolExecutor(max_workers=self.workers)
+
+    def _submit_one(self, func: Callable, args: tuple):
+        if dill is not None:
+            return self.pool.submit(_run_pickled, dill.dumps((func, args)))
+        return self.pool.submit(func, *args)
+
+
+_EXECUTOR_CLASSES = {cls.kind: cls for cls in (SerialExecutor, ThreadExecutor, ProcessExecutor)}
+
+
+def create_executor(kind: str = "serial", workers: int = None) -> MetExecutor:
+    """
+    创建执行器
+    :param kind: serial、thread或process
+    :param workers: 工作者数量，为None时使用CPU核数
+    :return: 执行器
+    """
+    if kind not in _EXECUTOR_CLASSES:
+        raise ValueError(f"不支持的执行器类型{kind}，可选: {', '.join(EXECUTOR_KINDS)}")
+    return _EXECUTOR_CLASSES[kind](workers)
+
+
+def set_default_executor(executor: Union[MetExecutor, str, None], workers: int = None):
+    """
+    设置默认执行器，原默认执行器会被关闭
+    :param executor: 执行器或执行器类型，为None时恢复为根据环境变量创建
+    :param workers: 工作者数量，executor为类型时有效
+    """
+    global _default_executor
+    if _default_executor is not None and _default_executor is not executor:
+        _default_executor.shutdown()
+    if isinstance(executor, str):
+        executor = create_executor(executor, workers)
+    _default_executor = executor
+
+
+def get_executor(executor: Union[MetExecutor, str, None] = None) -> MetExecutor:
+    """
+    获取执行器
+    :param executor: 执行器、执行器类型或None。为类型时返回该类型的共享执行器，
+                     为None时返回默认执行器，都在第一次使用时创建
+    :return: 执行器
+    """
+    global _default_executor
+    if isinstance(executor, MetExecutor):
+        return executor
+    if isinstance(executor, str):
+        if executor not in _named_executors:
+            _named_executors[executor] = create_executor(executor)
+        return _named_executors[executor]
+    if _default_executor is None:
+        workers = os.environ.get(ENV_WORKERS)
+        _default_executor = create_executor(os.environ.get(ENV_EXECUTOR, "serial"),
+                                            int(workers) if workers else None)
+    return _default_executor
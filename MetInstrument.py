@@ -0,0 +1,359 @@
+import contextlib
+import cProfile
+import json
+import logging
+import os
+import pstats
+import threading
+import time
+import tracemalloc
+from datetime import datetime
+from typing import Callable, Iterable, List, Union
+
+try:
+    import resource
+except ImportError:  # Windows没有resource模块，此时不记录峰值内存
+    resource = None
+
+"""
+处理过程的计时和内存记录
+1. span 记录一段处理(步骤、站点、批量计算、输入、WDM读写)的用时和进程峰值内存，生成结构化记录
+   {kind, stage, station, dsn, rows, bytes, seconds, peak_rss_mb, ...}，发送到可替换的输出(sink)：
+   JSON lines文件、logging模块或内存中的列表
+2. 步骤内的记录自动带上所在步骤的名称，可以按步骤汇总读取、计算和写入各自的用时
+3. 可以对单个步骤启用cProfile或tracemalloc，结果保存在profile_dir中
+4. echo 代替处理过程中的print，set_quiet(True)或环境变量 HSPF_MET_QUIET=1 时不输出
+默认不启用记录，通过 set_default_instrument 或环境变量 HSPF_MET_TRACE(JSON lines文件路径)启用，
+HSPF_MET_PROFILE 为需要分析的步骤名称，HSPF_MET_PROFILE_MODE 为 cprofile(默认) 或 tracemalloc。
+"""
+
+ENV_QUIET = "HSPF_MET_QUIET"
+ENV_TRACE = "HSPF_MET_TRACE"
+ENV_PROFILE = "HSPF_MET_PROFILE"
+ENV_PROFILE_MODE = "HSPF_MET_PROFILE_MODE"
+PROFILE_MODES = ("cprofile", "tracemalloc")
+# 分析结果文本中列出的函数或代码行数
+PROFILE_TOP = 30
+
+_quiet = None
+_default_instrument = None
+_context = threading.local()
+_END = object()
+
+
+# ============================输出控制==================================
+def set_quiet(quiet: bool = True):
+    """
+    关闭或恢复处理过程的输出，同时设置环境变量，进程池中的工作进程也不再输出
+    :param quiet: 为True时echo不输出
+    """
+    global _quiet
+    _quiet = bool(quiet)
+    os.environ[ENV_QUIET] = "1" if quiet else ""
+
+
+def is_quiet() -> bool:
+    if _quiet is None:
+        return os.environ.get(ENV_QUIET, "").strip().lower() not in ("", "0", "false", "no")
+    return _quiet
+
+
+def echo(*args, **kwargs):
+    """处理过程的输出，参数与print一致，set_quiet(True)后不输出"""
+    if not is_quiet():
+        print(*args, **kwargs)
+
+
+# ============================记录输出==================================
+class RecordSink:
+    """记录的输出，子类实现emit"""
+
+    def emit(self, record: dict):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class MemorySink(RecordSink):
+    """把记录保存在内存中的列表里，用于测试和运行结束后汇总"""
+
+    def __init__(self):
+        self.records = []
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.records)
+
+    def emit(self, record: dict):
+        with self._lock:
+            self.records.append(record)
+
+    def select(self, kind: str = None, **fields) -> List[dict]:
+        """
+        按类型和字段筛选记录
+        :param kind: 记录类型，例如"stage"、"station"、"wdm_write"，为None时不筛选
+        :param fields: 字段取值，例如stage="ATEM"
+        """
+        with self._lock:
+            records = list(self.records)
+        return [record for record in records if (kind is None or record["kind"] == kind)
+                and all(record.get(name) == value for name, value in fields.items())]
+
+    def summary(self) -> dict:
+        """
+        按步骤和记录类型汇总用时、行数和字节数
+        :return: {步骤: {类型: {"count", "seconds", "rows", "bytes"}}}
+        """
+        result = {}
+        for record in self.select():
+            total = result.setdefault(record.get("stage"), {}).setdefault(
+                record["kind"], {"count": 0, "seconds": 0.0, "rows": 0, "bytes": 0})
+            total["count"] += 1
+            total["seconds"] += record.get("seconds") or 0.0
+            total["rows"] += record.get("rows") or 0
+            total["bytes"] += record.get("bytes") or 0
+        return result
+
+
+class JsonLinesSink(RecordSink):
+    """每条记录写为JSON文件中的一行，每次写入后立即刷新，运行中断时已有的记录不会丢失"""
+
+    def __init__(self, path: str, mode: str = "a"):
+        """
+        :param path: 文件路径
+        :param mode: "a"追加到已有文件，"w"清空已有文件
+        """
+        self.path = path
+        self._lock = threading.Lock()
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._file = open(path, mode, encoding="utf-8")
+
+    def __repr__(self):
+        return f"JsonLinesSink({self.path!r})"
+
+    def emit(self, record: dict):
+        line = json.dumps(record, ensure_ascii=False, default=str)
+        with self._lock:
+            self._file.write(line + "\n")
+            self._file.flush()
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+
+class LoggingSink(RecordSink):
+    """把记录写入logging模块，记录作为extra中的met_record传给处理器，消息为JSON文本"""
+
+    def __init__(self, logger: Union[logging.Logger, str] = "hspf_met", level: int = logging.INFO):
+        self.logger = logging.getLogger(logger) if isinstance(logger, str) else logger
+        self.level = level
+
+    def emit(self, record: dict):
+        self.logger.log(self.level, json.dumps(record, ensure_ascii=False, default=str),
+                        extra={"met_record": record})
+
+
+# ============================计时和内存==================================
+def peak_rss_mb() -> Union[float, None]:
+    """进程的峰值常驻内存(MB)，不支持时返回None"""
+    if resource is None:
+        return None
+    # Linux上ru_maxrss的单位为KB
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+
+
+def current_stage() -> Union[str, None]:
+    """当前线程所在的步骤名称"""
+    return getattr(_context, "stage", None)
+
+
+class Instrument:
+    """
+    处理过程的记录器。
+    用法:
+        sink = MemorySink()
+        set_default_instrument(Instrument([sink, JsonLinesSink("data/trace.jsonl")], profile="ATEM"))
+        pipeline.run()
+        print(sink.summary())
+    """
+
+    def __init__(self, sinks: Iterable[RecordSink] = (), profile: str = None, profile_mode: str = "cprofile",
+                 profile_dir: str = "."):
+        """
+        :param sinks: 记录的输出
+        :param profile: 需要分析的步骤名称，为None时不分析。tracemalloc会统计所有线程的内存分配，分析时最好以workers=1运行
+        :param profile_mode: cprofile 分析函数用时，tracemalloc 分析内存分配
+        :param profile_dir: 分析结果的保存目录
+        """
+        if profile_mode not in PROFILE_MODES:
+            raise ValueError(f"不支持的分析方式{profile_mode}，可选: {', '.join(PROFILE_MODES)}")
+        self.sinks = list(sinks)
+        self.profile = profile
+        self.profile_mode = profile_mode
+        self.profile_dir = profile_dir
+        self._profiling = False
+
+    def __repr__(self):
+        return f"Instrument(sinks={self.sinks}, profile={self.profile!r})"
+
+    def add_sink(self, sink: RecordSink) -> RecordSink:
+        self.sinks.append(sink)
+        return sink
+
+    def close(self):
+        for sink in self.sinks:
+            sink.close()
+
+    def emit(self, record: dict):
+        for sink in self.sinks:
+            sink.emit(record)
+
+    @contextlib.contextmanager
+    def span(self, kind: str, stage: str = None, station: str = None, dsn: int = None, **fields):
+        """
+        记录一段处理，with块结束时发送记录。块内可以修改返回的记录，例如填入rows和bytes。
+        kind为"stage"时块内的记录都带上该步骤名称；块内出现异常时记录error后继续引发。
+        :param kind: 记录类型
+        :param stage: 步骤名称，为None时使用所在步骤
+        :param station: 站点ID
+        :param dsn: 数据序列编号
+        :param fields: 其他字段
+        """
+        record = {"kind": kind, "stage": stage if stage is not None else current_stage(),
+                  "station": None if station is None else str(station), "dsn": None if dsn is None else int(dsn),
+                  "rows": None, "bytes": None}
+        record.update(fields)
+        outer_stage = current_stage()
+        if kind == "stage":
+            _context.stage = record["stage"]
+        profiler = self._start_profile(record["stage"]) if kind == "stage" else None
+        start = time.perf_counter()
+        try:
+            yield record
+        except BaseException as e:
+            record["error"] = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            record["seconds"] = round(time.perf_counter() - start, 6)
+            if profiler is not None:
+                self._stop_profile(profiler, record)
+            record["peak_rss_mb"] = peak_rss_mb()
+            record["time"] = datetime.now().isoformat(timespec="milliseconds")
+            record["pid"] = os.getpid()
+            _context.stage = outer_stage
+            self.emit(record)
+
+    def _start_profile(self, stage: str):
+        """stage为需要分析的步骤时开始分析，同一时间只分析一个步骤"""
+        if self.profile is None or stage != self.profile or self._profiling:
+            return None
+        self._profiling = True
+        if self.profile_mode == "cprofile":
+            profiler = cProfile.Profile()
+            profiler.enable()
+            return profiler
+        tracemalloc.start()
+        return tracemalloc
+
+    def _stop_profile(self, profiler, record: dict):
+        """结束分析，结果保存到profile_dir，路径写入记录的profile字段"""
+        os.makedirs(self.profile_dir, exist_ok=True)
+        stamp = datetime.now().strftime("%Y%m%d%H%M%S")
+        try:
+            if profiler is tracemalloc:
+                snapshot = tracemalloc.take_snapshot()
+                record["traced_bytes"], record["traced_peak_bytes"] = tracemalloc.get_traced_memory()
+                tracemalloc.stop()
+                path = os.path.join(self.profile_dir, f"{record['stage']}_{stamp}.tracemalloc.txt")
+                with open(path, "w", encoding="utf-8") as f:
+                    for stat in snapshot.statistics("lineno")[:PROFILE_TOP]:
+                        f.write(f"{stat}\n")
+            else:
+                profiler.disable()
+                path = os.path.join(self.profile_dir, f"{record['stage']}_{stamp}.prof")
+                profiler.dump_stats(path)
+                with open(path + ".txt", "w", encoding="utf-8") as f:
+                    pstats.Stats(profiler, stream=f).sort_stats("cumulative").print_stats(PROFILE_TOP)
+            record["profile"] = path
+        finally:
+            self._profiling = False
+
+
+# ============================默认记录器==================================
+def set_default_instrument(instrument: Union[Instrument, str, None]):
+    """
+    设置默认记录器
+    :param instrument: 记录器或JSON lines文件路径，为None时关闭记录
+    """
+    global _default_instrument
+    if isinstance(instrument, str):
+        instrument = Instrument([JsonLinesSink(instrument)])
+    _default_instrument = instrument
+
+
+def get_instrument() -> Union[Instrument, None]:
+    """获取默认记录器，没有设置时根据环境变量创建，没有启用时返回None"""
+    global _default_instrument
+    if _default_instrument is None and os.environ.get(ENV_TRACE):
+        _default_instrument = Instrument([JsonLinesSink(os.environ[ENV_TRACE])],
+                                         profile=os.environ.get(ENV_PROFILE) or None,
+                                         profile_mode=os.environ.get(ENV_PROFILE_MODE) or "cprofile",
+                                         profile_dir=os.path.dirname(os.path.abspath(os.environ[ENV_TRACE])))
+    return _default_instrument
+
+
+@contextlib.contextmanager
+def span(kind: str, stage: str = None, station: str = None, dsn: int = None, **fields):
+    """
+    使用默认记录器记录一段处理，参数见Instrument.span。
+    没有启用记录时返回的记录不会被发送，调用方仍然可以填入字段。
+    """
+    instrument = get_instrument()
+    if instrument is None:
+        yield {}
+        return
+    with instrument.span(kind, stage=stage, station=station, dsn=dsn, **fields) as record:
+        yield record
+
+
+def emit_record(kind: str, seconds: float, stage: str = None, station: str = None, dsn: int = None, **fields):
+    """
+    用默认记录器发送一条已经计时的记录，例如工作进程返回的站点用时，没有启用记录时不做任何事
+    :param kind: 记录类型
+    :param seconds: 用时(秒)
+    :param stage: 步骤名称，为None时使用所在步骤
+    :param fields: 其他字段，没有peak_rss_mb时使用当前进程的峰值内存
+    """
+    instrument = get_instrument()
+    if instrument is None:
+        return
+    record = {"kind": kind, "stage": stage if stage is not None else current_stage(),
+              "station": None if station is None else str(station), "dsn": None if dsn is None else int(dsn),
+              "rows": None, "bytes": None, "seconds": round(seconds, 6)}
+    record.update(fields)
+    if "peak_rss_mb" not in record:
+        record["peak_rss_mb"] = peak_rss_mb()
+    record["time"] = datetime.now().isoformat(timespec="milliseconds")
+    record.setdefault("pid", os.getpid())
+    instrument.emit(record)
+
+
+def iter_spans(items: Iterable, kind: str, station: Callable = None):
+    """
+    逐个返回items中的元素，记录产生每个元素的用时，适用于按站点读取输入的生成器
+    :param items: 可迭代对象
+    :param kind: 记录类型
+    :param station: 从元素得到站点ID的函数
+    """
+    items = iter(items)
+    while True:
+        start = time.perf_counter()
+        item = next(items, _END)
+        if item is _END:
+            return
+        if get_instrument() is not None:
+            emit_record(kind, time.perf_counter() - start, station=None if station is None else station(item))
+        yield item
@@ -0,0 +1,321 @@
+import functools
+import hashlib
+import inspect
+import os
+import pickle
+import sys
+import tempfile
+import threading
+from typing import Callable, Iterable, Union
+
+import numpy as np
+import pandas as pd
+
+"""
+计算结果缓存(memoization)
+以 函数所在模块及其依赖的项目模块的源码、函数名、参数(包括输入序列的索引和取值) 的哈希为键，把计算结果保存在磁盘上，
+重新运行时输入和参数都没有变化的计算直接从缓存读取，调参时只有参数改变的步骤和站点重新计算。
+1. 缓存目录的总大小超过上限时，按最近使用时间淘汰最久没有使用的结果
+2. 模块或其依赖的项目模块(同一目录下的模块)源码变化后，该模块中函数的旧结果不再命中，由淘汰机制逐步清除；
+   第三方库(numpy、pandas等)升级不会使旧结果失效，升级后需要调用 ResultMemo.clear 清空缓存
+3. 默认不启用，通过 set_default_memo 或环境变量 HSPF_MET_MEMO(缓存目录)、HSPF_MET_MEMO_SIZE(MB) 启用，
+   没有启用时 memoize 装饰的函数直接调用
+"""
+
+ENV_MEMO = "HSPF_MET_MEMO"
+ENV_MEMO_SIZE = "HSPF_MET_MEMO_SIZE"
+DEFAULT_MEMO_BYTES = 512 * 1024 * 1024
+MEMO_SUFFIX = ".pkl"
+# 默认不参与哈希的参数：执行器只影响计算方式，不影响结果
+DEFAULT_IGNORE = ("executor",)
+
+_default_memo = None
+_module_tokens = {}
+
+
+class UnhashableArgument(TypeError):
+    """参数无法计算内容哈希，此次调用不使用缓存"""
+
+
+def _hash_update(h, value):
+    """把参数的类型和内容写入哈希"""
+    if value is None or isinstance(value, (bool, int, float, str, bytes, np.generic)):
+        h.update(f"{type(value).__name__}:{value!r};".encode("utf-8"))
+    elif isinstance(value, (type, np.dtype)):
+        h.update(f"type:{getattr(value, '__qualname__', value)!s};".encode("utf-8"))
+    elif isinstance(value, pd.DataFrame):
+        h.update(b"DataFrame;")
+        _hash_update(h, [str(column) for column in value.columns])
+        _hash_update(h, value.index)
+        for column in value.columns:
+            _hash_update(h, value[column].to_numpy())
+    elif isinstance(value, pd.Series):
+        h.update(b"Series;")
+        _hash_update(h, str(value.name))
+        _hash_update(h, value.index)
+        _hash_update(h, value.to_numpy())
+    elif isinstance(value, pd.Index):
+        h.update(f"Index:{value.dtype}:{value.name};".encode("utf-8"))
+        _hash_update(h, value.asi8 if isinstance(value, pd.DatetimeIndex) else value.to_numpy())
+    elif isinstance(value, np.ndarray):
+        if value.dtype == object:
+            _hash_update(h, value.tolist())
+        else:
+            h.update(f"ndarray:{value.dtype}:{value.shape};".encode("utf-8"))
+            h.update(np.ascontiguousarray(value).tobytes())
+    elif isinstance(value, (list, tuple)):
+        h.update(f"{type(value).__name__}:{len(value)};".encode("utf-8"))
+        for item in value:
+            _hash_update(h, item)
+    elif isinstance(value, dict):
+        h.update(f"dict:{len(value)};".encode("utf-8"))
+        for key in sorted(value, key=repr):
+            _hash_update(h, key)
+            _hash_update(h, value[key])
+    else:
+        raise UnhashableArgument(f"无法计算{type(value).__name__}类型参数的内容哈希")
+
+
+def _source_hash(module) -> str:
+    """模块源码的哈希，没有源码时(例如交互式定义)为空"""
+    try:
+        source = inspect.getsource(module).encode("utf-8")
+    except (OSError, TypeError):
+        source = b""
+    return hashlib.sha1(source).hexdigest()
+
+
+def _project_modules(module) -> list:
+    """
+    模块直接或间接依赖的项目模块(与该模块在同一目录下的模块，包括自身)，按模块名排序。
+    依赖由模块的全局变量得到：导入的模块，以及 from ... import 导入的函数、类所在的模块。
+    """
+    module_file = getattr(module, "__file__", None)
+    if module_file is None:
+        return [module]
+    project_dir = os.path.dirname(os.path.abspath(module_file))
+    found = {module.__name__: module}
+    pending = [module]
+    while pending:
+        for value in list(vars(pending.pop()).values()):
+            if inspect.ismodule(value):
+                dependency = value
+            else:
+                value_module = getattr(value, "__module__", None)
+                dependency = sys.modules.get(value_module) if isinstance(value_module, str) else None
+            name = getattr(dependency, "__name__", None)
+            dependency_file = getattr(dependency, "__file__", None)
+            if name in found or dependency_file is None:
+                continue
+            if os.path.dirname(os.path.abspath(dependency_file)) == project_dir:
+                found[name] = dependency
+                pending.append(dependency)
+    return [found[name] for name in sorted(found)]
+
+
+def _func_token(func: Callable) -> str:
+    """
+    函数的标识：函数名 + 所在模块及其依赖的项目模块(例如Metcalalg依赖的MetUtils、MetDataset)源码的哈希，
+    这些模块修改后旧结果自动失效。numpy、pandas等第三方库升级不会改变标识，升级后需要调用clear清空缓存。
+    """
+    module_name = getattr(func, "__module__", None)
+    if module_name not in _module_tokens:
+        module = sys.modules.get(module_name)
+        if module is None:
+            source = getattr(getattr(func, "__code__", None), "co_code", b"")
+            _module_tokens[module_name] = hashlib.sha1(source).hexdigest()
+        else:
+            h = hashlib.sha1()
+            for dependency in _project_modules(module):
+                h.update(f"{dependency.__name__}:{_source_hash(dependency)};".encode("utf-8"))
+            _module_tokens[module_name] = h.hexdigest()
+    return f"{module_name}.{func.__qualname__}@{_module_tokens[module_name]}"
+
+
+class ResultMemo:
+    """
+    磁盘上的计算结果缓存，每个结果一个pickle文件，文件的修改时间作为最近使用时间。
+    用法:
+        memo = ResultMemo("data/.metmemo", max_bytes=256 * 1024 * 1024)
+        devt = memo.call(PanEvaporationValueComputedByHamon, tmin, tmax, True, 19.7)
+    一般通过 set_default_memo 启用，memoize 装饰的函数自动使用默认缓存。
+    """
+
+    def __init__(self, cache_dir: str, max_bytes: int = DEFAULT_MEMO_BYTES):
+        """
+        :param cache_dir: 缓存目录，不存在时创建
+        :param max_bytes: 缓存目录的大小上限(字节)，超过时淘汰最久没有使用的结果
+        """
+        self.cache_dir = os.path.abspath(cache_dir)
+        self.max_bytes = int(max_bytes)
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self._size = sum(size for _, _, size in self._files())
+
+    def __repr__(self):
+        return (f"ResultMemo({self.cache_dir!r}, size={self._size / 1024 / 1024:.1f}MB, "
+                f"hits={self.hits}, misses={self.misses})")
+
+    def __len__(self):
+        return len(self._files())
+
+    @property
+    def size(self) -> int:
+        """缓存目录中结果文件的总大小(字节)"""
+        return self._size
+
+    def _files(self) -> list:
+        """缓存目录中的结果文件：(路径, 修改时间, 大小)"""
+        files = []
+        for entry in os.scandir(self.cache_dir):
+            if entry.name.endswith(MEMO_SUFFIX):
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                files.append((entry.path, stat.st_mtime_ns, stat.st_size))
+        return files
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key + MEMO_SUFFIX)
+
+    def key(self, func: Callable, args: tuple = (), kwargs: dict = None, ignore: Iterable[str] = DEFAULT_IGNORE) -> str:
+        """
+        计算调用的缓存键，位置参数和关键字参数先按函数签名统一并补齐默认值
+        :raise UnhashableArgument: 参数中有无法计算内容哈希的对象
+        """
+        bound = inspect.signature(func).bind(*args, **(kwargs or {}))
+        bound.apply_defaults()
+        h = hashlib.sha256(_func_token(func).encode("utf-8"))
+        for name, value in bound.arguments.items():
+            if name not in ignore:
+                _hash_update(h, name)
+                _hash_update(h, value)
+        return h.hexdigest()
+
+    def get(self, key: str):
+        """
+        读取结果
+        :return: (是否命中, 结果)
+        """
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                value = pickle.load(f)
+        except FileNotFoundError:
+            return False, None
+        except (OSError, pickle.UnpicklingError, EOFError, AttributeError):
+            # 损坏或版本不兼容的结果当作未命中，稍后重新写入
+            return False, None
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return True, value
+
+    def put(self, key: str, value):
+        """保存结果，先写入临时文件再替换，多个进程同时写入同一个键也不会得到不完整的文件"""
+        fd, temp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+            size = os.path.getsize(temp_path)
+            os.replace(temp_path, self._path(key))
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+        with self._lock:
+            self._size += size
+            over = self._size > self.max_bytes
+        if over:
+            self.evict()
+
+    def call(self, func: Callable, *args, ignore: Iterable[str] = DEFAULT_IGNORE, **kwargs):
+        """
+        带缓存地调用函数，输入和参数相同时直接返回缓存的结果
+        :param func: 函数，结果需要可以被pickle
+        :param ignore: 不参与哈希的参数名
+        """
+        try:
+            key = self.key(func, args, kwargs, ignore)
+        except UnhashableArgument:
+            return func(*args, **kwargs)
+        hit, value = self.get(key)
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+        if hit:
+            return value
+        value = func(*args, **kwargs)
+        self.put(key, value)
+        return value
+
+    def evict(self, max_bytes: int = None):
+        """
+        按最近使用时间淘汰结果，直到总大小不超过max_bytes
+        :param max_bytes: 大小上限，为None时使用创建时的上限
+        """
+        max_bytes = self.max_bytes if max_bytes is None else int(max_bytes)
+        with self._lock:
+            files = sorted(self._files(), key=lambda item: item[1])
+            size = sum(item[2] for item in files)
+            for path, _, file_size in files:
+                if size <= max_bytes:
+                    break
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                size -= file_size
+            self._size = size
+
+    def clear(self):
+        """删除所有结果"""
+        self.evict(0)
+
+
+def set_default_memo(memo: Union[ResultMemo, str, None], max_bytes: int = DEFAULT_MEMO_BYTES):
+    """
+    设置默认结果缓存
+    :param memo: 结果缓存或缓存目录，为None时关闭缓存
+    :param max_bytes: 缓存目录的大小上限，memo为目录时有效
+    """
+    global _default_memo
+    if isinstance(memo, str):
+        memo = ResultMemo(memo, max_bytes)
+    _default_memo = memo
+
+
+def get_memo() -> Union[ResultMemo, None]:
+    """获取默认结果缓存，没有设置时根据环境变量创建，没有启用时返回None"""
+    global _default_memo
+    if _default_memo is None and os.environ.get(ENV_MEMO):
+        size = os.environ.get(ENV_MEMO_SIZE)
+        _default_memo = ResultMemo(os.environ[ENV_MEMO],
+                                   int(float(size) * 1024 * 1024) if size else DEFAULT_MEMO_BYTES)
+    return _default_memo
+
+
+def memoize(func: Callable = None, *, ignore: Iterable[str] = DEFAULT_IGNORE):
+    """
+    装饰器：启用默认结果缓存时带缓存地调用函数，没有启用时直接调用
+    :param func: 被装饰的函数
+    :param ignore: 不参与哈希的参数名
+    """
+    if func is None:
+        return functools.partial(memoize, ignore=ignore)
+    ignore = tuple(ignore)
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        memo = get_memo()
+        if memo is None:
+            return func(*args, **kwargs)
+        return memo.call(func, *args, ignore=ignore, **kwargs)
+
+    return wrapper
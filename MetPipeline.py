@@ -0,0 +1,196 @@
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Callable, Dict, Iterable, List, Set
+
+from MetInstrument import echo, span
+
+"""
+处理步骤调度
+1. 每个步骤声明输入和输出的时序类型(TSTYPE)，步骤之间的依赖由输入和输出自动得到
+2. 没有依赖关系的步骤在线程池中同时运行，一个步骤完成后，所有父步骤都已完成的下游步骤立即开始
+3. 可以只运行指定的步骤，它们依赖的上游步骤会一并运行
+步骤之间共享序列缓存和DSN目录，所以使用线程而不是进程；WDM文件的读写由MetUtils.WDM_IO_LOCK串行化。
+"""
+
+
+class Stage:
+    """处理步骤"""
+
+    def __init__(self, name: str, func: Callable, outputs: Iterable[str] = None, inputs: Iterable[str] = (),
+                 kwargs: dict = None):
+        """
+        :param name: 步骤名称
+        :param func: 步骤函数，以kwargs为关键字参数调用
+        :param outputs: 步骤写入的时序类型，为None时为步骤名称
+        :param inputs: 步骤读取的时序类型，没有步骤输出的输入视为WDM文件中已经存在
+        :param kwargs: 步骤函数的关键字参数
+        """
+        self.name = name
+        self.func = func
+        self.outputs = tuple(outputs) if outputs is not None else (name,)
+        self.inputs = tuple(inputs)
+        self.kwargs = kwargs or {}
+
+    def __repr__(self):
+        return f"Stage({self.name!r}, inputs={list(self.inputs)}, outputs={list(self.outputs)})"
+
+    def run(self):
+        return self.func(**self.kwargs)
+
+
+class MetPipeline:
+    """
+    由处理步骤组成的有向无环图。
+    用法:
+        pipeline = MetPipeline()
+        pipeline.add(Stage("TMAX", metTmax, kwargs={...}))
+        pipeline.add(Stage("ATEM", metHourlyATEM, inputs=["TMAX", "TMIN"], kwargs={...}))
+        pipeline.run(["ATEM"], workers=4)
+    """
+
+    def __init__(self, stages: Iterable[Stage] = ()):
+        self._stages = {}
+        self._producers = {}
+        self.timings = {}
+        for stage in stages:
+            self.add(stage)
+
+    def __repr__(self):
+        return f"MetPipeline(stages={list(self._stages)})"
+
+    def __len__(self):
+        return len(self._stages)
+
+    def __contains__(self, name):
+        return name in self._stages
+
+    @property
+    def stages(self) -> List[Stage]:
+        """所有步骤，按加入顺序"""
+        return list(self._stages.values())
+
+    def add(self, stage: Stage) -> Stage:
+        """加入一个步骤，步骤名称和输出的时序类型不能重复"""
+        if stage.name in self._stages:
+            raise ValueError(f"步骤{stage.name}已经存在")
+        for output in stage.outputs:
+            if output in self._producers:
+                raise ValueError(f"时序类型{output}已经由步骤{self._producers[output]}输出")
+        self._stages[stage.name] = stage
+        for output in stage.outputs:
+            self._producers[output] = stage.name
+        return stage
+
+    def dependencies(self, name: str) -> Set[str]:
+        """步骤的直接上游步骤"""
+        return {self._producers[item] for item in self._stages[name].inputs if item in self._producers}
+
+    def _resolve(self, target: str) -> str:
+        """目标可以是步骤名称，也可以是步骤输出的时序类型"""
+        if target in self._stages:
+            return target
+        if target in self._producers:
+            return self._producers[target]
+        raise ValueError(f"没有名称或输出为{target}的步骤，可选: {', '.join(self._stages)}")
+
+    def select(self, targets: Iterable[str] = None) -> List[str]:
+        """
+        需要运行的步骤：目标步骤和它们的所有上游步骤
+        :param targets: 步骤名称或时序类型，为None时为所有步骤
+        :return: 步骤名称，按拓扑顺序排列，没有依赖关系的步骤保持加入顺序
+        """
+        if targets is None:
+            selected = set(self._stages)
+        else:
+            selected = set()
+            todo = [self._resolve(target) for target in targets]
+            while todo:
+                name = todo.pop()
+                if name not in selected:
+                    selected.add(name)
+                    todo.extend(self.dependencies(name))
+        return self.order(selected)
+
+    def order(self, names: Iterable[str]) -> List[str]:
+        """按拓扑顺序排列步骤，存在循环依赖时引发ValueError"""
+        names = set(names)
+        remaining = {name: self.dependencies(name) & names for name in self._stages if name in names}
+        ordered = []
+        while remaining:
+            ready = [name for name, parents in remaining.items() if not parents]
+            if not ready:
+                raise ValueError(f"步骤之间存在循环依赖: {', '.join(remaining)}")
+            for name in ready:
+                del remaining[name]
+                ordered.append(name)
+            for parents in remaining.values():
+                parents.difference_update(ready)
+        return ordered
+
+    def _run_stage(self, name: str):
+        echo(f"▶️ 开始步骤 {name}")
+        start = time.perf_counter()
+        with span("stage", stage=name):
+            result = self._stages[name].run()
+        self.timings[name] = time.perf_counter() - start
+        echo(f"✅ 步骤 {name} 完成，用时 {self.timings[name]:.2f} 秒")
+        return result
+
+    def run(self, targets: Iterable[str] = None, workers: int = None) -> Dict[str, object]:
+        """
+        运行步骤
+        :param targets: 需要运行的步骤名称或时序类型，上游步骤会一并运行，为None时运行所有步骤
+        :param workers: 同时运行的步骤数，为1时按拓扑顺序依次运行，为None时使用CPU核数
+        :return: 步骤名称到步骤函数返回值的字典
+        """
+        names = self.select(targets)
+        workers = max(1, int(workers)) if workers else (os.cpu_count() or 1)
+        results = {}
+        if workers == 1 or len(names) <= 1:
+            for name in names:
+                results[name] = self._run_stage(name)
+            return results
+
+        parents = {name: self.dependencies(name) & set(names) for name in names}
+        children = {name: [child for child in names if name in parents[child]] for name in names}
+        waiting = {name: set(parents[name]) for name in names}
+        errors = {}
+        skipped = set()
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            running = {}
+
+            def submit_ready():
+                for name in [name for name in names if name in waiting and not waiting[name]]:
+                    del waiting[name]
+                    running[pool.submit(self._run_stage, name)] = name
+
+            submit_ready()
+            while running:
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = running.pop(future)
+                    try:
+                        results[name] = future.result()
+                    except Exception as e:
+                        echo(f"❌ 步骤 {name} 失败: {e}")
+                        errors[name] = e
+                        # 失败步骤的所有下游步骤都不再运行
+                        todo = list(children[name])
+                        while todo:
+                            child = todo.pop()
+                            if waiting.pop(child, None) is not None:
+                                skipped.add(child)
+                                todo.extend(children[child])
+                        continue
+                    for child in children[name]:
+                        if child in waiting:
+                            waiting[child].discard(name)
+                submit_ready()
+
+        if errors:
+            message = f"步骤{', '.join(errors)}运行失败"
+            if skipped:
+                message += f"，跳过下游步骤{', '.join(name for name in names if name in skipped)}"
+            raise RuntimeError(message) from next(iter(errors.values()))
+        return results
@@ -0,0 +1,325 @@
+import hashlib
+import json
+import os
+import re
+import shutil
+import tempfile
+import warnings
+from typing import List, Dict, Union
+
+import numpy as np
+import pandas as pd
+
+"""
+站点输入文件读取
+CMA格式的f1..f10逐日CSV文件只解析一次，按站点拆分后以.npz列式文件缓存到磁盘，
+缓存以文件路径、大小和修改时间为键，文件变化后自动重建。
+文件按块(chunk)解析，每块按站点写入分片后再逐个站点合并，峰值内存只与块大小和最大的站点有关。
+1. read_met_csv: 读取多个站点的完整数据，替代pd.read_csv
+2. iter_station_frames: 逐个站点返回排序后的数据，met*驱动函数使用
+"""
+
+CACHE_DIR_NAME = ".metcache"
+MANIFEST_NAME = "manifest.json"
+ROW_KEY = "__row__"
+DEFAULT_CHUNKSIZE = 1_000_000
+
+
+def _source_key(inputfile: str):
+    """
+    获取缓存键：文件绝对路径、大小、修改时间
+    :param inputfile: 输入文件路径
+    :return:
+    """
+    stat = os.stat(inputfile)
+    return os.path.abspath(inputfile), stat.st_size, stat.st_mtime_ns
+
+
+def _cache_path(source_key, cache_dir: str):
+    path, size, mtime_ns = source_key
+    digest = hashlib.sha1(f"{path}|{size}|{mtime_ns}".encode("utf-8")).hexdigest()[:16]
+    return os.path.join(cache_dir, f"{os.path.basename(path)}.{digest}")
+
+
+def _default_cache_dir(inputfile: str):
+    return os.path.join(os.path.dirname(os.path.abspath(inputfile)), CACHE_DIR_NAME)
+
+
+def _load_manifest(cache_path: str):
+    manifest_file = os.path.join(cache_path, MANIFEST_NAME)
+    if not os.path.exists(manifest_file):
+        return None
+    with open(manifest_file, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _remove_stale(cache_dir: str, source_path: str, keep: str):
+    """
+    删除同一输入文件旧版本的缓存目录。只删除名称为 文件名.16位哈希 且清单中的source为该文件的目录，
+    其他输入文件(例如pre.csv.2019)的缓存和没有清单(正在生成或已损坏)的目录保持不变
+    """
+    pattern = re.compile(re.escape(os.path.basename(source_path)) + r"\.[0-9a-f]{16}")
+    for entry in os.listdir(cache_dir):
+        entry_path = os.path.join(cache_dir, entry)
+        if entry_path == keep or not pattern.fullmatch(entry) or not os.path.isdir(entry_path):
+            continue
+        try:
+            manifest = _load_manifest(entry_path)
+        except (OSError, ValueError):
+            continue
+        if manifest is not None and manifest.get("source") == source_path:
+            shutil.rmtree(entry_path, ignore_errors=True)
+
+
+def _station_key(station):
+    return str(int(station))
+
+
+def _spill_chunks(inputfile: str, spill_path: str, station_column: str = "f1", stations: List[str] = None,
+                  chunksize: int = DEFAULT_CHUNKSIZE):
+    """
+    分块解析输入文件，每块按站点写入spill_path下的分片文件
+    :param inputfile: 输入文件路径
+    :param spill_path: 分片文件目录
+    :param station_column: 站点列名
+    :param stations: 只保留的站点，为None时保留所有站点
+    :param chunksize: 每块的行数
+    :return: 列名、每个站点的分片文件列表、文件总行数
+    """
+    station_filter = None if stations is None else [int(station) for station in stations]
+    columns = None
+    parts: Dict[str, List[str]] = {}
+    rows = 0
+    for chunk_no, chunk in enumerate(pd.read_csv(inputfile, chunksize=chunksize)):
+        if columns is None:
+            columns = list(chunk.columns)
+        if any(not np.issubdtype(dtype, np.number) for dtype in chunk.dtypes):
+            raise ValueError(f"{inputfile} 含有非数值列，无法按站点缓存")
+        row_ids = np.arange(rows, rows + len(chunk), dtype=np.int64)
+        rows += len(chunk)
+        if station_filter is not None:
+            keep = chunk[station_column].isin(station_filter).to_numpy()
+            chunk = chunk[keep]
+            row_ids = row_ids[keep]
+        for station, index in chunk.groupby(station_column, sort=False).indices.items():
+            key = _station_key(station)
+            file_name = f"{key}.{chunk_no}.npz"
+            arrays = {column: chunk[column].to_numpy()[index] for column in columns}
+            arrays[ROW_KEY] = row_ids[index]
+            np.savez(os.path.join(spill_path, file_name), **arrays)
+            parts.setdefault(key, []).append(file_name)
+    if columns is None:
+        columns = list(pd.read_csv(inputfile, nrows=0).columns)
+    return columns, parts, rows
+
+
+def _merge_parts(spill_path: str, part_names: List[str], columns: List[str], remove: bool = True):
+    """合并一个站点的所有分片"""
+    pieces = []
+    for part_name in part_names:
+        part_file = os.path.join(spill_path, part_name)
+        with np.load(part_file) as arrays:
+            pieces.append({column: arrays[column] for column in columns + [ROW_KEY]})
+        if remove:
+            os.remove(part_file)
+    return {column: np.concatenate([piece[column] for piece in pieces]) for column in columns + [ROW_KEY]}
+
+
+def build_station_cache(inputfile: str, cache_dir: str = None, station_column: str = "f1",
+                        chunksize: int = DEFAULT_CHUNKSIZE):
+    """
+    分块解析输入文件并按站点写入列式缓存，缓存已存在且文件未变化时直接返回缓存信息。
+    :param inputfile: CMA格式的CSV文件
+    :param cache_dir: 缓存目录，默认为输入文件所在目录下的.metcache
+    :param station_column: 站点列名
+    :param chunksize: 每块解析的行数
+    :return: 缓存目录路径和缓存清单(manifest)，数据中含有非数值列无法缓存时返回(None, None)
+    """
+    if cache_dir is None:
+        cache_dir = _default_cache_dir(inputfile)
+    source_key = _source_key(inputfile)
+    cache_path = _cache_path(source_key, cache_dir)
+    manifest = _load_manifest(cache_path)
+    if manifest is not None:
+        return cache_path, manifest
+
+    os.makedirs(cache_dir, exist_ok=True)
+    # 先写入临时目录再整体改名，避免中断后留下不完整的缓存
+    build_path = tempfile.mkdtemp(prefix=".build_", dir=cache_dir)
+    try:
+        try:
+            columns, parts, rows = _spill_chunks(inputfile, build_path, station_column=station_column,
+                                                 chunksize=chunksize)
+        except ValueError:
+            shutil.rmtree(build_path, ignore_errors=True)
+            return None, None
+        stations = {}
+        dtypes = {}
+        for key in sorted(parts, key=int):
+            arrays = _merge_parts(build_path, parts[key], columns)
+            file_name = f"{key}.npz"
+            np.savez(os.path.join(build_path, file_name), **arrays)
+            stations[key] = file_name
+            for column in columns:
+                dtype = arrays[column].dtype
+                dtypes[column] = str(dtype if column not in dtypes else np.promote_types(dtypes[column], dtype))
+        manifest = {
+            "source": source_key[0],
+            "size": source_key[1],
+            "mtime_ns": source_key[2],
+            "rows": rows,
+            "columns": columns,
+            "dtypes": dtypes,
+            "stations": stations,
+        }
+        with open(os.path.join(build_path, MANIFEST_NAME), "w", encoding="utf-8") as f:
+            json.dump(manifest, f, ensure_ascii=False)
+        try:
+            os.replace(build_path, cache_path)
+        except OSError:
+            # 其他进程已经生成了相同的缓存
+            shutil.rmtree(build_path, ignore_errors=True)
+    except BaseException:
+        shutil.rmtree(build_path, ignore_errors=True)
+        raise
+    _remove_stale(cache_dir, source_key[0], cache_path)
+    return cache_path, manifest
+
+
+def read_station_cache(cache_path: str, manifest: dict, station: Union[int, str]):
+    """
+    读取单个站点的缓存数据
+    :param cache_path: 缓存目录
+    :param manifest: 缓存清单
+    :param station: 站点编号
+    :return: 站点数据，索引为原文件中的行号；站点不存在时返回None
+    """
+    file_name = manifest["stations"].get(_station_key(station))
+    if file_name is None:
+        return None
+    with np.load(os.path.join(cache_path, file_name)) as arrays:
+        data = {column: arrays[column] for column in manifest["columns"]}
+        index = pd.Index(arrays[ROW_KEY])
+    return pd.DataFrame(data, index=index)
+
+
+def read_met_csv(inputfile: str, stations: List[str] = None, station_column: str = "f1", cache_dir: str = None,
+                 use_cache: bool = True):
+    """
+    读取CMA格式的站点数据文件，替代pd.read_csv。
+    文件只在第一次读取或发生变化时解析，之后直接读取按站点拆分的缓存。
+    :param inputfile: 输入文件路径
+    :param stations: 需要读取的站点列表，为None时读取所有站点
+    :param station_column: 站点列名
+    :param cache_dir: 缓存目录，默认为输入文件所在目录下的.metcache
+    :param use_cache: 是否使用缓存，为False时直接解析文件
+    :return: 站点数据，行顺序和索引与原文件一致
+    """
+    cache_path, manifest = None, None
+    if use_cache:
+        try:
+            cache_path, manifest = build_station_cache(inputfile, cache_dir=cache_dir, station_column=station_column)
+        except OSError as e:
+            # 缓存目录不可写时退回到直接解析
+            warnings.warn(f"无法使用输入缓存，直接解析文件 {inputfile}: {e}")
+    if manifest is None:
+        data_df = pd.read_csv(inputfile)
+        if stations is not None:
+            data_df = data_df[data_df[station_column].isin([int(station) for station in stations])]
+        return data_df
+
+    if stations is None:
+        stations = list(manifest["stations"].keys())
+    frames = [read_station_cache(cache_path, manifest, station) for station in dict.fromkeys(stations)]
+    frames = [frame for frame in frames if frame is not None]
+    if not frames:
+        return pd.DataFrame({column: pd.Series(dtype=dtype) for column, dtype in manifest["dtypes"].items()})
+    return pd.concat(frames).sort_index()
+
+
+def _station_frame(arrays: Dict[str, np.ndarray], columns: List[str], data_cols: List[str], invalid_value,
+                   sort_cols: List[str]):
+    """把单个站点的列数组整理为DataFrame：无效值替换为空值，按年月日排序"""
+    data = {}
+    for column in columns:
+        values = arrays[column]
+        if column in data_cols:
+            values = values.astype("float64")
+            if invalid_value is not None:
+                values[values == invalid_value] = np.nan
+        data[column] = values
+    order = np.lexsort(tuple(data[column] for column in reversed(sort_cols)))
+    index = pd.Index(arrays[ROW_KEY][order])
+    return pd.DataFrame({column: values[order] for column, values in data.items()}, index=index)
+
+
+def iter_station_frames(inputfile: str, stations: List[str], data_cols: List[str], invalid_value=None,
+                        station_column: str = "f1", year_col: str = "f5", month_col: str = "f6", day_col: str = "f7",
+                        cache_dir: str = None, use_cache: bool = True, chunksize: int = DEFAULT_CHUNKSIZE):
+    """
+    按stations的顺序逐个返回站点数据，同一时间只在内存中保留一个站点，适用于全国尺度的大文件。
+    站点筛选和无效值替换在读取时完成，返回的数据已按年月日排序。
+    :param inputfile: 输入文件路径
+    :param stations: 站点列表
+    :param data_cols: 数据列，转换为float64并把invalid_value替换为空值
+    :param invalid_value: 无效值，为None时不替换
+    :param station_column: 站点列名
+    :param year_col: 年份列名称
+    :param month_col: 月份列名称
+    :param day_col: 天列名称
+    :param cache_dir: 缓存目录，默认为输入文件所在目录下的.metcache
+    :param use_cache: 是否使用按站点拆分的缓存，为False时分块解析到临时目录，读取完后删除
+    :param chunksize: 每块解析的行数
+    :return: 生成器，依次返回(站点编号, 站点数据)，文件中没有的站点返回空的DataFrame
+    """
+    if isinstance(data_cols, str):
+        data_cols = [data_cols]
+    sort_cols = [year_col, month_col, day_col]
+    cache_path, manifest = None, None
+    if use_cache:
+        try:
+            cache_path, manifest = build_station_cache(inputfile, cache_dir=cache_dir, station_column=station_column,
+                                                       chunksize=chunksize)
+        except OSError as e:
+            warnings.warn(f"无法使用输入缓存，分块解析文件 {inputfile}: {e}")
+
+    if manifest is not None:
+        columns = manifest["columns"]
+        for station in stations:
+            file_name = manifest["stations"].get(_station_key(station))
+            if file_name is None:
+                yield station, pd.DataFrame(columns=columns)
+                continue
+            with np.load(os.path.join(cache_path, file_name)) as arrays:
+                arrays = {column: arrays[column] for column in columns + [ROW_KEY]}
+            yield station, _station_frame(arrays, columns, data_cols, invalid_value, sort_cols)
+        return
+
+    spill_path = tempfile.mkdtemp(prefix="metreader_")
+    try:
+        columns, parts, _ = _spill_chunks(inputfile, spill_path, station_column=station_column, stations=stations,
+                                          chunksize=chunksize)
+        for station in stations:
+            part_names = parts.get(_station_key(station))
+            if not part_names:
+                yield station, pd.DataFrame(columns=columns)
+                continue
+            arrays = _merge_parts(spill_path, part_names, columns)
+            yield station, _station_frame(arrays, columns, data_cols, invalid_value, sort_cols)
+    finally:
+        shutil.rmtree(spill_path, ignore_errors=True)
+
+
+def split_stations(data_df: pd.DataFrame, columns: List[str] = None, station_column: str = "f1"):
+    """
+    一次性按站点拆分数据，替代逐站点的布尔索引
+    :param data_df: 含有多个站点的数据
+    :param columns: 需要保留的列，为None时保留所有列
+    :param station_column: 站点列名
+    :return: 站点编号(int)到站点数据的字典
+    """
+    groups: Dict[int, pd.DataFrame] = {}
+    for station, index in data_df.groupby(station_column, sort=False).indices.items():
+        station_data = data_df.iloc[index]
+        groups[int(station)] = station_data if columns is None else station_data[columns].copy()
+    return groups
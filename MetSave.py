@@ -1,110 +1,442 @@
 import os
 import tempfile
-from typing import Union
+from typing import List, Union
 import pandas as pd
 import numpy as np
 import wdmtoolbox as wdm
 from wdmtoolbox import wdmutil
+from wdmtoolbox.wdmtoolbox import WDM as _WDM
+from filelock import SoftFileLock
+from MetCatalog import peek_catalog
+from MetStore import SeriesStore
+from MetUtils import WDM_IO_LOCK
+from MetInstrument import echo, span
 
+# WDM时间单位(tcode)对应的pandas频率，3为小时，4为天
+TCODE_FREQ = {3: "h", 4: "D"}
+# WDM缺测填充值，与wdmtoolbox创建DSN时的TSFILL一致
+WDM_TSFILL = -999.0
+WDM_BASE_YEAR = 1900
 
-def SaveDataToWdm(aDyTSer: pd.DataFrame, column_name: str, dsn: int, wdmpath: str, location: str, tcode: int,
-                  scenario: str = 'OBSERVED', description: str = None):
+
+def _clean_series(aDyTSer: pd.DataFrame) -> pd.DataFrame:
     """
-    保存逐日数据到WDM文件 - 修复了pandas 2.x兼容性问题
-    :param aDyTSer: 逐日数据
-    :param columnname: 逐日数据列名，列名参考Basins参考文档
-    :param dsn: id编号，参考Basins参考文档
-    :param wdmpath: WDM的文件路径
-    :param location: 数据位置
-    :param scenario: 场景
-    :param description: 数据描述
-    :return:
+    检查并清理待保存的数据：只能有一列、索引为时间，移除无穷大值和NaN
+    :param aDyTSer: 待保存数据
+    :return: 清理后的数据
     """
-    print("wdmpath:", wdmpath)
-    if not os.path.exists(wdmpath):
-        wdm.createnewwdm(wdmpath, overwrite=True)
-    
     # 验证数据格式
     if len(aDyTSer.columns) != 1:
         raise ValueError(f"数据必须只包含一列，当前有{len(aDyTSer.columns)}列")
-    
+
     # 确保索引是DatetimeIndex
     if not isinstance(aDyTSer.index, pd.DatetimeIndex):
         raise TypeError("索引必须是时间类型 (DatetimeIndex)，但当前索引类型为: {}".format(type(aDyTSer.index)))
-    
+
     # 清理数据 - 移除NaN和无穷大值
     data_to_save = aDyTSer.copy()
-    
+
     # 检查并处理数值列中的无穷大值
     numeric_cols = data_to_save.select_dtypes(include=[np.number]).columns
     if len(numeric_cols) > 0:
         # 替换无穷大值为NaN
         data_to_save = data_to_save.replace([np.inf, -np.inf], np.nan)
-    
+
     # 移除包含NaN的行
     data_to_save = data_to_save.dropna()
-    
+
     if data_to_save.empty:
-        print("错误：清理后的数据为空")
-        print("原始数据统计信息:")
-        print(aDyTSer.describe())
+        echo("错误：清理后的数据为空")
+        echo("原始数据统计信息:")
+        echo(aDyTSer.describe())
         raise ValueError("清理后的数据为空，无法保存到WDM文件")
-    
-    # 重命名列为指定的column_name
-    data_to_save.columns = [column_name]
-    
-    if dsn in wdm.listdsns(wdmpath):
-        wdm.deletedsn(wdmpath, dsn=dsn)
-    
-    wdm.createnewdsn(wdmpath,
-                     dsn=dsn,
-                     tstype=column_name,
-                     tcode=tcode,
-                     scenario=scenario,
-                     location=location,
-                     constituent=column_name,
-                     description=description)
-    
-    try:
-        # 尝试直接使用wdmtoolbox
-        wdm.csvtowdm(
-            wdmpath=wdmpath,
-            dsn=dsn,
-            columns=[column_name],
-            input_ts=data_to_save,
-        )
-    except Exception as e:
-        # 如果直接调用失败，尝试通过临时CSV文件的方式
-        print(f"直接保存失败，尝试通过临时文件: {e}")
+    return data_to_save
+
+
+class WdmWriteSession:
+    """
+    WDM批量写入会话。
+    写入请求先放入队列，flush时只打开一次WDM文件、加一次文件锁，依次删除旧DSN、创建DSN并写入数据，
+    不再对每个序列执行listdsns全表扫描和csvtowdm的CSV往返。
+    队列达到max_pending时自动写入一次，退出with块时写入剩余数据，with块内出现异常时丢弃未写入的数据。
+    追加模式下已有的DSN不再重建，只从已有数据的最后一天(或append_start给出的日期)开始覆盖写入新数据，
+    之前的数据保持不变；DSN不存在时仍写入完整序列。
+
+    用法:
+        with WdmWriteSession(wdmpath) as session:
+            saveDailyTmax(df, wdmpath, "54511", dsn=19, session=session)
+            ...
+    """
+    # wdmtoolbox自身使用50~58号Fortran单元
+    UNIT = 60
+
+    def __init__(self, wdmpath: str, max_pending: int = 64, store: SeriesStore = None, append: bool = False):
+        """
+        :param wdmpath: WDM文件路径，不存在时创建
+        :param max_pending: 队列中最多保留的写入数，超过时自动写入，为None时只在flush或退出时写入
+        :param store: 序列缓存，不为None时加入队列的完整序列同时按(站点, 时序类型)保存到缓存中，追加的部分序列不缓存
+        :param append: 是否为追加模式
+        """
+        self.wdmpath = str(wdmpath).strip()
+        self.max_pending = max_pending
+        self.store = store
+        self.append = append
+        self._pending = {}
+        # 已检查过的DSN编号和其中已存在的DSN
+        self._checked = set()
+        self._dsns = set()
+        # 追加模式：已读取的DSN数据范围(第一个时刻, 最后时刻的下一步)和DSN的重写起始时刻
+        self._spans = {}
+        self._append_from = {}
+        self.written = 0
+        # 加入队列的数值个数(包括补齐的TSFILL)，用于按站点统计
+        self.queued_rows = 0
+        with WDM_IO_LOCK:
+            if not os.path.exists(self.wdmpath):
+                wdm.createnewwdm(self.wdmpath, overwrite=True)
+
+    def __repr__(self):
+        return f"WdmWriteSession({self.wdmpath!r}, pending={len(self._pending)}, written={self.written})"
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if exc_type is None:
+            self.flush()
+        else:
+            self._pending.clear()
+
+    def __len__(self):
+        return len(self._pending)
+
+    def _scan_dsns(self, dsns) -> set:
+        """打开一次WDM文件，检查给定编号中已经存在的DSN"""
+        with WDM_IO_LOCK, SoftFileLock(self.wdmpath + ".lock", timeout=30):
+            wdmfp = _WDM._open(self.wdmpath, self.UNIT)
+            try:
+                return {dsn for dsn in dsns if _WDM.wdckdt(wdmfp, dsn) != 0}
+            finally:
+                _WDM._close(self.wdmpath)
+
+    @staticmethod
+    def _data_end(wdmfp: int, dsn: int, first: pd.Timestamp, end: pd.Timestamp, window: int = 400):
+        """
+        DSN最后一个有效值之后的时刻。wtfndt给出的结束时刻可能延伸到最后一个时间组(逐日、逐小时数据为一年)的末尾，
+        其后的部分为TSFILL，这里从结束时刻往前逐段读取，找到最后一个不是TSFILL的值。
+        :return: 最后一个有效值的下一个时刻，没有有效值时返回None
+        """
+        saval, retcode = _WDM.wdbsgi(wdmfp, dsn, 17, 1)
+        tcode = int(saval[0]) if retcode == 0 else None
+        if tcode not in TCODE_FREQ:
+            return end
+        step = pd.Timedelta(1, unit=TCODE_FREQ[tcode])
+        while end > first:
+            start = max(first, end - window * pd.Timedelta(days=1))
+            nval = int((end - start) / step)
+            values, retcode = _WDM.wdtget(wdmfp, dsn, 1, list(start.timetuple()[:6]), nval, 0, 30, tcode)
+            _WDM._retcode_check(retcode, additional_info=f"wdtget DSN={dsn}")
+            valid = np.flatnonzero(values != WDM_TSFILL)
+            if len(valid):
+                return start + (int(valid[-1]) + 1) * step
+            end = start
+        return None
+
+    def _scan_spans(self, dsns) -> dict:
+        """打开一次WDM文件，读取给定DSN的数据范围(第一个时刻, 最后一个有效值的下一个时刻)，DSN不存在或没有数据时为None"""
+        spans = {}
+        with WDM_IO_LOCK, SoftFileLock(self.wdmpath + ".lock", timeout=30):
+            wdmfp = _WDM._open(self.wdmpath, self.UNIT)
+            try:
+                for dsn in dsns:
+                    spans[dsn] = None
+                    if _WDM.wdckdt(wdmfp, dsn) == 0:
+                        continue
+                    _, llsdat, lledat, retcode = _WDM.wtfndt(wdmfp, dsn, 1)
+                    if retcode != 0:
+                        continue
+                    # 结束时刻是最后一个时段的末尾，例如逐日数据1995-12-31的结束时刻为1995-12-31 24:00
+                    first, end = (pd.Timestamp(*map(int, date[:3])) + pd.Timedelta(hours=int(date[3]),
+                                  minutes=int(date[4]), seconds=int(date[5])) for date in (llsdat, lledat))
+                    end = self._data_end(wdmfp, dsn, first, end)
+                    if end is not None:
+                        spans[dsn] = (first, end)
+            finally:
+                _WDM._close(self.wdmpath)
+        return spans
+
+    def append_start(self, dsn: int, rewrite_days: int = 1) -> Union[pd.Timestamp, None]:
+        """
+        追加模式下DSN的重写起始日期：已有数据最后一天往前rewrite_days-1天，加入的序列中早于该日期的部分不再写入。
+        最后几天的结果依赖后续日期时(例如逐小时温度分解需要次日最低温度)，用rewrite_days重新计算这几天。
+        :param dsn: 数据序列编号
+        :param rewrite_days: 需要重写的已有天数，至少为1
+        :return: 重写起始日期，不是追加模式或DSN不存在时返回None，此时写入完整序列
+        """
+        dsn = int(dsn)
+        if not self.append or dsn in self._pending:
+            return None
+        if dsn not in self._spans:
+            self._spans.update(self._scan_spans([dsn]))
+        span = self._spans[dsn]
+        if span is None:
+            return None
+        first, end = span
+        start = (end - pd.Timedelta(hours=1)).normalize() - pd.Timedelta(days=max(1, int(rewrite_days)) - 1)
+        if start <= first:
+            return None
+        self._append_from[dsn] = start
+        return start
+
+    def has_dsn(self, dsn: int) -> bool:
+        """DSN是否已存在于WDM文件中或在队列中等待写入"""
+        return not self.free_dsns([dsn])
+
+    def free_dsns(self, dsn_range) -> List[int]:
+        """
+        返回dsn_range中既不在WDM文件中、也不在队列中的DSN编号。
+        文件中的DSN只检查一次并缓存，之后由会话自己维护。
+        """
+        dsn_range = [int(dsn) for dsn in dsn_range]
+        unchecked = [dsn for dsn in dsn_range if dsn not in self._checked]
+        if unchecked:
+            self._dsns |= self._scan_dsns(unchecked)
+            self._checked.update(unchecked)
+        return [dsn for dsn in dsn_range if dsn not in self._dsns and dsn not in self._pending]
+
+    def add(self, aDyTSer: pd.DataFrame, column_name: str, dsn: int, location: str, tcode: int,
+            scenario: str = 'OBSERVED', description: str = None):
+        """
+        把一个序列加入写入队列，参数与SaveDataToWdm一致。
+        数据在这里完成检查、清理并按tcode补齐为等间隔序列，缺测时刻写入TSFILL。
+        同一个DSN重复加入时，后加入的覆盖先加入的。
+        追加模式下DSN已存在时只保留重写起始日期(见append_start)之后的数据，与已有数据之间的空缺写入TSFILL。
+        """
+        if tcode not in TCODE_FREQ:
+            raise ValueError(f"不支持的时间单位tcode={tcode}，可选: {', '.join(map(str, TCODE_FREQ))}")
+        dsn = int(dsn)
+        since = self._append_from.get(dsn) if self.append else None
+        if self.append and since is None and dsn not in self._pending:
+            since = self.append_start(dsn)
+        if since is not None:
+            aDyTSer = aDyTSer[aDyTSer.index >= since]
+            if aDyTSer.empty:
+                echo(f"站点 {location} 的DSN {dsn} 没有{since:%Y-%m-%d}之后的新数据")
+                return
+        data_to_save = _clean_series(aDyTSer)
+        series = data_to_save.iloc[:, 0]
+        # 单精度的逐小时序列(float32模式)直接按单精度补齐，不再转换为float64
+        series = series.astype(np.float32 if series.dtype == np.float32 else np.float64)
+        series = series[~series.index.duplicated(keep="last")].sort_index()
+        first = series.index[0]
+        if since is not None:
+            # 从已有数据之后开始，不能在已有数据和新数据之间留下空白
+            first = min(first, self._spans[dsn][1])
+        index = pd.date_range(first, series.index[-1], freq=TCODE_FREQ[tcode])
+        values = series.reindex(index).fillna(WDM_TSFILL).to_numpy(dtype=np.float32)
+
+        start = index[0]
+        if start.year < WDM_BASE_YEAR:
+            raise ValueError(f"DSN {dsn} 的数据开始于{start.year}年，早于WDM基准年{WDM_BASE_YEAR}")
+        start_date = _WDM._tcode_date(tcode, start.timetuple()[:6])
+        if self.store is not None and self.store.accepts(tcode):
+            if since is None:
+                self.store.put_values(location, column_name, index, values, tsfill=WDM_TSFILL)
+            else:
+                self.store.discard(location, column_name)
+
+        attrs = ((2, 16, " ", "Station ID"),
+                 (1, 4, column_name, "Time series type - tstype"),
+                 (45, 48, description or "", "Description"),
+                 (288, 8, scenario, "Scenario"),
+                 (289, 8, column_name, "Constituent"),
+                 (290, 8, location, "Location"))
+        str_attrs = []
+        for saind, salen, saval, error_name in attrs:
+            saval = str(saval).strip()
+            if len(saval) > salen:
+                raise ValueError(f"DSN {dsn} 的{error_name}“{saval}”过长，长度不能超过{salen}")
+            str_attrs.append((saind, salen, f"{saval: <{salen}}"))
+
+        catalog_attrs = {"IDLOCN": str(location).strip(), "TSTYPE": column_name, "IDSCEN": scenario,
+                         "IDCONS": column_name, "TCODE": int(tcode), "TSSTEP": 1}
+        self._pending[dsn] = (int(tcode), start_date, values, str_attrs, catalog_attrs, since is not None)
+        self.queued_rows += len(values)
+        if self.max_pending and len(self._pending) >= self.max_pending:
+            self.flush()
+
+    def _write_one(self, wdmfp: int, messfp: int, dsn: int, tcode: int, start_date: list, values: np.ndarray,
+                   str_attrs: list, append: bool = False):
+        """
+        在已打开的WDM文件中重建一个DSN并写入数据，属性与wdmtoolbox.createnewdsn一致。
+        append为True时保留DSN，从start_date开始覆盖写入，start_date之后的旧数据被替换。
+        """
+        if append:
+            retcode = _WDM.wdtput(wdmfp, dsn, 1, start_date, len(values), 1, 0, tcode, values)
+            _WDM._retcode_check(retcode, additional_info=f"wdtput file={self.wdmpath} DSN={dsn}")
+            return
+        if _WDM.wdckdt(wdmfp, dsn) != 0:
+            _WDM._retcode_check(_WDM.wddsdl(wdmfp, dsn), additional_info=f"wddsdl file={self.wdmpath} DSN={dsn}")
+        _WDM.wdlbax(wdmfp, dsn, 1, 10, 10, 30, 100, 300)
+        for saind, salen, saval in ((34, 1, 6), (83, 1, 1), (84, 1, 1), (85, 1, 1),
+                                    (17, 1, tcode), (33, 1, 1), (27, 1, WDM_BASE_YEAR)):
+            retcode = _WDM.wdbsai(wdmfp, dsn, messfp, saind, salen, saval)
+            _WDM._retcode_check(retcode, additional_info=f"wdbsai file={self.wdmpath} DSN={dsn}")
+        retcode = _WDM.wdbsar(wdmfp, dsn, messfp, 32, 1, WDM_TSFILL)
+        _WDM._retcode_check(retcode, additional_info=f"wdbsar file={self.wdmpath} DSN={dsn}")
+        for saind, salen, saval in str_attrs:
+            retcode = _WDM.wdbsac(wdmsfl=wdmfp, dsn=dsn, messfl=messfp, saind=saind, salen=salen,
+                                  saval=np.array(list(saval)))
+            _WDM._retcode_check(retcode, additional_info=f"wdbsac file={self.wdmpath} DSN={dsn}")
+        retcode = _WDM.wdtput(wdmfp, dsn, 1, start_date, len(values), 1, 0, tcode, values)
+        _WDM._retcode_check(retcode, additional_info=f"wdtput file={self.wdmpath} DSN={dsn}")
+
+    def flush(self):
+        """把队列中的写入一次性提交到WDM文件"""
+        if not self._pending:
+            return
+        pending, self._pending = self._pending, {}
+        with span("wdm_flush", dsns=len(pending)) as flush_record, WDM_IO_LOCK, \
+                SoftFileLock(self.wdmpath + ".lock", timeout=30):
+            flush_record["rows"] = sum(len(entry[2]) for entry in pending.values())
+            flush_record["bytes"] = sum(entry[2].nbytes for entry in pending.values())
+            # 写入前目录与文件一致时，写入后同步更新目录
+            catalog = peek_catalog(self.wdmpath)
+            wdmfp = _WDM._open(self.wdmpath, self.UNIT)
+            try:
+                messfp = _WDM.wmsgop()
+                for dsn, (tcode, start_date, values, str_attrs, catalog_attrs, append) in pending.items():
+                    with span("wdm_write", station=catalog_attrs["IDLOCN"], dsn=dsn, rows=len(values),
+                              bytes=values.nbytes, append=append):
+                        self._write_one(wdmfp, messfp, dsn, tcode, start_date, values, str_attrs, append)
+                    self._dsns.add(dsn)
+                    self._spans.pop(dsn, None)
+                    self._append_from.pop(dsn, None)
+                    self.written += 1
+                    if catalog is not None:
+                        catalog.record(dsn, catalog_attrs)
+            finally:
+                _WDM._close(self.wdmpath)
+            if catalog is not None:
+                catalog.mark_written()
+        appended = sum(1 for entry in pending.values() if entry[-1])
+        if appended:
+            echo(f"💾 WDM批量写入{len(pending)}个DSN(其中追加{appended}个): {self.wdmpath}")
+        else:
+            echo(f"💾 WDM批量写入{len(pending)}个DSN: {self.wdmpath}")
+
+
+class WdmWriteCollector:
+    """
+    只记录写入请求的会话，接口与WdmWriteSession.add一致。
+    在工作进程中代替WdmWriteSession使用，记录的写入请求返回主进程后由一个写入会话按顺序写入，
+    WDM文件始终只有一个写入方。
+    """
+
+    def __init__(self):
+        self.writes = []
+
+    def __len__(self):
+        return len(self.writes)
+
+    def add(self, aDyTSer: pd.DataFrame, column_name: str, dsn: int, location: str, tcode: int,
+            scenario: str = 'OBSERVED', description: str = None):
+        """记录一个写入请求，参数与WdmWriteSession.add一致"""
+        self.writes.append((aDyTSer, column_name, dsn, location, tcode, scenario, description))
+
+    def free_dsns(self, dsn_range) -> List[int]:
+        raise ValueError("工作进程中无法分配DSN，写入时需要指定dsn")
+
+
+def SaveDataToWdm(aDyTSer: pd.DataFrame, column_name: str, dsn: int, wdmpath: str, location: str, tcode: int,
+                  scenario: str = 'OBSERVED', description: str = None, session: WdmWriteSession = None):
+    """
+    保存逐日数据到WDM文件 - 修复了pandas 2.x兼容性问题
+    :param aDyTSer: 逐日数据
+    :param columnname: 逐日数据列名，列名参考Basins参考文档
+    :param dsn: id编号，参考Basins参考文档
+    :param wdmpath: WDM的文件路径
+    :param location: 数据位置
+    :param scenario: 场景
+    :param description: 数据描述
+    :param session: WDM写入会话，不为None时数据加入会话队列批量写入
+    :return:
+    """
+    if session is not None:
+        session.add(aDyTSer, column_name, dsn, location, tcode, scenario=scenario, description=description)
+        return
+
+    with span("wdm_write", station=location, dsn=dsn, rows=len(aDyTSer)):
+        echo("wdmpath:", wdmpath)
+        if not os.path.exists(wdmpath):
+            wdm.createnewwdm(wdmpath, overwrite=True)
+
+        data_to_save = _clean_series(aDyTSer)
+
+        # 重命名列为指定的column_name
+        data_to_save.columns = [column_name]
+        catalog = peek_catalog(wdmpath)
+
+        if dsn in wdm.listdsns(wdmpath):
+            wdm.deletedsn(wdmpath, dsn=dsn)
+
+        wdm.createnewdsn(wdmpath,
+                         dsn=dsn,
+                         tstype=column_name,
+                         tcode=tcode,
+                         scenario=scenario,
+                         location=location,
+                         constituent=column_name,
+                         description=description)
+
         try:
-            # 创建临时CSV文件
-            with tempfile.NamedTemporaryFile(mode='w', suffix='.csv', delete=False) as temp_file:
-                # 保存为CSV格式，包含时间索引
-                data_to_save.to_csv(temp_file.name, index_label='datetime')
-                temp_csv_path = temp_file.name
-            
-            # 使用临时CSV文件
+            # 尝试直接使用wdmtoolbox
             wdm.csvtowdm(
                 wdmpath=wdmpath,
                 dsn=dsn,
                 columns=[column_name],
-                input_ts=temp_csv_path,
+                input_ts=data_to_save,
             )
-            
-            # 清理临时文件
-            os.unlink(temp_csv_path)
-            print("通过临时文件成功保存数据")
-            
-        except Exception as e2:
-            # 如果临时文件方法也失败，抛出原始错误
-            raise Exception(f"保存到WDM失败。直接保存错误: {e}。临时文件保存错误: {e2}")
+        except Exception as e:
+            # 如果直接调用失败，尝试通过临时CSV文件的方式
+            echo(f"直接保存失败，尝试通过临时文件: {e}")
+            try:
+                # 创建临时CSV文件
+                with tempfile.NamedTemporaryFile(mode='w', suffix='.csv', delete=False) as temp_file:
+                    # 保存为CSV格式，包含时间索引
+                    data_to_save.to_csv(temp_file.name, index_label='datetime')
+                    temp_csv_path = temp_file.name
+
+                # 使用临时CSV文件
+                wdm.csvtowdm(
+                    wdmpath=wdmpath,
+                    dsn=dsn,
+                    columns=[column_name],
+                    input_ts=temp_csv_path,
+                )
+
+                # 清理临时文件
+                os.unlink(temp_csv_path)
+                echo("通过临时文件成功保存数据")
+
+            except Exception as e2:
+                # 如果临时文件方法也失败，抛出原始错误
+                raise Exception(f"保存到WDM失败。直接保存错误: {e}。临时文件保存错误: {e2}")
+
+        if catalog is not None:
+            catalog.record(dsn, {"IDLOCN": str(location).strip(), "TSTYPE": column_name, "IDSCEN": scenario,
+                                 "IDCONS": column_name, "TCODE": int(tcode), "TSSTEP": 1})
+            catalog.mark_written()
 
 
 def saveData(aDyTSer: pd.DataFrame, column_name: str, wdmpath: str, scenario: str, location: str, tcode: int,
-             description: str, dsn_range: range, dsn=None):
+             description: str, dsn_range: range, dsn=None, session: WdmWriteSession = None):
     # 分配 DSN
     if dsn is None:
-        available_dsns = set(dsn_range) - set(wdm.listdsns(wdmpath))
+        if session is not None:
+            available_dsns = set(session.free_dsns(dsn_range))
+        else:
+            available_dsns = set(dsn_range) - set(wdm.listdsns(wdmpath))
         if available_dsns:
             dsn = min(available_dsns)
         else:
@@ -121,12 +453,13 @@ def saveData(aDyTSer: pd.DataFrame, column_name: str, wdmpath: str, scenario: st
         location=location,
         tcode=tcode,
         scenario=scenario,
-        description=description
+        description=description,
+        session=session
     )
 
 
 # --------------------------保存逐日数据-------------------------------
-def saveDailyTmax(aDyTSer: pd.DataFrame, wdmpath: str, location: str, dsn=None):
+def saveDailyTmax(aDyTSer: pd.DataFrame, wdmpath: str, location: str, dsn=None, session: WdmWriteSession = None):
     saveData(
         aDyTSer=aDyTSer,
         column_name="TMAX",
@@ -136,11 +469,12 @@ def saveDailyTmax(aDyTSer: pd.DataFrame, wdmpath: str, location: str, dsn=None):
         tcode=4,
         description="daily maximum temperature",
         dsn_range=range(19, 200, 20),
-        dsn=dsn
+        dsn=dsn,
+        session=session
     )
 
 
-def saveDailyTmin(aDyTSer: pd.DataFrame, wdmpath: str, location: str, dsn=None):
+def saveDailyTmin(aDyTSer: pd.DataFrame, wdmpath: str, location: str, dsn=None, session: WdmWriteSession = None):
     saveData(
         aDyTSer=aDyTSer,
         column_name="TMIN",
@@ -150,11 +484,12 @@ def saveDailyTmin(aDyTSer: pd.DataFrame, wdmpath: str, location: str, dsn=None):
         tcode=4,
         description="daily minimum temperature",
         dsn_range=range(20, 201, 20),
-        dsn=dsn
+        dsn=dsn,
+        session=session
     )
 
 
-def saveDailyWIND(aDyTSer: pd.DataFrame, wdmpath: str, location: str, dsn=None):
+def saveDailyWIND(aDyTSer: pd.DataFrame, wdmpath: str, location: str, dsn=None, session: WdmWriteSession = None):
     saveData(
         aDyTSer=aDyTSer,
         column_name="DWND",
@@ -164,11 +499,12 @@ def saveDailyWIND(aDyTSer: pd.DataFrame, wdmpath: str, location: str, dsn=None):
         tcode=4,
         description="daily windspeed",
         dsn_range=range(21, 202, 20),
-        dsn=dsn
+        dsn=dsn,
+        session=session
     )
 
 
-def saveDailyDCLO(aDyTSer: pd.DataFrame, wdmpath: str, location: str, dsn=None):
+def saveDailyDCLO(aDyTSer: pd.DataFrame, wdmpath: str, location: str, dsn=None, session: WdmWriteSession = None):
     saveData(
         aDyTSer=aDyTSer,
         column_name="DCLO",
@@ -178,11 +514,12 @@ def saveDailyDCLO(aDyTSer: pd.DataFrame, wdmpath: str, location: str, dsn=None):
         tcode=4,
         description="daily cloud cover",
         dsn_range=range(22, 203, 20),
-        dsn=dsn
+        dsn=dsn,
+        session=session
     )
 
 
-def saveDailyDPTP(aDyTSer: pd.DataFrame, wdmpath: str, location: str, dsn=None):
+def saveDailyDPTP(aDyTSer: pd.DataFrame, wdmpath: str, location: str, dsn=None, session: WdmWriteSession = None):
     saveData(
         aDyTSer=aDyTSer,
         column_name="DPTP",
@@ -192,11 +529,12 @@ def saveDailyDPTP(aDyTSer: pd.DataFrame, wdmpath: str, location: str, dsn=None):
         tcode=4,
         description="daily dewpoint temperature",
         dsn_range=range(23, 204, 20),
-        dsn=dsn
+        dsn=dsn,
+        session=session
     )
 
 
-def saveDailyDPTP(aDyTSer: pd.DataFrame, wdmpath: str, location: str, dsn=None):
+def saveDailyDPTP(aDyTSer: pd.DataFrame, wdmpath: str, location: str, dsn=None, session: WdmWriteSession = None):
     saveData(
         aDyTSer=aDyTSer,
         column_name="DPTP",
@@ -206,11 +544,12 @@ def saveDailyDPTP(aDyTSer: pd.DataFrame, wdmpath: str, location: str, dsn=None):
         tcode=4,
         description="daily dewpoint temperature",
         dsn_range=range(23, 204, 20),
-        dsn=dsn
+        dsn=dsn,
+        session=session
     )
 
 
-def saveDailyDSOL(aDyTSer: pd.DataFrame, wdmpath: str, location: str, dsn=None):
+def saveDailyDSOL(aDyTSer: pd.DataFrame, wdmpath: str, location: str, dsn=None, session: WdmWriteSession = None):
     saveData(
         aDyTSer=aDyTSer,
         column_name="DSOL",
@@ -220,11 +559,12 @@ def saveDailyDSOL(aDyTSer: pd.DataFrame, wdmpath: str, location: str, dsn=None):
         tcode=4,
         description="daily solar radiation",
         dsn_range=range(24, 205, 20),
-        dsn=dsn
+        dsn=dsn,
+        session=session
     )
 
 
-def saveDailyDEVT(aDyTSer: pd.DataFrame, wdmpath: str, location: str, dsn=None):
+def saveDailyDEVT(aDyTSer: pd.DataFrame, wdmpath: str, location: str, dsn=None, session: WdmWriteSession = None):
     saveData(
         aDyTSer=aDyTSer,
         column_name="DEVT",
@@ -234,11 +574,12 @@ def saveDailyDEVT(aDyTSer: pd.DataFrame, wdmpath: str, location: str, dsn=None):
         tcode=4,
         description="daily evapotranspiration",
         dsn_range=range(25, 206, 20),
-        dsn=dsn
+        dsn=dsn,
+        session=session
     )
 
 
-def saveDailyDEVP(aDyTSer: pd.DataFrame, wdmpath: str, location: str, dsn=None):
+def saveDailyDEVP(aDyTSer: pd.DataFrame, wdmpath: str, location: str, dsn=None, session: WdmWriteSession = None):
     saveData(
         aDyTSer=aDyTSer,
         column_name="DEVP",
@@ -248,13 +589,14 @@ def saveDailyDEVP(aDyTSer: pd.DataFrame, wdmpath: str, location: str, dsn=None):
         tcode=4,
         description="daily evaporation",
         dsn_range=range(26, 207, 20),
-        dsn=dsn
+        dsn=dsn,
+        session=session
     )
 
 
 # --------------------------保存逐小时数据-------------------------------
 
-def saveHourlyPREC(aDyTSer: pd.DataFrame, wdmpath: str, location: str, dsn=None):
+def saveHourlyPREC(aDyTSer: pd.DataFrame, wdmpath: str, location: str, dsn=None, session: WdmWriteSession = None):
     saveData(
         aDyTSer=aDyTSer,
         column_name="PREC",
@@ -264,11 +606,12 @@ def saveHourlyPREC(aDyTSer: pd.DataFrame, wdmpath: str, location: str, dsn=None)
         tcode=3,
         description="Hourly Precipitation disaggregated from Daily",
         dsn_range=range(11, 192, 20),
-        dsn=dsn
+        dsn=dsn,
+        session=session
     )
 
 
-def saveHourlyEVAP(aDyTSer: pd.DataFrame, wdmpath: str, location: str, dsn=None):
+def saveHourlyEVAP(aDyTSer: pd.DataFrame, wdmpath: str, location: str, dsn=None, session: WdmWriteSession = None):
     saveData(
         aDyTSer=aDyTSer,
         column_name="EVAP",
@@ -278,11 +621,12 @@ def saveHourlyEVAP(aDyTSer: pd.DataFrame, wdmpath: str, location: str, dsn=None)
         tcode=3,
         description="hourly evaporation",
         dsn_range=range(12, 193, 20),
-        dsn=dsn
+        dsn=dsn,
+        session=session
     )
 
 
-def saveHourlyATEM(aDyTSer: pd.DataFrame, wdmpath: str, location: str, dsn=None):
+def saveHourlyATEM(aDyTSer: pd.DataFrame, wdmpath: str, location: str, dsn=None, session: WdmWriteSession = None):
     saveData(
         aDyTSer=aDyTSer,
         column_name="ATEM",
@@ -292,11 +636,12 @@ def saveHourlyATEM(aDyTSer: pd.DataFrame, wdmpath: str, location: str, dsn=None)
         tcode=3,
         description="hourly temperature",
         dsn_range=range(13, 194, 20),
-        dsn=dsn
+        dsn=dsn,
+        session=session
     )
 
 
-def saveHourlyWIND(aDyTSer: pd.DataFrame, wdmpath: str, location: str, dsn=None):
+def saveHourlyWIND(aDyTSer: pd.DataFrame, wdmpath: str, location: str, dsn=None, session: WdmWriteSession = None):
     saveData(
         aDyTSer=aDyTSer,
         column_name="WIND",
@@ -306,11 +651,12 @@ def saveHourlyWIND(aDyTSer: pd.DataFrame, wdmpath: str, location: str, dsn=None)
         tcode=3,
         description="hourly windspeed",
         dsn_range=range(14, 195, 20),
-        dsn=dsn
+        dsn=dsn,
+        session=session
     )
 
 
-def saveHourlySOLR(aDyTSer: pd.DataFrame, wdmpath: str, location: str, dsn=None):
+def saveHourlySOLR(aDyTSer: pd.DataFrame, wdmpath: str, location: str, dsn=None, session: WdmWriteSession = None):
     saveData(
         aDyTSer=aDyTSer,
         column_name="SOLR",
@@ -320,11 +666,12 @@ def saveHourlySOLR(aDyTSer: pd.DataFrame, wdmpath: str, location: str, dsn=None)
         tcode=3,
         description="hourly solar radiation",
         dsn_range=range(15, 196, 20),
-        dsn=dsn
+        dsn=dsn,
+        session=session
     )
 
 
-def saveHourlyPEVT(aDyTSer: pd.DataFrame, wdmpath: str, location: str, dsn=None):
+def saveHourlyPEVT(aDyTSer: pd.DataFrame, wdmpath: str, location: str, dsn=None, session: WdmWriteSession = None):
     saveData(
         aDyTSer=aDyTSer,
         column_name="PEVT",
@@ -334,11 +681,12 @@ def saveHourlyPEVT(aDyTSer: pd.DataFrame, wdmpath: str, location: str, dsn=None)
         tcode=3,
         description="hourly potential evapotranspiration",
         dsn_range=range(16, 197, 20),
-        dsn=dsn
+        dsn=dsn,
+        session=session
     )
 
 
-def saveHourlyDEWP(aDyTSer: pd.DataFrame, wdmpath: str, location: str, dsn=None):
+def saveHourlyDEWP(aDyTSer: pd.DataFrame, wdmpath: str, location: str, dsn=None, session: WdmWriteSession = None):
     saveData(
         aDyTSer=aDyTSer,
         column_name="DEWP",
@@ -348,11 +696,12 @@ def saveHourlyDEWP(aDyTSer: pd.DataFrame, wdmpath: str, location: str, dsn=None)
         tcode=3,
         description="hourly dewpoint temperature",
         dsn_range=range(17, 198, 20),
-        dsn=dsn
+        dsn=dsn,
+        session=session
     )
 
 
-def saveHourlyCLOU(aDyTSer: pd.DataFrame, wdmpath: str, location: str, dsn=None):
+def saveHourlyCLOU(aDyTSer: pd.DataFrame, wdmpath: str, location: str, dsn=None, session: WdmWriteSession = None):
     saveData(
         aDyTSer=aDyTSer,
         column_name="CLOU",
@@ -362,5 +711,6 @@ def saveHourlyCLOU(aDyTSer: pd.DataFrame, wdmpath: str, location: str, dsn=None)
         tcode=3,
         description="hourly cloud cover",
         dsn_range=range(18, 199, 20),
-        dsn=dsn
+        dsn=dsn,
+        session=session
     )
@@ -0,0 +1,125 @@
+from typing import Iterable, Optional
+
+import numpy as np
+import pandas as pd
+
+from MetUtils import read_dsn
+from MetInstrument import span
+
+"""
+运行期间的序列缓存
+逐日步骤写入WDM的同时把序列按(站点, 时序类型)保存在内存中，后续的逐日派生步骤和逐小时步骤直接使用，
+缓存中没有时才从WDM文件读取。缓存中的序列与从WDM读回的序列完全一致(单精度取值、缺测为NaN、列名为时序类型)。
+"""
+
+# 默认只缓存逐日序列(tcode=4)，逐小时序列没有后续步骤使用，而且占用内存是逐日的24倍
+DEFAULT_STORE_TCODES = (4,)
+
+
+class SeriesStore:
+    """
+    按(站点, 时序类型)保存序列，一般一次处理流程使用一个。
+    用法:
+        store = SeriesStore()
+        metTmax(..., store=store)
+        metHourlyATEM(..., store=store)
+    """
+
+    def __init__(self, tcodes: Iterable[int] = DEFAULT_STORE_TCODES):
+        """
+        :param tcodes: 需要缓存的WDM时间单位，3为小时，4为天
+        """
+        self.tcodes = tuple(tcodes)
+        self._series = {}
+        self.hits = 0
+        self.misses = 0
+
+    def __repr__(self):
+        return f"SeriesStore(series={len(self._series)}, hits={self.hits}, misses={self.misses})"
+
+    def __len__(self):
+        return len(self._series)
+
+    def __contains__(self, key):
+        station, tstype = key
+        return (str(station).strip(), tstype) in self._series
+
+    def accepts(self, tcode: int) -> bool:
+        """该时间单位的序列是否需要缓存"""
+        return int(tcode) in self.tcodes
+
+    def put(self, station: str, tstype: str, data: pd.DataFrame):
+        """
+        保存序列，同一站点同一时序类型的旧序列被覆盖
+        :param station: 站点ID
+        :param tstype: 时序类型
+        :param data: 只有一列的DataFrame，列名会被改为时序类型
+        """
+        data = data.copy()
+        data.columns = [tstype]
+        self._series[(str(station).strip(), tstype)] = data
+
+    def put_values(self, station: str, tstype: str, index: pd.DatetimeIndex, values: np.ndarray,
+                   tsfill: float = -999.0):
+        """
+        按写入WDM的取值保存序列，转换方式与wdmutil.WDM.read_dsn一致
+        :param station: 站点ID
+        :param tstype: 时序类型
+        :param index: 等间隔时间索引
+        :param values: 写入WDM的单精度取值，缺测为tsfill
+        :param tsfill: 缺测填充值
+        """
+        data = pd.DataFrame({tstype: np.asarray(values, dtype=np.float64)}, index=index)
+        data.replace(tsfill, np.nan, inplace=True)
+        data.index.name = "Datetime"
+        self._series[(str(station).strip(), tstype)] = data
+
+    def get(self, station: str, tstype: str) -> Optional[pd.DataFrame]:
+        """
+        获取序列的副本
+        :return: 缓存中没有时返回None
+        """
+        data = self._series.get((str(station).strip(), tstype))
+        return None if data is None else data.copy()
+
+    def read(self, wdmpath: str, station: str, dsn: int, tstype: str) -> pd.DataFrame:
+        """
+        获取序列，缓存中没有时从WDM文件读取并缓存
+        :param wdmpath: wdm文件路径
+        :param station: 站点ID
+        :param dsn: 数据序列编号，缓存中没有时使用
+        :param tstype: 时序类型名称
+        :return: 列名为时序类型的DataFrame
+        """
+        data = self.get(station, tstype)
+        if data is not None:
+            self.hits += 1
+            return data
+        self.misses += 1
+        data = read_dsn(wdmpath, dsn, tstype)
+        self.put(station, tstype, data)
+        return data
+
+    def discard(self, station: str, tstype: str):
+        """删除一个序列"""
+        self._series.pop((str(station).strip(), tstype), None)
+
+    def clear(self):
+        """清空缓存"""
+        self._series.clear()
+
+
+def read_series(wdmpath: str, station: str, dsn: int, tstype: str, store: SeriesStore = None) -> pd.DataFrame:
+    """
+    读取站点的序列，有缓存时优先使用缓存，参数与MetUtils.read_dsn一致
+    :param wdmpath: wdm文件路径
+    :param station: 站点ID
+    :param dsn: 数据序列编号
+    :param tstype: 时序类型名称
+    :param store: 序列缓存，为None时直接从WDM文件读取
+    :return: 列名为时序类型的DataFrame
+    """
+    with span("read", station=station, dsn=dsn, tstype=tstype) as record:
+        series = read_dsn(wdmpath, dsn, tstype) if store is None else store.read(wdmpath, station, dsn, tstype)
+        record["rows"] = len(series)
+    return series
@@ -1,10 +1,51 @@
 import os
+import threading
 from typing import Union, List
 
 import numpy as np
 import pandas as pd
 from wdmtoolbox import wdmutil
 
+# WDM的Fortran库使用全局的文件单元和缓冲区，同一进程内的WDM读写(包括多个线程同时运行的处理步骤)都要持有这个锁
+WDM_IO_LOCK = threading.RLock()
+
+# 逐小时序列的数据类型。WDM按单精度保存，float32时逐小时分解结果直到写入WDM都保持单精度，内存减半；
+# 分解仍按float64计算，只在最后转换一次，写入WDM的取值与float64相同，容差见Metcalalg.check_hourly_dtype_tolerance。
+# 默认为float64，通过 set_default_hourly_dtype 或环境变量 HSPF_MET_HOURLY_DTYPE 设置
+HOURLY_DTYPES = ("float64", "float32")
+ENV_HOURLY_DTYPE = "HSPF_MET_HOURLY_DTYPE"
+_default_hourly_dtype = None
+
+
+def _check_hourly_dtype(dtype) -> np.dtype:
+    dtype = np.dtype(dtype)
+    if dtype.name not in HOURLY_DTYPES:
+        raise ValueError(f"不支持的逐小时数据类型{dtype.name}，可选: {', '.join(HOURLY_DTYPES)}")
+    return dtype
+
+
+def set_default_hourly_dtype(dtype: Union[str, type, None]):
+    """
+    设置逐小时序列的默认数据类型，同时设置环境变量，进程池中的工作进程使用相同的类型
+    :param dtype: "float32"、"float64"或对应的numpy类型，为None时恢复为float64
+    """
+    global _default_hourly_dtype
+    _default_hourly_dtype = None if dtype is None else _check_hourly_dtype(dtype)
+    os.environ[ENV_HOURLY_DTYPE] = "" if dtype is None else _default_hourly_dtype.name
+
+
+def get_hourly_dtype(dtype: Union[str, type, None] = None) -> np.dtype:
+    """
+    逐小时序列的数据类型
+    :param dtype: 指定的类型，为None时使用默认类型
+    :return: np.dtype
+    """
+    if dtype is not None:
+        return _check_hourly_dtype(dtype)
+    if _default_hourly_dtype is not None:
+        return _default_hourly_dtype
+    return _check_hourly_dtype(os.environ.get(ENV_HOURLY_DTYPE) or "float64")
+
 def validate_data(aInTS: pd.DataFrame, column: Union[int, str]):
     """
     校验数据，校验数据是否为pandas的DataFrame,索引是否为类型DatetimeIndex，column列是否在数据DataFrame
@@ -118,21 +159,49 @@ def read_dsn(wdmpath:str, dsn:int, tsytpe: str):
     :return:
     """
     wdm = wdmutil.WDM()
-    dsn_data = wdm.read_dsn(wdmpath, dsn)
+    with WDM_IO_LOCK:
+        dsn_data = wdm.read_dsn(wdmpath, dsn)
     tmin_source_name = f'{os.path.basename(wdmpath)[:-4]}_DSN_{dsn}'
     dsn_data.rename(columns={tmin_source_name: tsytpe}, inplace=True)
     return dsn_data
 
+# 降水特殊值编码表(CMA逐日降水)，按顺序匹配，先匹配的规则生效，对应的标记为规则序号+1
+# (下限, 上限, 替换值, 偏移量)：替换值不为None时直接替换，否则为 原值 - 偏移量
+PREC_SPECIAL_CODES = [
+    (32766, 32766, np.nan, None),  # 缺测
+    (32744, 32744, np.nan, None),  # 空白
+    (32700, 32700, 0.0, None),  # 微量降水
+    (32000, 32999, None, 32000),  # 纯雾露霜
+    (31000, 31999, None, 31000),  # 雨和雪的总量
+    (30000, 30999, None, 30000),  # 雪量(仅包括雨夹雪、雪暴)
+]
+
+
+def decode_prec_special_values(values, code_table: List[tuple] = None):
+    """
+    一次性解码整列降水数据中的特殊值
+    :param values: 降水数据，数组或Series
+    :param code_table: 特殊值编码表，格式同PREC_SPECIAL_CODES，默认为None使用CMA编码表
+    :return: 解码后的float64数组，以及每个值对应的规则标记(uint8数组，0表示普通值，k表示第k条规则)
+    """
+    if code_table is None:
+        code_table = PREC_SPECIAL_CODES
+    if len(code_table) > np.iinfo(np.uint8).max:
+        raise ValueError(f"编码表最多{np.iinfo(np.uint8).max}条规则，当前有{len(code_table)}条")
+    raw = np.asarray(values, dtype="float64")
+    decoded = raw.copy()
+    flags = np.zeros(raw.shape, dtype=np.uint8)
+    for k, (low, high, value, offset) in enumerate(code_table, start=1):
+        hit = (flags == 0) & (raw >= low) & (raw <= high)
+        if not hit.any():
+            continue
+        decoded[hit] = value if value is not None else raw[hit] - offset
+        flags[hit] = k
+    return decoded, flags
+
+
 def prec_special_values(x):
-    if (x == 32766) or (x == 32744):
-        return np.nan
-    elif x == 32700:
-        return 0
-    elif x >= 3200:
-        return x - 32000
-    elif x >= 31000:
-        return x - 31000
-    elif x >= 30000:
-        return x - 30000
-    else:
-        return x
+    """
+    解码单个降水特殊值，批量数据请使用decode_prec_special_values
+    """
+    return decode_prec_special_values(np.array([x]))[0][0]
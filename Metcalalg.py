@@ -1,5 +1,6 @@
 import math
-from typing import Union
+from functools import lru_cache
+from typing import List, Union
 
 import numpy as np
 import pandas as pd
@@ -8,8 +9,9 @@ import missingfill as msfl
 import wdmtoolbox as wdm
 from wdmtoolbox import wdmutil
 from MetUtils import *
-from pandarallel import pandarallel
-pandarallel.initialize(verbose=0)
+from MetExecutor import MetExecutor, get_executor
+from MetMemo import memoize
+from MetDataset import MetDataset, combine_coverage
 """
 逐日分解
 1. 温度分解：DisTemp
@@ -19,12 +21,15 @@ pandarallel.initialize(verbose=0)
 5. 露点温度：恒定假设，直接使用重采样，向前填充
 6,7. 潜在蒸散或蒸发：DisPET
 8. 降雨分解：
+参数为MetDataset时一次分解所有站点，返回逐小时的MetDataset
 """
 """
 计算逐日
 1. PET: PanEvaporationValueComputedByHamon
 2. ET: PanEvaporationValueComputedByPenman
-
+参数为MetDataset时一次计算所有站点，返回逐日的MetDataset
+多站点的蒸发由 HamonEvaporationArray、PenmanEvaporationArray 按 站点数×天数 数组分块计算，
+每块在几个复用的缓冲数组中原地完成整个公式
 """
 
 DegreesToRadians = 0.01745329252
@@ -130,302 +135,699 @@ Sums = [0.01, 0.02, 0.04, 0.08, 0.16, 0.32, 0.64, 1.28, 2.56, 5.12, 10.24, 20.48
 defHMonCoeff = np.array([0, 0.0055, 0.0055, 0.0055, 0.0055, 0.0055, 0.0055, 0.0055, 0.0055, 0.0055, 0.0055, 0.0055, 0.0055])
 
 
-def CloudCoverTimeseriesFromSolar(solar_data: pd.DataFrame, aDegLat):
+XLaxTable = np.asarray(XLax, dtype="float64")
+X1Table = np.asarray(X1, dtype="float64")
+cTable = np.asarray(c, dtype="float64")
+
+
+@lru_cache(maxsize=4096)
+def CloudCoverLatitudeCoefficients(aDegLat: float):
     """
-    根据辐射数据计算云量，辐射数据的索引为时间
-    :param solar_data: 辐射数据
-    :param aDegLat: 维度
-    :return:
+    云量计算中与纬度有关的系数，按纬度缓存，同一纬度只计算一次
+    :param aDegLat: 纬度
+    :return: (A0, A1, A2, A3, b1, b2, 指数, 斜率, 截距)
     """
     lLatInt = int(np.floor(aDegLat))
     lLatFrac = aDegLat - lLatInt
     lLatFrac = 0.0 if lLatFrac <= 0.0001 else lLatFrac
-
-    A0 = XLax[lLatInt][1] + lLatFrac * (XLax[lLatInt + 1][1] - XLax[lLatInt][1])
-    A1 = XLax[lLatInt][2] + lLatFrac * (XLax[lLatInt + 1][2] - XLax[lLatInt][2])
-    A2 = XLax[lLatInt][3] + lLatFrac * (XLax[lLatInt + 1][3] - XLax[lLatInt][3])
-    A3 = XLax[lLatInt][4] + lLatFrac * (XLax[lLatInt + 1][4] - XLax[lLatInt][4])
-    b1 = XLax[lLatInt][5] + lLatFrac * (XLax[lLatInt + 1][5] - XLax[lLatInt][5])
-    b2 = XLax[lLatInt][6] + lLatFrac * (XLax[lLatInt + 1][6] - XLax[lLatInt][6])
+    A0, A1, A2, A3, b1, b2 = XLaxTable[lLatInt, 1:7] + lLatFrac * (XLaxTable[lLatInt + 1, 1:7] - XLaxTable[lLatInt, 1:7])
 
     a = aDegLat - 25.0
     b = aDegLat - 44.0
-
+    if aDegLat > 43.0:
+        Exp2 = 0.725 + 0.00288 * b
+        Lat3 = 2.9 - 0.0629 * b
+        Lat4 = 18.0 + 0.833 * b
+        return A0, A1, A2, A3, b1, b2, Exp2, Lat3, Lat4
     Exp1 = 0.7575 - 0.0018 * a
-    Exp2 = 0.725 + 0.00288 * b
     Lat1 = 2.139 + 0.0423 * a
     Lat2 = 30.0 - 0.667 * a
-    Lat3 = 2.9 - 0.0629 * b
-    Lat4 = 18.0 + 0.833 * b
+    return A0, A1, A2, A3, b1, b2, Exp1, Lat1, Lat2
+
+
+def CloudCoverTimeseriesFromSolar(solar_data: Union[pd.Series, pd.DataFrame], aDegLat):
+    """
+    根据辐射数据计算云量，辐射数据的索引为时间。
+    solar_data为DataFrame时每一列为一个站点，可以一次计算多个站点。
+    :param solar_data: 辐射数据
+    :param aDegLat: 纬度，多个站点时为与列数相同的纬度列表，也可以是所有站点共用的一个纬度
+    :return: 与solar_data形状和索引相同的结果
+    """
+    values = solar_data.to_numpy(dtype="float64")
+    values2d = values.reshape(len(values), -1)
+    lats = np.broadcast_to(np.atleast_1d(np.asarray(aDegLat, dtype="float64")), (values2d.shape[1],))
+    A0, A1, A2, A3, b1, b2, lExp, lSlope, lOffset = \
+        np.array([CloudCoverLatitudeCoefficients(float(lat)) for lat in lats]).T[:, None, :]
 
     # Percent sunshine
-    SS = 100 * (1 - solar_data / 10) ** (5 / 3)
-    SS = SS.clip(lower=0)
+    with np.errstate(invalid="ignore"):
+        SS = 100 * (1 - values2d / 10) ** (5 / 3)
+    SS = np.maximum(SS, 0)
 
     # convert to radians
-    x = np.array(list(map(lambda i: X1[i[0]] + i[1], zip(solar_data.index.month - 1, solar_data.index.day))))
+    month = solar_data.index.month.to_numpy() - 1
+    x = (X1Table[month] + solar_data.index.day.to_numpy())[:, None]
     x *= DegreesToRadians
 
     Y100 = (A0
-            + A1 * math.cos(x)
-            + A2 * math.cos(2.0 * x)
-            + A3 * math.cos(3.0 * x)
-            + b1 * math.sin(x)
-            + b2 * math.sin(2.0 * x))
+            + A1 * np.cos(x)
+            + A2 * np.cos(2.0 * x)
+            + A3 * np.cos(3.0 * x)
+            + b1 * np.sin(x)
+            + b2 * np.sin(2.0 * x))
 
     ii = np.ceil((SS + 10) / 10)
+    with np.errstate(invalid="ignore"):
+        YRD = lSlope * SS ** lExp + lOffset
+    lRows, lCols = np.nonzero(ii < 11)
+    YRD[lRows, lCols] += cTable[ii[lRows, lCols].astype(int), month[lRows]]
+    lLow = YRD < 100
+    YRD[lLow] = np.broadcast_to(Y100, YRD.shape)[lLow] * YRD[lLow] / 100
+    if isinstance(solar_data, pd.DataFrame):
+        return pd.DataFrame(YRD, index=solar_data.index, columns=solar_data.columns)
+    return pd.Series(YRD[:, 0], index=solar_data.index, name=solar_data.name)
+
+
+# 逐小时温度分解系数表：小时 -> (基准温度, 温差, 系数)，小时温度 = 基准温度 + 系数 * 温差
+# 基准温度：CurMin 当日最低，CurMax 当日最高，NxtMin 次日最低
+# 温差：Dif1 = PreMax - CurMin，Dif2 = CurMin - CurMax，Dif3 = CurMax - NxtMin，None 表示直接取基准温度
+DisTempCoefficients = [
+    ('NxtMin', 'Dif3', 0.22),
+    ('CurMin', 'Dif1', 0.15),
+    ('CurMin', 'Dif1', 0.1),
+    ('CurMin', 'Dif1', 0.06),
+    ('CurMin', 'Dif1', 0.03),
+    ('CurMin', 'Dif1', 0.01),
+    ('CurMin', None, 0.0),
+    ('CurMin', 'Dif2', -0.16),
+    ('CurMin', 'Dif2', -0.31),
+    ('CurMin', 'Dif2', -0.45),
+    ('CurMin', 'Dif2', -0.59),
+    ('CurMin', 'Dif2', -0.71),
+    ('CurMin', 'Dif2', -0.81),
+    ('CurMin', 'Dif2', -0.89),
+    ('CurMin', 'Dif2', -0.95),
+    ('CurMin', 'Dif2', -0.99),
+    ('CurMax', None, 0.0),
+    ('NxtMin', 'Dif3', 0.89),
+    ('NxtMin', 'Dif3', 0.78),
+    ('NxtMin', 'Dif3', 0.67),
+    ('NxtMin', 'Dif3', 0.57),
+    ('NxtMin', 'Dif3', 0.47),
+    ('NxtMin', 'Dif3', 0.38),
+    ('NxtMin', 'Dif3', 0.29),
+]
 
-    if aDegLat > 43.0:
-        YRD = Lat3 * SS ** Exp2 + Lat4
+
+def _shift_fill(values: np.ndarray, periods: int, fill: str = None):
+    """
+    沿最后一个轴按位置平移数组，与 Series.shift(periods) 之后再 ffill()/bfill() 一致(整个序列的空值都会被填充)
+    :param values: 逐日数组，二维时每一行为一个站点
+    :param periods: 平移的天数，负数表示取后面的值
+    :param fill: "ffill"、"bfill"或None
+    :return: 平移后的数组
+    """
+    n = values.shape[-1]
+    shifted = np.full(values.shape, np.nan)
+    if periods >= 0:
+        shifted[..., periods:] = values[..., :n - periods]
     else:
-        YRD = Lat1 * SS ** Exp1 + Lat2
-    c11 = np.array(list(map(lambda i: c[i[0]][i[1]], zip(ii[ii < 11], solar_data.index.month[ii < 11] - 1))))
-    YRD[ii < 11] = YRD[ii < 11] + c11
-    YRD[YRD < 100] = Y100[YRD < 100] * YRD[YRD < 100] / 100
-    return YRD
+        shifted[..., :n + periods] = values[..., -periods:]
+    if fill is None:
+        return shifted
+    if fill == "bfill":
+        return _shift_fill(shifted[..., ::-1], 0, "ffill")[..., ::-1]
+    valid = ~np.isnan(shifted)
+    last = np.maximum.accumulate(np.where(valid, np.arange(n), 0), axis=-1)
+    return np.take_along_axis(shifted, last, axis=-1)
+
+
+def _dataset_inputs(*datasets: MetDataset):
+    """检查参与计算的数据集有相同的站点和时间轴，返回第一个数据集"""
+    first = datasets[0]
+    for other in datasets[1:]:
+        if other is not first and (other.stations != first.stations or not other.times.equals(first.times)):
+            raise ValueError("参与计算的数据集必须有相同的站点和时间轴")
+    if first.freq != "D":
+        raise ValueError(f"逐日计算需要逐日的数据集，当前时间轴频率为{first.freq}")
+    return first
+
+
+def _dataset_latitudes(aDataset: MetDataset, aLatDeg=None):
+    """数据集每个站点的纬度：aLatDeg为None时使用数据集中的站点纬度，否则所有站点使用aLatDeg，并检查纬度范围"""
+    if aLatDeg is None:
+        lats = aDataset.require_latitudes()
+    else:
+        lats = np.broadcast_to(np.asarray(aLatDeg, dtype="float64"), (len(aDataset),))
+    if np.any((lats < MetComputeLatitudeMin) | (lats > MetComputeLatitudeMax)):
+        raise ValueError(f'Latitude must be between {MetComputeLatitudeMin} and {MetComputeLatitudeMax}')
+    return lats
+
 
+def _latitude_groups(lats: np.ndarray):
+    """按纬度分组，依次返回(纬度, 该纬度的站点行号)，相同纬度的站点共用一次系数表查表"""
+    unique, inverse = np.unique(lats, return_inverse=True)
+    for k, lat in enumerate(unique):
+        yield float(lat), np.flatnonzero(inverse == k)
 
-def DisTemp(aMnTmpTS: pd.DataFrame, aMxTmpTS: pd.DataFrame, aObsTime):
+
+def DisTempArray(aMnTmp: np.ndarray, aMxTmp: np.ndarray, aObsTime, dtype=np.float64):
     """
-    根据逐日的最小最大温度和观测时间分解到逐小时的温度，最小温度和最大温度索引都是逐日的时间。
-    :param aMnTmpTS: 最小温度
-    :param aMxTmpTS: 最大温度
+    根据逐日的最小最大温度和观测时间分解到逐小时的温度
+    :param aMnTmp: 逐日最小温度，连续的逐日数组，二维时每一行为一个站点
+    :param aMxTmp: 逐日最大温度，与最小温度形状相同
     :param aObsTime: 观察时间
-    :return:
+    :param dtype: 结果的数据类型，np.float64或np.float32
+    :return: 天数×24的逐小时温度，二维输入时为 站点数×天数×24
     """
+    aMnTmp = np.asarray(aMnTmp, dtype="float64")
+    aMxTmp = np.asarray(aMxTmp, dtype="float64")
+    # 根据观测时间确定当日最低、次日最低、前日最高和当日最高
     if aObsTime < 6:
-        lCurMin = aMnTmpTS.shift(periods=-1)
-        lNxtMin = aMnTmpTS.shift(periods=-2)
-        lCurMin.ffill(inplace=True)
-        lNxtMin.ffill(inplace=True)
+        lCurMin = _shift_fill(aMnTmp, -1, "ffill")
+        lNxtMin = _shift_fill(aMnTmp, -2, "ffill")
     else:
-        lCurMin = aMnTmpTS
-        lNxtMin = aMnTmpTS.shift(periods=-1)
-        lNxtMin.ffill(inplace=True)
+        lCurMin = aMnTmp
+        lNxtMin = _shift_fill(aMnTmp, -1, "ffill")
     if aObsTime > 16:
-        lCurMax = aMxTmpTS
-        lPreMax = aMxTmpTS.shift(periods=1)
-        lPreMax.bfill(inplace=True)
+        lCurMax = aMxTmp
+        lPreMax = _shift_fill(aMxTmp, 1, "bfill")
     else:
-        lPreMax = aMxTmpTS
-        lCurMax = aMxTmpTS.shift(periods=-1)
-        lCurMax.ffill(inplace=True)
+        lPreMax = aMxTmp
+        lCurMax = _shift_fill(aMxTmp, -1, "ffill")
+
+    lBase = {'CurMin': lCurMin, 'CurMax': lCurMax, 'NxtMin': lNxtMin}
+    lDif = {'Dif1': lPreMax - lCurMin, 'Dif2': lCurMin - lCurMax, 'Dif3': lCurMax - lNxtMin}
+    base_names = list(lBase)
+    dif_names = list(lDif)
+    base_idx = np.array([base_names.index(base) for base, _, _ in DisTempCoefficients])
+    dif_idx = np.array([dif_names.index(dif) if dif else 0 for _, dif, _ in DisTempCoefficients])
+    has_dif = np.array([dif is not None for _, dif, _ in DisTempCoefficients])
+    coef = np.array([k for _, _, k in DisTempCoefficients])
+
+    lBases = np.stack([lBase[name] for name in base_names], axis=-1)[..., base_idx]  # 天数×24
+    lDifs = np.stack([lDif[name] for name in dif_names], axis=-1)[..., dif_idx]
+    lHRTemp = np.where(has_dif, lBases + lDifs * coef, lBases)
+    return lHRTemp.astype(dtype, copy=False)
+
+
+@memoize
+def DisTemp(aMnTmpTS: pd.DataFrame, aMxTmpTS: pd.DataFrame, aObsTime, dtype=np.float64):
+    """
+    根据逐日的最小最大温度和观测时间分解到逐小时的温度，最小温度和最大温度索引都是逐日的时间。
+    :param aMnTmpTS: 最小温度，或包含TMIN的逐日MetDataset
+    :param aMxTmpTS: 最大温度，或包含TMAX的逐日MetDataset
+    :param aObsTime: 观察时间
+    :param dtype: 结果的数据类型，np.float64或np.float32
+    :return: 逐小时温度，参数为MetDataset时为包含ATEM的逐小时MetDataset
+    """
+    if isinstance(aMnTmpTS, MetDataset):
+        ds = _dataset_inputs(aMnTmpTS, aMxTmpTS)
+        lHRTemp = DisTempArray(aMnTmpTS["TMIN"], aMxTmpTS["TMAX"], aObsTime, dtype)
+        hours = pd.date_range(ds.times[0], periods=24 * len(ds.times), freq="h")
+        return ds.derive({"ATEM": lHRTemp.reshape(len(ds), -1)}, hours)
+    aMnTmp = aMnTmpTS['TMIN'].to_numpy(dtype="float64")
+    aMxTmp = aMxTmpTS['TMAX'].reindex(aMnTmpTS.index).to_numpy(dtype="float64")
+    enddate = aMnTmpTS.index.max() + pd.Timedelta(days=1)
+    hours = pd.date_range(aMnTmpTS.index.min(), enddate, freq="h", inclusive="left")
+    if len(hours) != 24 * len(aMnTmp):
+        raise ValueError(f"逐日温度必须是连续的逐日序列，{len(aMnTmp)}天对应{len(hours)}小时")
+    lHRTemp = DisTempArray(aMnTmp, aMxTmp, aObsTime, dtype)
+    return pd.DataFrame({"ATEM": lHRTemp.ravel()}, index=hours)
 
-    lDif1 = lPreMax['TMAX'] - lCurMin['TMIN']
-    lDif2 = lCurMin['TMIN'] - lCurMax['TMAX']
-    lDif3 = lCurMax['TMAX'] - lNxtMin['TMIN']
 
-    enddate = aMnTmpTS.index.max() + pd.Timedelta(days=1)
-    lHRTemp = pd.DataFrame(index=pd.date_range(aMnTmpTS.index.min(), enddate, freq="h", inclusive="left"),
-                           columns=["ATEM"])
-
-    lHRTemp.iloc[1::24, 0] = lCurMin['TMIN'] + lDif1 * 0.15
-    lHRTemp.iloc[2::24, 0] = lCurMin['TMIN'] + lDif1 * 0.1
-    lHRTemp.iloc[3::24, 0] = lCurMin['TMIN'] + lDif1 * 0.06
-    lHRTemp.iloc[4::24, 0] = lCurMin['TMIN'] + lDif1 * 0.03
-    lHRTemp.iloc[5::24, 0] = lCurMin['TMIN'] + lDif1 * 0.01
-    lHRTemp.iloc[6::24, 0] = lCurMin['TMIN']
-    lHRTemp.iloc[7::24, 0] = lCurMin['TMIN'] - lDif2 * 0.16
-    lHRTemp.iloc[8::24, 0] = lCurMin['TMIN'] - lDif2 * 0.31
-    lHRTemp.iloc[9::24, 0] = lCurMin['TMIN'] - lDif2 * 0.45
-    lHRTemp.iloc[10::24, 0] = lCurMin['TMIN'] - lDif2 * 0.59
-    lHRTemp.iloc[11::24, 0] = lCurMin['TMIN'] - lDif2 * 0.71
-    lHRTemp.iloc[12::24, 0] = lCurMin['TMIN'] - lDif2 * 0.81
-    lHRTemp.iloc[13::24, 0] = lCurMin['TMIN'] - lDif2 * 0.89
-    lHRTemp.iloc[14::24, 0] = lCurMin['TMIN'] - lDif2 * 0.95
-    lHRTemp.iloc[15::24, 0] = lCurMin['TMIN'] - lDif2 * 0.99
-    lHRTemp.iloc[16::24, 0] = lCurMax['TMAX']
-    lHRTemp.iloc[17::24, 0] = lNxtMin['TMIN'] + lDif3 * 0.89
-    lHRTemp.iloc[18::24, 0] = lNxtMin['TMIN'] + lDif3 * 0.78
-    lHRTemp.iloc[19::24, 0] = lNxtMin['TMIN'] + lDif3 * 0.67
-    lHRTemp.iloc[20::24, 0] = lNxtMin['TMIN'] + lDif3 * 0.57
-    lHRTemp.iloc[21::24, 0] = lNxtMin['TMIN'] + lDif3 * 0.47
-    lHRTemp.iloc[22::24, 0] = lNxtMin['TMIN'] + lDif3 * 0.38
-    lHRTemp.iloc[23::24, 0] = lNxtMin['TMIN'] + lDif3 * 0.29
-    lHRTemp.iloc[0::24, 0] = lNxtMin['TMIN'] + lDif3 * 0.22
-    return lHRTemp
-
-
-def DisSolar(aDayRad: pd.DataFrame, aLatDeg: float):
+def SolarDayGeometry(JulDay: np.ndarray, aLatDeg: float):
     """
-    Disaggregate daily SOLAR or PET to hourly
-    :param aInTs: input timeseries to be disaggregated
-    :param aLatDeg: Latitude, in degrees
-    :return:
+    逐日的太阳几何参数(HSP, Hydrocomp 1976)，每天只计算一次
+    :param JulDay: 年中的第几天，数组
+    :param aLatDeg: 纬度，单位为十进制角度
+    :return: 日长Delt，日出时刻TRise，分段时刻TR2、TR3、TR4(日落)，峰值系数CRAD，斜率SL，均为与JulDay等长的数组
     """
-    # check latitude
-    if MetComputeLatitudeMin > aLatDeg or aLatDeg > MetComputeLatitudeMax:
-        raise ValueError(f'Latitude must be between {MetComputeLatitudeMin} and {MetComputeLatitudeMax}')
-    # convert to radians
-    LatRdn = aLatDeg * DegreesToRadians
-    Phi = LatRdn
-
-    def cal_dis(row):
-        # julian date
-        rad_datetime = row['time']
-        # pandas中时间类可以直接获取年中的第几天
-        # JulDay = row['time'].dayofyear
-        #BASINS中
-        JulDay = 30.5 * (row['time'].month - 1) + row['time'].day
-        AD = 0.40928 * np.cos(0.0172141 * (172.0 - JulDay))
-        SS = np.sin(Phi) * np.sin(AD)
-        CS = np.cos(Phi) * np.cos(AD)
-        X2 = -SS / CS
-        Delt = 7.6394 * (1.5708 - np.atan(X2 / np.sqrt(1.0 - X2 ** 2)))
+    Phi = aLatDeg * DegreesToRadians
+    JulDay = np.asarray(JulDay, dtype="float64")
+    AD = 0.40928 * np.cos(0.0172141 * (172.0 - JulDay))
+    SS = np.sin(Phi) * np.sin(AD)
+    CS = np.cos(Phi) * np.cos(AD)
+    X2 = -SS / CS
+    with np.errstate(invalid="ignore", divide="ignore"):
+        Delt = 7.6394 * (1.5708 - np.arctan(X2 / np.sqrt(1.0 - X2 ** 2)))
         SunR = 12.0 - Delt / 2.0
         # develop hourly distribution given sunrise,sunset and length of day (DELT)
         DTR2 = Delt / 2.0
         DTR4 = Delt / 4.0
         CRAD = 0.66666667 / DTR2
         SL = CRAD / DTR4
-        TRise = SunR
-        TR2 = TRise + DTR4
-        TR3 = TR2 + DTR2
-        TR4 = TR3 + DTR4
-        RK = rad_datetime.hour
-        if RK > TRise:
-            if RK > TR2:
-                if RK > TR3:
-                    if RK > TR4:
-                        return 0.0
-                    else:
-                        return (CRAD - (RK - TR3) * SL) * row['DSOL']
-                else:
-                    return CRAD * row['DSOL']
-            else:
-                return (RK - TRise) * SL * row['DSOL']
-        else:
-            return 0.0
-
-    aHrRad = aDayRad.resample("h").ffill()
-    aHrRad['time'] = aHrRad.index.to_series()
-    # aHrRad['SOLR'] = aHrRad.apply(cal_dis, axis=1)
-    # parallel_apply
-    aHrRad['SOLR'] = aHrRad.parallel_apply(cal_dis, axis=1)
-    target_data = aHrRad['SOLR'].to_frame()
-    target_data = target_data.groupby(target_data.index.day).shift(periods=-1, fill_value=0)
-    return target_data
-
-
-def DisPET(aDayPet: pd.DataFrame, column: str, aLatDeg):
+    TRise = SunR
+    TR2 = TRise + DTR4
+    TR3 = TR2 + DTR2
+    TR4 = TR3 + DTR4
+    return Delt, TRise, TR2, TR3, TR4, CRAD, SL
+
+
+SolarGeometryColumns = ("Delt", "TRise", "TR2", "TR3", "TR4", "CRAD", "SL")
+SolarDayConventions = ("basins", "dayofyear")
+
+
+def SolarDayKeys(aDates: pd.DatetimeIndex, convention: str = "dayofyear"):
+    """
+    日期在太阳几何参数表中的行号
+    :param aDates: 日期
+    :param convention: 年中第几天的算法，"basins"：30.5 * (月 - 1) + 日，"dayofyear"：实际的年中第几天
+    :return: 行号数组
+    """
+    if convention == "basins":
+        return (aDates.month.to_numpy() - 1) * 31 + aDates.day.to_numpy()
+    if convention == "dayofyear":
+        return aDates.dayofyear.to_numpy()
+    raise ValueError(f"不支持的年中第几天算法{convention}，可选: {', '.join(SolarDayConventions)}")
+
+
+def _solar_table_julday(convention: str):
+    """太阳几何参数表每一行对应的年中第几天(JulDay)"""
+    if convention == "basins":
+        keys = np.arange(12 * 31 + 1)
+        return 30.5 * ((keys - 1) // 31) + ((keys - 1) % 31 + 1)
+    if convention == "dayofyear":
+        return np.arange(367, dtype="float64")
+    raise ValueError(f"不支持的年中第几天算法{convention}，可选: {', '.join(SolarDayConventions)}")
+
+
+@lru_cache(maxsize=256)
+def SolarGeometryTable(aLatDeg: float, convention: str = "dayofyear"):
+    """
+    一个纬度全年的太阳几何参数表，按(纬度, 年中第几天算法)缓存，行号由 SolarDayKeys 得到
+    :param aLatDeg: 纬度，单位为十进制角度
+    :param convention: 年中第几天的算法，"basins"或"dayofyear"
+    :return: 只读的 行数×len(SolarGeometryColumns) 数组，列依次为SolarGeometryColumns
+    """
+    table = np.stack(SolarDayGeometry(_solar_table_julday(convention), aLatDeg), axis=1)
+    table.setflags(write=False)
+    return table
+
+
+def SolarGeometry(aDates: pd.DatetimeIndex, aLatDeg: float, convention: str = "dayofyear"):
+    """
+    日期对应的太阳几何参数，从缓存的参数表中取值
+    :param aDates: 日期
+    :param aLatDeg: 纬度，单位为十进制角度
+    :param convention: 年中第几天的算法，"basins"或"dayofyear"
+    :return: 列名到数组的字典，列见SolarGeometryColumns
+    """
+    rows = SolarGeometryTable(float(aLatDeg), convention)[SolarDayKeys(aDates, convention)]
+    return dict(zip(SolarGeometryColumns, rows.T))
+
+
+@lru_cache(maxsize=256)
+def SolarDistributionTable(aLatDeg: float, convention: str = "dayofyear", aHourOffset: int = 0):
+    """
+    全年逐日分解到逐小时的分布系数表，按(纬度, 年中第几天算法, 小时偏移)缓存
+    :param aLatDeg: 纬度，单位为十进制角度
+    :param convention: 年中第几天的算法，"basins"或"dayofyear"
+    :param aHourOffset: 小时序号相对于小时的偏移，RK = hour + aHourOffset
+    :return: 只读的(系数表, 日照时段掩码表)，行号由 SolarDayKeys 得到
+    """
+    coef, active = SolarDistributionMatrix(SolarGeometryTable(aLatDeg, convention), aHourOffset)
+    coef.setflags(write=False)
+    active.setflags(write=False)
+    return coef, active
+
+
+def SolarDistributionMatrix(aGeometry: np.ndarray, aHourOffset: int = 0):
+    """
+    逐日分解到逐小时的分布系数矩阵(天数×24)
+    :param aGeometry: 太阳几何参数，天数×len(SolarGeometryColumns)，见 SolarGeometryTable
+    :param aHourOffset: 小时序号相对于小时的偏移，RK = hour + aHourOffset
+    :return: (系数矩阵, 是否在日照时段内的掩码)，日照时段外系数为0
+    """
+    _, TRise, TR2, TR3, TR4, CRAD, SL = (v[:, None] for v in np.asarray(aGeometry).T)
+    RK = np.arange(24, dtype="float64")[None, :] + aHourOffset
+    # 与逐小时的分段判断一致：上升段、峰值段、下降段，比较结果为假(包括NaN)时为0
+    rising = (RK > TRise) & ~(RK > TR2)
+    peak = (RK > TR2) & ~(RK > TR3)
+    falling = (RK > TR3) & ~(RK > TR4)
+    coef = np.select([rising, peak, falling], [(RK - TRise) * SL, CRAD, CRAD - (RK - TR3) * SL], 0.0)
+    return coef, rising | peak | falling
+
+
+def _daily_hour_layout(aDayTS: pd.Series):
+    """
+    逐日数据按 resample("h").ffill() 的方式展开到逐小时的布局
+    :param aDayTS: 逐日数据，索引为每天0时
+    :return: (逐日日期, 逐日值(缺少的日期向前填充), 逐小时索引)
+    """
+    days = pd.date_range(aDayTS.index.min(), aDayTS.index.max(), freq="D", name=aDayTS.index.name)
+    daily = aDayTS.reindex(days, method="ffill").to_numpy(dtype="float64")
+    hours = pd.date_range(days[0], days[-1], freq="h", name=aDayTS.index.name)
+    return days, daily, hours
+
+
+def _dis_solar_dataset(aDataset: MetDataset, column: str, output_column: str, aLatDeg, convention: str,
+                       dtype=np.float64):
+    """
+    DisSolar、DisPET的多站点计算：逐日值乘以分布系数后展开到逐小时，从第一天0时到最后一天0时
+    :param aDataset: 逐日MetDataset
+    :param column: 逐日变量
+    :param output_column: 逐小时变量
+    :param aLatDeg: 纬度，为None时使用数据集中各站点的纬度
+    :param convention: 年中第几天的算法，DisSolar为"basins"，DisPET为"dayofyear"
+    :param dtype: 结果的数据类型
+    :return: 逐小时MetDataset
+    """
+    ds = _dataset_inputs(aDataset)
+    lats = _dataset_latitudes(ds, aLatDeg)
+    hours = pd.date_range(ds.times[0], ds.times[-1], freq="h")
+    keys = SolarDayKeys(ds.times, convention)
+    daily = ds[column]
+    out = np.empty((len(ds), len(hours)), dtype=dtype)
+    for lat, rows in _latitude_groups(lats):
+        coef, active = SolarDistributionTable(lat, convention, 1)
+        if output_column == "SOLR":
+            # 逐小时结果在天内前移一小时，23时为0
+            active = active.copy()
+            active[:, 23] = False
+        coef, active = coef[keys], active[keys]
+        values = np.where(active[None], coef[None] * daily[rows][:, :, None], 0.0)
+        out[rows] = values.reshape(len(rows), -1)[:, :len(hours)]
+    if output_column == "SOLR":
+        # 最后一天只有0时，没有后一小时可取
+        out[:, -1] = 0.0
+    return ds.derive({output_column: out}, hours)
+
+
+@memoize
+def DisSolar(aDayRad: pd.DataFrame, aLatDeg: float, executor: Union[MetExecutor, str] = None, dtype=np.float64):
+    """
+    Disaggregate daily SOLAR or PET to hourly
+    :param aInTs: input timeseries to be disaggregated，或包含DSOL的逐日MetDataset
+    :param aLatDeg: Latitude, in degrees，参数为MetDataset时可以为None，使用数据集中各站点的纬度
+    :param executor: 逐日几何参数已按数组计算，不再需要执行器，保留该参数以兼容原调用
+    :param dtype: 结果的数据类型，np.float64或np.float32
+    :return:
+    """
+    if isinstance(aDayRad, MetDataset):
+        return _dis_solar_dataset(aDayRad, "DSOL", "SOLR", aLatDeg, "basins", dtype)
+    # check latitude
+    if MetComputeLatitudeMin > aLatDeg or aLatDeg > MetComputeLatitudeMax:
+        raise ValueError(f'Latitude must be between {MetComputeLatitudeMin} and {MetComputeLatitudeMax}')
+    days, daily, hours = _daily_hour_layout(aDayRad['DSOL'])
+    # 年中第几天使用BASINS中的算法：30.5 * (月 - 1) + 日
+    # 逐小时结果在天内前移一小时：h时取RK=h+1的值，23时为0
+    coef, active = SolarDistributionTable(float(aLatDeg), "basins", 1)
+    keys = SolarDayKeys(days, "basins")
+    coef, active = coef[keys], active[keys]
+    active[:, 23] = False
+    SOLR = np.where(active, coef * daily[:, None], 0.0).ravel()[:len(hours)]
+    # 最后一天只有0时，没有后一小时可取
+    SOLR[-1] = 0.0
+    return pd.DataFrame({'SOLR': SOLR.astype(dtype, copy=False)}, index=hours)
+
+
+@memoize
+def DisPET(aDayPet: pd.DataFrame, column: str, aLatDeg, executor: Union[MetExecutor, str] = None,
+           dtype=np.float64):
     """
     Distributes daily PET to hourly values,based on a method used to disaggregate solar radiation
     in HSP (Hydrocomp, 1976) using latitude, month, day,and daily PET.
-    :param aDayPet: input daily PET (inches)
-    :param aLatDeg: latitude(degrees)
+    :param aDayPet: input daily PET (inches)，或包含column的逐日MetDataset
+    :param aLatDeg: latitude(degrees)，参数为MetDataset时可以为None，使用数据集中各站点的纬度
+    :param executor: 逐日几何参数已按数组计算，不再需要执行器，保留该参数以兼容原调用
+    :param dtype: 结果的数据类型，np.float64或np.float32
     :return:
     """
+    if isinstance(aDayPet, MetDataset):
+        if column not in ['DEVP', 'DEVT']:
+            raise ValueError(f'{column} must be DEVP or DEVT')
+        output_column = 'PEVT' if column == 'DEVT' else 'EVAP'
+        result = _dis_solar_dataset(aDayPet, column, output_column, aLatDeg, "dayofyear", dtype)
+        with np.errstate(invalid="ignore"):
+            bad_values = result[output_column][result[output_column] > 40]
+        for aHrPet_value in bad_values:
+            warnings.warn(f"Bad Hourly Value {aHrPet_value}")
+        return result
     # check latitude
     if MetComputeLatitudeMin > aLatDeg or aLatDeg > MetComputeLatitudeMax:
         raise ValueError(f'Latitude must be between {MetComputeLatitudeMin} and {MetComputeLatitudeMax}')
-    # convert to radians
-    LatRdn = aLatDeg * DegreesToRadians
-    Phi = LatRdn
     if aDayPet.columns[0] not in ['DEVP', 'DEVT']:
         raise ValueError(f'{aDayPet.columns[0]} must be DEVP or DEVT')
 
-    def cal_dis(row):
-        # julian date
-        rad_datetime = row['time']
-        JulDay = row['time'].dayofyear
-        # BASINS中
-        # JulDay = 30.5 * (row['time'].month - 1) + row['time'].day
-        AD = 0.40928 * np.cos(0.0172141 * (172.0 - JulDay))
-        SS = np.sin(Phi) * np.sin(AD)
-        CS = np.cos(Phi) * np.cos(AD)
-        X2 = -SS / CS
-        Delt = 7.6394 * (1.5708 - np.atan(X2 / np.sqrt(1.0 - X2 ** 2)))
-        SunR = 12.0 - Delt / 2.0
-        # develop hourly distribution given sunrise,sunset and length of day (DELT)
-        DTR2 = Delt / 2.0
-        DTR4 = Delt / 4.0
-        CRAD = 0.66666667 / DTR2
-        SL = CRAD / DTR4
-        TRise = SunR
-        TR2 = TRise + DTR4
-        TR3 = TR2 + DTR2
-        TR4 = TR3 + DTR4
-        RK = rad_datetime.hour+1
-        # calculate hourly distribution curve
-        if RK > TRise:
-            if RK > TR2:
-                if RK > TR3:
-                    if RK > TR4:
-                        aHrPet_value = 0.0
-                    else:
-                        aHrPet_value = (CRAD - (RK - TR3) * SL) * row[column]
-                else:
-                    aHrPet_value = CRAD * row[column]
-            else:
-                aHrPet_value = (RK - TRise) * SL * row[column]
-        else:
-            aHrPet_value = 0.0
-        if pd.notna(aHrPet_value) and aHrPet_value > 40:
-            warnings.warn(f"Bad Hourly Value {aHrPet_value}")
-        return aHrPet_value
-
-    aHrPet = aDayPet.resample("h").ffill()
-    aHrPet['time'] = aHrPet.index.to_series()
+    days, daily, hours = _daily_hour_layout(aDayPet[column])
+    # 年中第几天使用实际的年中第几天，BASINS中为30.5 * (月 - 1) + 日
+    coef, active = SolarDistributionTable(float(aLatDeg), "dayofyear", 1)
+    keys = SolarDayKeys(days, "dayofyear")
+    coef, active = coef[keys], active[keys]
+    aHrPet = np.where(active, coef * daily[:, None], 0.0).ravel()[:len(hours)]
+    with np.errstate(invalid="ignore"):
+        bad_values = aHrPet[aHrPet > 40]
+    for aHrPet_value in bad_values:
+        warnings.warn(f"Bad Hourly Value {aHrPet_value}")
     output_column = 'PEVT' if column == 'DEVT' else 'EVAP'
-    # aHrPet[output_column] = aHrPet.apply(cal_dis, axis=1)
-    # parallel_apply
-    aHrPet[output_column] = aHrPet.parallel_apply(cal_dis, axis=1)
-    target_data = aHrPet[output_column].to_frame()
-    # target_data = target_data.groupby(target_data.index.day).shift(periods=-1, fill_value=0)
-    return target_data
+    return pd.DataFrame({output_column: aHrPet.astype(dtype, copy=False)}, index=hours)
 
 
-def DisWnd(aInTs: pd.DataFrame, aDCurve:List[float] = None):
+@memoize
+def DisWnd(aInTs: pd.DataFrame, aDCurve:List[float] = None, dtype=np.float64):
     """
     Disaggregate daily wind to hourly
-    :param aInTs: input daily wind timeseries
+    :param aInTs: input daily wind timeseries，或包含DWND的逐日MetDataset
     :param aDCurve: hourly diurnal curve for wind disaggregation
+    :param dtype: 结果的数据类型，np.float64或np.float32
     :return:
     """
     if aDCurve is None:
         aDCurve = aDCurve_Default
-    aHrWind = aInTs.resample("h").ffill()
-    #Distribution coefficient 获取分布系数
-    aHrWind['dist_coef'] = np.array([aDCurve[h] for h in aHrWind.index.hour])
-    aHrWind['WIND'] = aHrWind['DWND'] * aHrWind['dist_coef']
-    return aHrWind['WIND'].to_frame()
-
-
-def DistTriang(aDyTSer: pd.DataFrame):
-    def disa(aDaySum):
-        i = 0
-        while aDaySum > Sums[i]:
-            i += 1
-            if i > 11:
-                warnings.warn("DaySum too big")
-        lRndOff = 0.001
-        lCarry = 0
-        lRatio = aDaySum / Sums[i]
-        lDaySum = 0
-        aHrVals = [0] * 24
-        for j in range(0, 24):
-            aHrVals[j] = lRatio * Triang[j][i] + lCarry
-            if aHrVals[j] > 0.00001:
-                lCarry = aHrVals[j] - (np.round(aHrVals[j] / lRndOff) * lRndOff)
-                aHrVals[j] = aHrVals[j] - lCarry
-            else:
-                aHrVals[j] = 0
-            lDaySum += aHrVals[j]
-        if lCarry > 0.00001:
-            lDaySum = lDaySum - aHrVals[11]
-            aHrVals[11] = aHrVals[11] + lCarry
-            lDaySum = lDaySum + aHrVals[11]
-        if np.abs(aDaySum - lDaySum) > lRndOff:
-            warnings.warn("values not distributed properly")
-        return aHrVals
-
-    aDyTSer['hourly_value'] = aDyTSer.iloc[:, 0].map(disa)
-    aHrTSer = aDyTSer.resample("h").ffill()
-    aHrTSer['hour'] = aHrTSer.index.hour
-    # aHrTSer['PREC'] = aHrTSer.apply(lambda x: x['hourly_value'][x['hour']], axis=1)
-    # parallel_apply
-    aHrTSer['PREC'] = aHrTSer.parallel_apply(lambda x: x['hourly_value'][x['hour']], axis=1)
-    return aHrTSer['PREC']
+    if isinstance(aInTs, MetDataset):
+        ds = _dataset_inputs(aInTs)
+        hours = pd.date_range(ds.times[0], ds.times[-1], freq="h")
+        lCurve = np.asarray(aDCurve, dtype="float64")[:24]
+        WIND = (ds["DWND"][:, :, None] * lCurve).reshape(len(ds), -1)[:, :len(hours)]
+        return ds.derive({"WIND": WIND.astype(dtype, copy=False)}, hours)
+    # 与 resample("h").ffill() 之后逐小时乘以分布系数一致，按天数×24的数组计算
+    _, daily, hours = _daily_hour_layout(aInTs['DWND'])
+    lCurve = np.asarray(aDCurve, dtype="float64")[:24]
+    WIND = (daily[:, None] * lCurve[None, :]).ravel()[:len(hours)]
+    return pd.DataFrame({'WIND': WIND.astype(dtype, copy=False)}, index=hours)
+
+
+def _daily_rows_to_hourly(aDayIndex: pd.DatetimeIndex):
+    """
+    逐日分解结果(天数×24)展开到逐小时的行号
+    :param aDayIndex: 逐日索引
+    :return: (从第一天0时到最后一天23时的逐小时索引, 每个完整日使用的逐日行号，缺少的日期使用前一天)
+    """
+    full_index = pd.date_range(
+        start=aDayIndex.min(),
+        end=aDayIndex.max() + pd.Timedelta(days=1) - pd.Timedelta(hours=1),
+        freq="h"
+    )
+    lRows = pd.Series(np.arange(len(aDayIndex)), index=aDayIndex).reindex(full_index[::24], method='ffill')
+    return full_index, lRows.to_numpy()
+
+
+def DistFixedArray(aDaySums: np.ndarray, aWeights: List[float] = None):
+    """
+    按固定权重将日降水分解到24小时，负值和空值的日期24小时都为0
+    :param aDaySums: 逐日降水
+    :param aWeights: 24小时的权重，会按总和归一化，为None时均匀分布(日总量/24)
+    :return: 天数×24的逐小时降水
+    """
+    aDaySums = np.asarray(aDaySums, dtype="float64")
+    lDaySums = np.where(aDaySums >= 0, aDaySums, 0.0)
+    if aWeights is None:
+        return np.broadcast_to((lDaySums / 24.0)[:, None], (len(lDaySums), 24))
+    lWeights = np.asarray(aWeights, dtype="float64")
+    if lWeights.shape != (24,) or lWeights.sum() <= 0:
+        raise ValueError(f"权重必须是24个且总和大于0，当前为{aWeights}")
+    return lDaySums[:, None] * (lWeights / lWeights.sum())[None, :]
+
+
+def _dist_dataset(aDataset: MetDataset, aHrVals: np.ndarray, dtype=np.float64):
+    """逐日降水分解结果(站点数×天数 行，每行24小时)整理为逐小时MetDataset，从第一天0时到最后一天23时"""
+    hours = pd.date_range(aDataset.times[0], periods=24 * len(aDataset.times), freq="h")
+    return aDataset.derive({"PREC": aHrVals.reshape(len(aDataset), -1).astype(dtype, copy=False)}, hours)
+
+
+def _dataset_day_sums(aDataset: MetDataset):
+    """降水数据集的逐日降水，与DataFrame的第一列一致使用第一个变量，展开为一维(站点依次排列)"""
+    ds = _dataset_inputs(aDataset)
+    if not ds.variables:
+        raise ValueError("降水数据集没有变量")
+    return ds, ds[ds.variables[0]].astype("float64", copy=False).ravel()
+
+
+@memoize
+def DistFixed(aDyTSer: pd.DataFrame, aWeights: List[float] = None, dtype=np.float64):
+    """
+    按固定权重将日降雨数据分解到24小时
+    :param aDyTSer: 包含日降雨量的DataFrame，第一列为日降雨量，索引为日期；或第一个变量为日降雨量的逐日MetDataset
+    :param aWeights: 24小时的权重，为None时均匀分布
+    :param dtype: 结果的数据类型，np.float64或np.float32
+    :return: 逐小时降雨量的Series，参数为MetDataset时为包含PREC的逐小时MetDataset
+    """
+    if isinstance(aDyTSer, MetDataset):
+        ds, lDaySums = _dataset_day_sums(aDyTSer)
+        return _dist_dataset(ds, DistFixedArray(lDaySums, aWeights), dtype)
+    aHrVals = DistFixedArray(aDyTSer.iloc[:, 0].to_numpy(dtype="float64"), aWeights)
+    full_index, lRows = _daily_rows_to_hourly(aDyTSer.index)
+    return pd.Series(aHrVals[lRows].ravel().astype(dtype, copy=False), index=full_index, name='PREC')
+
+
+def DistEqual(aDyTSer: pd.DataFrame, executor: Union[MetExecutor, str] = None, dtype=np.float64):
+    """
+    将日降雨数据均匀分布到24小时，每小时 = 日总量 / 24
+
+    :param aDyTSer: 包含日降雨量的DataFrame，索引为日期，或逐日MetDataset
+    :param executor: 已按数组计算，不再需要执行器，保留该参数以兼容原调用
+    :param dtype: 结果的数据类型，np.float64或np.float32
+    :return: 逐小时降雨量的Series
+    """
+    return DistFixed(aDyTSer, dtype=dtype)
+
+
+def DistTriangArray(aDaySums: np.ndarray, aRndOff: float = 0.001):
+    """
+    三角分布分解日降水的批量计算，所有天同时计算，逐小时的进位(round-off carry)循环只循环24小时
+    1. 日降水为负或为空：24小时都为0
+    2. 日降水超过Sums的最大等级：前23小时为-9.8，最后一小时为日降水，返回码-1
+    3. 分解后总和与日降水相差超过aRndOff：差值加到最大的小时上，仍相差超过10倍aRndOff时按第2条输出，返回码-2
+    :param aDaySums: 逐日降水
+    :param aRndOff: 小时值的舍入精度
+    :return: (天数×24的逐小时降水, 逐日的分解差值, 逐日返回码：0正常，-1超出范围，-2分解失败)
+    """
+    aDaySums = np.asarray(aDaySums, dtype="float64")
+    nDays = len(aDaySums)
+    lTriang = np.asarray(Triang, dtype="float64")[:, :len(Sums)]  # 24×12
+    lSums = np.asarray(Sums, dtype="float64")
+    aRetCod = np.zeros(nDays, dtype=np.int8)
+
+    # 日降水所在的等级：第一个不小于日降水的Sums，NaN按第0级计算(各小时都为0)
+    lClass = np.searchsorted(lSums, np.nan_to_num(aDaySums, nan=0.0), side="left")
+    lOver = lClass >= len(lSums)
+    aRetCod[lOver] = -1
+    lClass = np.minimum(lClass, len(lSums) - 1)
+    lRatio = np.where(aDaySums < 0, 0.0, aDaySums / lSums[lClass])
+
+    aHrVals = np.zeros((nDays, 24))
+    lCarry = np.zeros(nDays)
+    lDaySum = np.zeros(nDays)
+    with np.errstate(invalid="ignore"):
+        for j in range(24):
+            lHrVal = lRatio * lTriang[j, lClass] + lCarry
+            lKeep = lHrVal > 0.00001
+            lNewCarry = lHrVal - (np.round(lHrVal / aRndOff) * aRndOff)
+            lHrVal = np.where(lKeep, lHrVal - lNewCarry, 0.0)
+            lCarry = np.where(lKeep, lNewCarry, lCarry)
+            aHrVals[:, j] = lHrVal
+            lDaySum = lDaySum + lHrVal
+        # 剩余的进位加到第12小时
+        lLeft = lCarry > 0.00001
+        lDaySum[lLeft] = lDaySum[lLeft] - aHrVals[lLeft, 11]
+        aHrVals[lLeft, 11] = aHrVals[lLeft, 11] + lCarry[lLeft]
+        lDaySum[lLeft] = lDaySum[lLeft] + aHrVals[lLeft, 11]
+
+        # 差值超过精度时补到最大的小时上，再逐小时重新求和
+        aDiff = np.abs(aDaySums - lDaySum)
+        lFix = np.flatnonzero(aDiff > aRndOff)
+        if len(lFix):
+            lMaxHour = np.argmax(aHrVals[lFix], axis=1)
+            aHrVals[lFix, lMaxHour] += aDaySums[lFix] - lDaySum[lFix]
+            lFixSum = np.zeros(len(lFix))
+            for j in range(24):
+                lFixSum = lFixSum + aHrVals[lFix, j]
+            aDiff[lFix] = np.abs(aDaySums[lFix] - lFixSum)
+            aRetCod[lFix[aDiff[lFix] > aRndOff * 10]] = -2
+
+    # 负值和空值为0，不计差值
+    lZero = ~(aDaySums >= 0)
+    aHrVals[lZero] = 0.0
+    aDiff[lZero] = 0.0
+    aRetCod[lZero] = 0
+    aRetCod[lOver] = -1
+    # 超出范围或分解失败
+    lFail = aRetCod != 0
+    aHrVals[lFail, :23] = -9.8
+    aHrVals[lFail, 23] = aDaySums[lFail]
+    aDiff[lOver] = 0.0
+    return aHrVals, aDiff, aRetCod
+
+
+@memoize
+def DistTriang(aDyTSer: pd.DataFrame, executor: Union[MetExecutor, str] = None, return_flags: bool = False,
+               dtype=np.float64):
+    """
+    将日降雨数据按三角分布分解到24小时
+    :param aDyTSer: 包含日降雨量的DataFrame，第一列为日降雨量，索引为日期；或第一个变量为日降雨量的逐日MetDataset
+    :param executor: 已按数组批量计算，不再需要执行器，保留该参数以兼容原调用
+    :param return_flags: 是否同时返回逐日的分解差值和返回码
+    :param dtype: 逐小时结果的数据类型，np.float64或np.float32
+    :return: 逐小时降雨量的Series，return_flags为True时返回(Series, 包含diff和retcod列的DataFrame)；
+             参数为MetDataset时为包含PREC的逐小时MetDataset，标志为包含diff和retcod的逐日MetDataset
+    """
+    ds = None
+    if isinstance(aDyTSer, MetDataset):
+        ds, lDaySums = _dataset_day_sums(aDyTSer)
+    else:
+        lDaySums = aDyTSer.iloc[:, 0].to_numpy(dtype="float64")
+    aHrVals, aDiff, aRetCod = DistTriangArray(lDaySums)
+    nOver = int(np.count_nonzero(aRetCod == -1))
+    nFail = int(np.count_nonzero(aRetCod == -2))
+    if nOver:
+        warnings.warn(f"precipitation too big: {nOver} days")
+    if nFail:
+        warnings.warn(f"values not distributed properly: {nFail} days, "
+                      f"max difference={aDiff[aRetCod == -2].max():.6f}")
+
+    if ds is not None:
+        aHrTSer = _dist_dataset(ds, aHrVals, dtype)
+        if return_flags:
+            return aHrTSer, ds.derive({'diff': aDiff.reshape(ds.shape), 'retcod': aRetCod.reshape(ds.shape)})
+        return aHrTSer
+
+    full_index, lRows = _daily_rows_to_hourly(aDyTSer.index)
+    aHrTSer = pd.Series(aHrVals[lRows].ravel().astype(dtype, copy=False), index=full_index, name='PREC')
+    if return_flags:
+        return aHrTSer, pd.DataFrame({'diff': aDiff, 'retcod': aRetCod}, index=aDyTSer.index)
+    return aHrTSer
+
+
+# float32模式的容差：逐小时分解按float64计算，最后一次舍入为float32，相对误差不超过float32的半个ulp(2**-24)，
+# 绝对值小于float32最小正规数的取值按该值计算误差。WDM按单精度保存，两种模式写入WDM的取值相同。
+HOURLY_FLOAT32_RTOL = 2.0 ** -24
+HOURLY_FLOAT32_ATOL = float(np.finfo(np.float32).tiny)
+
+
+def check_hourly_dtype_tolerance(func, *args, rtol: float = HOURLY_FLOAT32_RTOL, atol: float = HOURLY_FLOAT32_ATOL,
+                                 **kwargs) -> float:
+    """
+    分别以float64和float32调用逐小时分解函数，检查float32结果与float64结果之差在容差内：
+    |float32 - float64| <= atol + rtol * |float64|，两者的时间索引和空值位置必须相同。
+    用法:
+        check_hourly_dtype_tolerance(DisSolar, dsol_df, 19.7)
+    :param func: 有dtype参数的逐小时分解函数，例如DisTemp、DisWnd、DisSolar、DisPET、DistEqual、DistTriang
+    :param args: 分解函数的参数
+    :param rtol: 相对容差
+    :param atol: 绝对容差
+    :param kwargs: 分解函数的关键字参数
+    :return: 最大绝对误差
+    :raise ValueError: 超出容差，或时间索引、空值位置不同
+    """
+    reference = func(*args, dtype=np.float64, **kwargs)
+    compact = func(*args, dtype=np.float32, **kwargs)
+    if not reference.index.equals(compact.index):
+        raise ValueError(f"{func.__name__}在float32和float64下的时间索引不同")
+    reference = np.asarray(reference, dtype="float64").ravel()
+    compact_values = np.asarray(compact).ravel()
+    if compact_values.dtype != np.float32:
+        raise ValueError(f"{func.__name__}的float32结果类型为{compact_values.dtype}")
+    compact_values = compact_values.astype("float64")
+    missing = np.isnan(reference)
+    if not np.array_equal(missing, np.isnan(compact_values)):
+        raise ValueError(f"{func.__name__}在float32和float64下的空值位置不同")
+    error = np.abs(compact_values[~missing] - reference[~missing])
+    limit = atol + rtol * np.abs(reference[~missing])
+    if np.any(error > limit):
+        worst = int(np.argmax(error - limit))
+        raise ValueError(f"{func.__name__}的float32结果超出容差：误差{error[worst]:.3g}，允许{limit[worst]:.3g}")
+    return float(error.max()) if len(error) else 0.0
 
 
 def distribute_daily_to_hourly_triangular(df, tolerance=0.5, observation_hour=12):
@@ -463,29 +865,190 @@ def distribute_daily_to_hourly_triangular(df, tolerance=0.5, observation_hour=12
     return distributed_data
 
 
+# 多站点蒸发计算每块的元素个数，缓冲数组保持在CPU缓存大小附近
+EVAPORATION_BLOCK = 32768
+
+
+def _evaporation_blocks(shape: tuple):
+    """按站点分块：每块若干个完整站点，元素个数不超过EVAPORATION_BLOCK(至少一个站点)"""
+    nStations, nDays = shape
+    step = max(1, EVAPORATION_BLOCK // max(nDays, 1))
+    for start in range(0, nStations, step):
+        yield slice(start, min(nStations, start + step))
+
+
+def _evaporation_inputs(*arrays):
+    """检查输入都是形状相同的 站点数×天数 数组，一维时当作一个站点"""
+    arrays = [np.asarray(values, dtype="float64") for values in arrays]
+    shape = arrays[0].shape
+    if any(values.shape != shape for values in arrays):
+        raise ValueError(f"输入数组的形状必须相同，当前为{[values.shape for values in arrays]}")
+    return [values.reshape(1, -1) if values.ndim == 1 else values for values in arrays], shape
+
+
+@lru_cache(maxsize=256)
+def HamonCoefficientTable(aLatDeg: float, aCTS: tuple = None):
+    """
+    Hamon公式中与日期有关的系数表 CTS[月] * DYL * DYL，按(纬度, 月系数)缓存，行号由 SolarDayKeys(dates, "basins") 得到
+    :param aLatDeg: 纬度，单位为十进制角度
+    :param aCTS: 13个月系数(第0个不使用)，为None时使用defHMonCoeff
+    :return: 只读的系数数组
+    """
+    Delt = SolarGeometryTable(aLatDeg, "basins")[:, 0]
+    SunR = 12.0 - Delt / 2.0
+    SUNS = 12.0 + Delt / 2.0
+    DYL = (SUNS - SunR) / 12
+    keys = np.arange(len(Delt))
+    months = np.where(keys > 0, (keys - 1) // 31 + 1, 0)
+    lCTS = defHMonCoeff if aCTS is None else np.asarray(aCTS, dtype="float64")
+    table = lCTS[months] * DYL * DYL
+    table.setflags(write=False)
+    return table
+
+
+def HamonEvaporationArray(aTMin: np.ndarray, aTMax: np.ndarray, aDates: pd.DatetimeIndex, aLatDeg, aDegF: bool,
+                          aCTS=None, aValid: np.ndarray = None, out: np.ndarray = None):
+    """
+    多站点Hamon潜在蒸散，与PanEvaporationValueComputedByHamon的公式和运算顺序相同，结果逐位一致。
+    与日期有关的部分(CTS * DYL * DYL)每个纬度查表一次，温度部分按块在复用的缓冲数组中原地计算。
+    :param aTMin: 逐日最低温度，站点数×天数，与aDates对齐
+    :param aTMax: 逐日最高温度，形状与aTMin相同
+    :param aDates: 逐日日期
+    :param aLatDeg: 每个站点的纬度，或所有站点共用的一个纬度
+    :param aDegF: 温度是否为华氏度
+    :param aCTS: 月系数，为None时使用defHMonCoeff
+    :param aValid: 站点数×天数的布尔数组，为False的日期(输入序列中没有该日期)结果为NaN，为None时不检查
+    :param out: 保存结果的连续float64数组，为None时新建
+    :return: 站点数×天数的DEVT
+    """
+    (aTMin, aTMax), shape = _evaporation_inputs(aTMin, aTMax)
+    if aTMin.shape[1] != len(aDates):
+        raise ValueError(f"天数{aTMin.shape[1]}与日期个数{len(aDates)}不一致")
+    lats = np.broadcast_to(np.asarray(aLatDeg, dtype="float64"), (aTMin.shape[0],))
+    if np.any(~((lats >= MetComputeLatitudeMin) & (lats <= MetComputeLatitudeMax))):
+        raise ValueError(f'Latitude must be between {MetComputeLatitudeMin} and {MetComputeLatitudeMax}')
+    lCTS = None if aCTS is None else tuple(np.asarray(aCTS, dtype="float64").tolist())
+    # 每个站点的系数行：相同纬度的站点共用一行
+    unique, inverse = np.unique(lats, return_inverse=True)
+    keys = SolarDayKeys(aDates, "basins")
+    lCoef = np.stack([HamonCoefficientTable(float(lat), lCTS)[keys] for lat in unique])
+
+    result = np.empty(aTMin.shape) if out is None else out.reshape(aTMin.shape)
+    lBuf = np.empty((2, EVAPORATION_BLOCK if aTMin.shape[1] <= EVAPORATION_BLOCK else aTMin.shape[1]))
+    for rows in _evaporation_blocks(aTMin.shape):
+        n = (rows.stop - rows.start) * aTMin.shape[1]
+        aTAVC, lTmp = (buf[:n].reshape(-1, aTMin.shape[1]) for buf in lBuf)
+        lOut = result[rows]
+        np.add(aTMin[rows], aTMax[rows], out=aTAVC)
+        np.divide(aTAVC, 2, out=aTAVC)
+        if aDegF:
+            np.subtract(aTAVC, 32.0, out=aTAVC)
+            np.multiply(aTAVC, 5.0 / 9.0, out=aTAVC)
+        # VPSAT = 6.108 * exp(17.26939 * T / (T + 237.3))
+        np.add(aTAVC, 237.3, out=lTmp)
+        np.multiply(aTAVC, 17.26939, out=lOut)
+        np.divide(lOut, lTmp, out=lOut)
+        np.exp(lOut, out=lOut)
+        np.multiply(lOut, 6.108, out=lOut)
+        # VDSAT = 216.7 * VPSAT / (T + 273.3)
+        np.multiply(lOut, 216.7, out=lOut)
+        np.add(aTAVC, 273.3, out=lTmp)
+        np.divide(lOut, lTmp, out=lOut)
+        # PET = CTS * DYL * DYL * VDSAT，负值为0
+        np.multiply(lCoef[inverse[rows]], lOut, out=lOut)
+        np.maximum(lOut, 0, out=lOut)
+    if aValid is not None:
+        result[~np.asarray(aValid, dtype=bool).reshape(result.shape)] = np.nan
+    return result.reshape(shape)
+
+
+def PenmanEvaporationArray(aMinTmp: np.ndarray, aMaxTmp: np.ndarray, aDewTmp: np.ndarray, aWindSp: np.ndarray,
+                           aSolRad: np.ndarray, aValid: np.ndarray = None, out: np.ndarray = None):
+    """
+    多站点Penman蒸发，与PanEvaporationValueComputedByPenman的公式和运算顺序相同，结果逐位一致。
+    按块在4个复用的缓冲数组中原地计算，exp(-7482.6 / (T + 398.36))在水汽压差和饱和水汽压曲线斜率中只计算一次。
+    :param aMinTmp: 逐日最低温度(degF)，站点数×天数
+    :param aMaxTmp: 逐日最高温度(degF)
+    :param aDewTmp: 露点温度(degF)
+    :param aWindSp: 风程(miles/day)
+    :param aSolRad: 太阳辐射(langleys/day)，缺测(NaN)和不大于0的值按0.00001计算
+    :param aValid: 站点数×天数的布尔数组，为False的日期(任一输入序列中没有该日期)结果为NaN，为None时不检查
+    :param out: 保存结果的连续float64数组，为None时新建
+    :return: 站点数×天数的DEVP(inches/day)
+    """
+    (aMinTmp, aMaxTmp, aDewTmp, aWindSp, aSolRad), shape = _evaporation_inputs(aMinTmp, aMaxTmp, aDewTmp, aWindSp,
+                                                                               aSolRad)
+    nDays = aMinTmp.shape[1]
+    result = np.empty(aMinTmp.shape) if out is None else out.reshape(aMinTmp.shape)
+    lBuf = np.empty((4, EVAPORATION_BLOCK if nDays <= EVAPORATION_BLOCK else nDays))
+    for rows in _evaporation_blocks(aMinTmp.shape):
+        n = (rows.stop - rows.start) * nDays
+        lAirTmp, lExpAir, lTmp, lEaGama = (buf[:n].reshape(-1, nDays) for buf in lBuf)
+        lOut = result[rows]
+        np.add(aMinTmp[rows], aMaxTmp[rows], out=lAirTmp)
+        np.divide(lAirTmp, 2.0, out=lAirTmp)
+        # net radiation exchange * delta，辐射的NaN和不大于0的值为0.00001
+        np.fmax(aSolRad[rows], 0.00001, out=lTmp)
+        np.log(lTmp, out=lTmp)
+        np.multiply(lTmp, 0.01066, out=lTmp)
+        np.subtract(0.1024, lTmp, out=lTmp)
+        np.subtract(lAirTmp, 212.0, out=lOut)
+        np.multiply(lOut, lTmp, out=lOut)
+        np.exp(lOut, out=lOut)
+        np.subtract(lOut, 0.0001, out=lOut)
+        # 以下只需要 T + 398.36
+        np.add(lAirTmp, 398.36, out=lAirTmp)
+        np.divide(-7482.6, lAirTmp, out=lExpAir)
+        np.exp(lExpAir, out=lExpAir)
+        # vapor pressure deficit (Es - Ea)，负值为0
+        np.add(aDewTmp[rows], 398.36, out=lTmp)
+        np.divide(-7482.6, lTmp, out=lTmp)
+        np.exp(lTmp, out=lTmp)
+        np.multiply(lTmp, 6413252.0, out=lTmp)
+        np.multiply(lExpAir, 6413252.0, out=lEaGama)
+        np.subtract(lEaGama, lTmp, out=lEaGama)
+        np.maximum(lEaGama, 0, out=lEaGama)
+        # pan evap * GAMMA = 0.0105 * (Es - Ea) ** 0.88 * (0.37 + 0.0041 * wind)
+        np.power(lEaGama, 0.88, out=lEaGama)
+        np.multiply(lEaGama, 0.0105, out=lEaGama)
+        np.multiply(aWindSp[rows], 0.0041, out=lTmp)
+        np.add(lTmp, 0.37, out=lTmp)
+        np.multiply(lEaGama, lTmp, out=lEaGama)
+        np.add(lOut, lEaGama, out=lOut)
+        # Delta = 47987800000.0 * exp(-7482.6 / (T + 398.36)) / (T + 398.36) ** 2
+        np.multiply(lExpAir, 47987800000.0, out=lExpAir)
+        np.multiply(lAirTmp, lAirTmp, out=lAirTmp)
+        np.divide(lExpAir, lAirTmp, out=lExpAir)
+        np.add(lExpAir, 0.0105, out=lExpAir)
+        np.divide(lOut, lExpAir, out=lOut)
+        np.maximum(lOut, 0, out=lOut)
+    if aValid is not None:
+        result[~np.asarray(aValid, dtype=bool).reshape(result.shape)] = np.nan
+    return result.reshape(shape)
+
+
+@memoize
 def PanEvaporationValueComputedByHamon(aTMinTS: pd.DataFrame, aTMaxTS, aDegF: bool, aLatDeg:float, aCTS=None):
     """
     compute Hamon - PET
-    :param aTMinTS: Min Air Temperature - daily
-    :param aTMaxTS: Max Air Temperature - daily
+    :param aTMinTS: Min Air Temperature - daily，或包含TMIN的逐日MetDataset
+    :param aTMaxTS: Max Air Temperature - daily，或包含TMAX的逐日MetDataset
     :param aDegF: Temperature in Degrees F (True) or C (False)
-    :param aLatDeg: Latitude, in degrees
+    :param aLatDeg: Latitude, in degrees，参数为MetDataset时可以为None，使用数据集中各站点的纬度
     :param aCTS: Monthly variable coefficients 默认为None 使用内部默认系数
-    :return:
+    :return: 参数为MetDataset时为包含DEVT的MetDataset
     """
+    if isinstance(aTMinTS, MetDataset):
+        ds = _dataset_inputs(aTMinTS, aTMaxTS)
+        devt = HamonEvaporationArray(aTMinTS["TMIN"], aTMaxTS["TMAX"], ds.times, _dataset_latitudes(ds, aLatDeg),
+                                     aDegF, aCTS, aValid=combine_coverage(aTMinTS, aTMaxTS))
+        return ds.derive({"DEVT": devt})
     # check latitude
     if MetComputeLatitudeMin > aLatDeg or aLatDeg > MetComputeLatitudeMax:
         raise ValueError(f'Latitude must be between {MetComputeLatitudeMin} and {MetComputeLatitudeMax}')
     aTAVC = (aTMinTS['TMIN'] + aTMaxTS['TMAX']) / 2
-    JulDay = 30.5 * (aTMinTS.index.month - 1) + aTMinTS.index.day
-    # convert to radians
-    LatRdn = aLatDeg * DegreesToRadians
-    Phi = LatRdn
-    AD = 0.40928 * np.cos(0.0172141 * (172.0 - JulDay))
-    SS = np.sin(Phi) * np.sin(AD)
-    CS = np.cos(Phi) * np.cos(AD)
-    X2 = -SS / CS
-    Delt = 7.6394 * (1.5708 - np.atan(X2 / np.sqrt(1.0 - X2 ** 2)))
+    # 年中第几天使用BASINS中的算法：30.5 * (月 - 1) + 日
+    Delt = SolarGeometry(aTMinTS.index, aLatDeg, "basins")["Delt"]
     SunR = 12.0 - Delt / 2.0
     SUNS = 12.0 + Delt / 2.0
     DYL = (SUNS - SunR) / 12
@@ -505,6 +1068,7 @@ def PanEvaporationValueComputedByHamon(aTMinTS: pd.DataFrame, aTMaxTS, aDegF: bo
     return lPanEvap.to_frame(name="DEVT")
 
 
+@memoize
 def PanEvaporationValueComputedByPenman(aMinTmp: pd.DataFrame, aMaxTmp: pd.DataFrame, aDewTmp: pd.DataFrame,
                                         aWindSp: pd.DataFrame, aSolRad: pd.DataFrame):
     """
@@ -517,7 +1081,14 @@ def PanEvaporationValueComputedByPenman(aMinTmp: pd.DataFrame, aMaxTmp: pd.DataF
     :param aWindSp: wind movement (miles/day)
     :param aSolRad: solar radiation (langleys/day)
     :return: pan evaporation (inches/day)
+    参数也可以是分别包含TMIN、TMAX、DPTP、DWND、DSOL的逐日MetDataset(可以是同一个)，返回包含DEVP的MetDataset
     """
+    if isinstance(aMinTmp, MetDataset):
+        ds = _dataset_inputs(aMinTmp, aMaxTmp, aDewTmp, aWindSp, aSolRad)
+        devp = PenmanEvaporationArray(aMinTmp["TMIN"], aMaxTmp["TMAX"], aDewTmp["DPTP"], aWindSp["DWND"],
+                                      aSolRad["DSOL"], aValid=combine_coverage(aMinTmp, aMaxTmp, aDewTmp, aWindSp,
+                                                                               aSolRad))
+        return ds.derive({"DEVP": devp})
     # compute average daily air temperature
     lAirTmp = (aMinTmp['TMIN'] + aMaxTmp['TMAX']) / 2.0
 
@@ -553,15 +1124,25 @@ def PanEvaporationValueComputedByPenman(aMinTmp: pd.DataFrame, aMaxTmp: pd.DataF
     return lPanEvap.to_frame("DEVP")
 
 
+@memoize
 def DewpointTemperatureByMagnusTetens(aAvgTmp: pd.DataFrame, temp_column: str, aRelHum: pd.DataFrame, rhu_column: str):
     """
         Compute daily dewpoint temperature (°C)
-    :param aAvgTmp: Air temperature in degrees Celsius (°C).
-    :param temp_column: 温度列名
-    :param aRelHum: Relative humidity in percentage (%).
-    :param rhu_column: 相对湿度列名
-    :return:
+    :param aAvgTmp: Air temperature in degrees Celsius (°C)，或逐日MetDataset
+    :param temp_column: 温度列名，参数为MetDataset时为变量名
+    :param aRelHum: Relative humidity in percentage (%)，或逐日MetDataset
+    :param rhu_column: 相对湿度列名，参数为MetDataset时为变量名
+    :return: 参数为MetDataset时为包含DPTP的MetDataset
     """
+    if isinstance(aAvgTmp, MetDataset):
+        ds = _dataset_inputs(aAvgTmp, aRelHum)
+        a = 17.27
+        b = 237.7
+        atem = aAvgTmp[temp_column]
+        rhu_data = aRelHum[rhu_column]
+        rhu_data = np.clip(np.where(np.isnan(rhu_data), 1.0, rhu_data), 0.1, 100.0)
+        temporary_c = np.log(rhu_data / 100) + ((a * atem) / (b + atem))
+        return ds.derive({"DPTP": (b * temporary_c) / (a - temporary_c)})
     temp_column = validate_data(aAvgTmp, temp_column)
     rhu_column = validate_data(aRelHum, rhu_column)
     a = 17.27
@@ -577,13 +1158,17 @@ def DewpointTemperatureByMagnusTetens(aAvgTmp: pd.DataFrame, temp_column: str, a
     return dptp.to_frame(name='DPTP')
 
 
+@memoize
 def MetDataDailyCloudBySunshine(aInTS: pd.DataFrame, column_name: Union[int, str]):
     """
     云量，根据日照来计算得到
-    :param aInTS:
-    :param column_name:
-    :return:
+    :param aInTS: 日照，或逐日MetDataset
+    :param column_name: 日照列名，参数为MetDataset时为变量名
+    :return: 参数为MetDataset时为包含DCLO的MetDataset
     """
+    if isinstance(aInTS, MetDataset):
+        ds = _dataset_inputs(aInTS)
+        return ds.derive({"DCLO": 10 * (1 - aInTS[column_name] / 24) ** 0.6})
     column_name = validate_data(aInTS, column_name)
     #日照aInTS[column_name]/24：一天的日照比例
     dclo = 10 * (1 - aInTS[column_name] / 24) ** 0.6
@@ -0,0 +1,561 @@
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+from typing import Callable, Dict, List
+
+import numpy as np
+import pandas as pd
+
+try:
+    import psutil
+except ImportError:  # psutil为可选依赖，没有时从/proc或resource读取内存
+    psutil = None
+
+from MetUtils import HOURLY_DTYPES, celsius_to_fahrenheit, decode_prec_special_values, get_hourly_dtype, mjm2_to_Ly, \
+    ms_to_mph, set_default_hourly_dtype, windTravelFromWindSpeed
+from Metcalalg import DewpointTemperatureByMagnusTetens, DisPET, DisSolar, DisTemp, DisWnd, DistEqual, DistTriang, \
+    MetDataDailyCloudBySunshine, PanEvaporationValueComputedByHamon, PanEvaporationValueComputedByPenman, \
+    check_hourly_dtype_tolerance
+from missingfill import fill_missing_values_bymean
+from MetReader import iter_station_frames
+from MetSave import SaveDataToWdm, WdmWriteSession
+from MetMemo import ENV_MEMO, set_default_memo
+from MetDataset import MetDataset
+from hspf_met import build_hspf_pipeline
+
+"""
+HSPF气象数据处理基准测试
+1. 生成CMA格式(f1..f10)的合成输入文件，站点数、年数、缺测比例、降水特殊值比例可配置
+2. 逐个步骤单独计时：读取、缺测填充、逐日计算、逐日到逐小时分解、写入WDM，可选完整处理流程
+3. 记录每个步骤的用时、每秒处理行数和峰值内存(RSS)，结果保存为JSON基线
+4. 对比模式读取基线，用时或内存超过容差时标记为退化，有退化时返回码为1
+用法:
+    python benchmark_hspf_met.py --stations 10 100 1000 --output benchmark_baseline.json
+    python benchmark_hspf_met.py --stations 10 100 --compare benchmark_baseline.json
+"""
+
+BENCHMARK_VERSION = 1
+INVALID_VALUE = 32766
+RADI_INVALID_VALUE = 999998
+# 降水特殊值：微量、雾露霜、雨雪总量、雪量，解码规则见MetUtils.PREC_SPECIAL_CODES
+PREC_SPECIAL_CODES = (32700, 32005, 31012, 30008)
+# 对比时的噪声下限：用时差小于该秒数、内存差小于该MB数时不算退化
+MIN_SECONDS_DIFF = 0.05
+MIN_RSS_DIFF_MB = 20.0
+# saveData的DSN编号范围为range(19, 200, 20)等，完整流程最多处理10个站点
+PIPELINE_MAX_STATIONS = 10
+
+
+# ============================合成数据==================================
+def make_cma_frame(stations: List[int], years: int, start_year: int = 1990, missing_rate: float = 0.02,
+                   special_rate: float = 0.02, kind: str = "temp", seed: int = 0) -> pd.DataFrame:
+    """
+    生成一个CMA格式的逐日数据表，f1站号，f2纬度(度分)，f3经度(度分)，f4海拔，f5~f7年月日，f8~f10数据
+    :param stations: 站点编号
+    :param years: 年数
+    :param start_year: 起始年份
+    :param missing_rate: 缺测(32766)比例，另外每个站点还有几段连续缺测
+    :param special_rate: 降水特殊值比例，只对kind="pre"有效
+    :param kind: temp气温(0.1℃)、rhu相对湿度(%)、win风速(0.1m/s)、ssd日照(0.1h)、radi辐射(0.01MJ/m2)、pre降水(0.1mm)
+    :param seed: 随机数种子
+    :return: 数据表
+    """
+    rng = np.random.default_rng([seed, sum(map(ord, kind))])
+    dates = pd.date_range(f"{start_year}-01-01", f"{start_year + years - 1}-12-31", freq="D")
+    n_days = len(dates)
+    n = n_days * len(stations)
+    season = np.tile(np.sin(2 * np.pi * (dates.dayofyear.to_numpy() - 110) / 365.25), len(stations))
+    noise = rng.standard_normal((3, n))
+    if kind == "temp":
+        avg = 200 + 80 * season + 30 * noise[0]
+        values = [avg, avg + 40 + 15 * np.abs(noise[1]), avg - 40 - 15 * np.abs(noise[2])]
+    elif kind == "rhu":
+        values = [np.clip(75 + 10 * season + 10 * row, 20, 100) for row in noise]
+    elif kind == "win":
+        values = [np.clip(25 + 10 * np.abs(row), 0, 200) for row in noise]
+    elif kind == "ssd":
+        values = [np.clip(55 + 25 * season + 30 * row, 0, 130) for row in noise]
+    elif kind == "radi":
+        values = [np.clip(1500 + 600 * season + 400 * row, 0, 3500) for row in noise]
+    elif kind == "pre":
+        wet = rng.random((3, n)) < 0.35
+        values = [np.where(wet[k], rng.gamma(0.8, 80, n), 0) for k in range(3)]
+    else:
+        raise ValueError(f"不支持的数据类型{kind}，可选: temp、rhu、win、ssd、radi、pre")
+
+    frame = pd.DataFrame({
+        "f1": np.repeat(np.asarray(stations, dtype=np.int64), n_days),
+        "f2": np.repeat(1500 + rng.integers(0, 3000, len(stations)), n_days),
+        "f3": np.repeat(10000 + rng.integers(0, 3000, len(stations)), n_days),
+        "f4": np.repeat(rng.integers(0, 3000, len(stations)), n_days),
+        "f5": np.tile(dates.year.to_numpy(), len(stations)),
+        "f6": np.tile(dates.month.to_numpy(), len(stations)),
+        "f7": np.tile(dates.day.to_numpy(), len(stations)),
+    })
+    invalid = RADI_INVALID_VALUE if kind == "radi" else INVALID_VALUE
+    for column, column_values in zip(("f8", "f9", "f10"), values):
+        column_values = np.rint(column_values).astype(np.int64)
+        missing = rng.random(n) < missing_rate
+        # 每个站点几段2~10天的连续缺测
+        for start in rng.integers(0, n - 10, 3 * len(stations)):
+            missing[start:start + rng.integers(2, 10)] = True
+        if kind == "pre":
+            special = (rng.random(n) < special_rate) & ~missing
+            column_values[special] = rng.choice(PREC_SPECIAL_CODES, int(special.sum()))
+        column_values[missing] = invalid
+        frame[column] = column_values
+    return frame
+
+
+def write_synthetic_inputs(out_dir: str, stations: List[int], years: int, missing_rate: float = 0.02,
+                           special_rate: float = 0.02, seed: int = 0) -> Dict[str, str]:
+    """
+    生成hspf_met需要的全部输入文件
+    :return: 数据类型到文件路径的字典
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    paths = {}
+    for kind in ("temp", "rhu", "win", "ssd", "radi", "pre"):
+        paths[kind] = os.path.join(out_dir, f"{kind}.csv")
+        make_cma_frame(stations, years, missing_rate=missing_rate, special_rate=special_rate, kind=kind,
+                       seed=seed).to_csv(paths[kind], index=False)
+    return paths
+
+
+def station_latitudes(stations: List[int], seed: int = 0) -> Dict[str, float]:
+    """合成站点的纬度(十进制角度)"""
+    rng = np.random.default_rng(seed)
+    return {str(station): float(lat) for station, lat in zip(stations, rng.uniform(18, 45, len(stations)))}
+
+
+# ============================内存测量==================================
+def current_rss() -> int:
+    """当前进程的常驻内存(字节)"""
+    if psutil is not None:
+        return psutil.Process().memory_info().rss
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+class PeakRss:
+    """在后台线程中定期采样RSS，记录with块内的峰值"""
+
+    def __init__(self, interval: float = 0.005):
+        self.interval = interval
+        self.baseline = 0
+        self.peak = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _sample(self):
+        while not self._stop.wait(self.interval):
+            self.peak = max(self.peak, current_rss())
+
+    def __enter__(self):
+        self.baseline = self.peak = current_rss()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, current_rss())
+
+
+# ============================准备数据==================================
+def _fill(frame: pd.DataFrame, station, data_col: str) -> pd.Series:
+    """缺测填充后返回以日期为索引的数据列"""
+    frame = fill_missing_values_bymean(frame, station_column="f1", data_col=data_col, stations=[station])
+    return frame.set_index("time")[data_col]
+
+
+class BenchmarkData:
+    """合成输入和每个站点预先计算好的逐日序列，各步骤的输入在这里准备，不计入步骤用时"""
+
+    def __init__(self, work_dir: str, n_stations: int, years: int, missing_rate: float, special_rate: float,
+                 seed: int):
+        self.work_dir = work_dir
+        self.stations = [50000 + i for i in range(n_stations)]
+        self.latitudes = station_latitudes(self.stations, seed)
+        self.paths = write_synthetic_inputs(os.path.join(work_dir, "input"), self.stations, years,
+                                            missing_rate=missing_rate, special_rate=special_rate, seed=seed)
+        self.frames = {}
+        self.daily = {}
+
+    @property
+    def station_ids(self) -> List[str]:
+        return [str(station) for station in self.stations]
+
+    def load(self):
+        """读取所有输入并计算各步骤需要的逐日序列"""
+        specs = {"temp": (["f8", "f9", "f10"], INVALID_VALUE), "rhu": (["f8"], INVALID_VALUE),
+                 "win": (["f8"], INVALID_VALUE), "ssd": (["f8"], INVALID_VALUE),
+                 "radi": (["f8"], RADI_INVALID_VALUE), "pre": (["f10"], None)}
+        for kind, (data_cols, invalid_value) in specs.items():
+            self.frames[kind] = dict(iter_station_frames(self.paths[kind], self.station_ids, data_cols=data_cols,
+                                                         invalid_value=invalid_value))
+        for station in self.station_ids:
+            frames = {kind: self.frames[kind][station] for kind in specs}
+            daily = {}
+            daily["TMAX"] = celsius_to_fahrenheit((_fill(frames["temp"], station, "f9") * 0.1).to_frame("TMAX"), "TMAX")
+            daily["TMIN"] = celsius_to_fahrenheit((_fill(frames["temp"], station, "f10") * 0.1).to_frame("TMIN"), "TMIN")
+            daily["ATEM"] = (_fill(frames["temp"], station, "f8") * 0.1).to_frame("ATEM")
+            daily["RHUM"] = _fill(frames["rhu"], station, "f8").to_frame("RHUM")
+            dptp = DewpointTemperatureByMagnusTetens(daily["ATEM"], "ATEM", daily["RHUM"], "RHUM")
+            daily["DPTP"] = celsius_to_fahrenheit(dptp, "DPTP")
+            wind = ms_to_mph((_fill(frames["win"], station, "f8") * 0.1).to_frame("DWND"), "DWND")
+            daily["DWND"] = windTravelFromWindSpeed(wind, "DWND")
+            daily["SSD"] = (_fill(frames["ssd"], station, "f8") * 0.1).to_frame("SSD")
+            daily["DSOL"] = mjm2_to_Ly((_fill(frames["radi"], station, "f8") * 0.01).to_frame("DSOL"), "DSOL")
+            prec = frames["pre"].copy()
+            prec["f10"] = decode_prec_special_values(prec["f10"].to_numpy())[0]
+            daily["PREC"] = (_fill(prec, station, "f10") * 0.1 * 0.0393701).to_frame("precip")
+            daily["DEVT"] = PanEvaporationValueComputedByHamon(daily["TMIN"], daily["TMAX"], True,
+                                                               self.latitudes[station])
+            daily["DEVP"] = PanEvaporationValueComputedByPenman(daily["TMIN"], daily["TMAX"], daily["DPTP"],
+                                                                daily["DWND"], daily["DSOL"])
+            self.daily[station] = daily
+
+    def daily_rows(self) -> int:
+        return sum(len(daily["TMAX"]) for daily in self.daily.values())
+
+
+# ============================基准步骤==================================
+def _each_station(data: BenchmarkData, func: Callable) -> int:
+    """对每个站点调用func(station, daily)，返回处理的逐日行数"""
+    rows = 0
+    for station in data.station_ids:
+        func(station, data.daily[station])
+        rows += len(data.daily[station]["TMAX"])
+    return rows
+
+
+def stage_read_csv(data: BenchmarkData) -> int:
+    """首次读取：解析CSV并建立按站点的缓存"""
+    shutil.rmtree(os.path.join(os.path.dirname(data.paths["temp"]), ".metcache"), ignore_errors=True)
+    return sum(len(frame) for _, frame in iter_station_frames(data.paths["temp"], data.station_ids,
+                                                              data_cols=["f8", "f9", "f10"],
+                                                              invalid_value=INVALID_VALUE))
+
+
+def stage_read_cached(data: BenchmarkData) -> int:
+    """再次读取：直接读取按站点的缓存"""
+    return sum(len(frame) for _, frame in iter_station_frames(data.paths["temp"], data.station_ids,
+                                                              data_cols=["f8", "f9", "f10"],
+                                                              invalid_value=INVALID_VALUE))
+
+
+def stage_fill_missing(data: BenchmarkData) -> int:
+    rows = 0
+    for station in data.station_ids:
+        frame = data.frames["temp"][station].copy()
+        fill_missing_values_bymean(frame, station_column="f1", data_col="f9", stations=[station])
+        rows += len(frame)
+    return rows
+
+
+def stage_decode_prec(data: BenchmarkData) -> int:
+    rows = 0
+    for station in data.station_ids:
+        values = data.frames["pre"][station]["f10"].to_numpy()
+        decode_prec_special_values(values)
+        rows += len(values)
+    return rows
+
+
+def stage_dewpoint(data: BenchmarkData) -> int:
+    return _each_station(data, lambda station, daily: DewpointTemperatureByMagnusTetens(
+        daily["ATEM"], "ATEM", daily["RHUM"], "RHUM"))
+
+
+def stage_cloud(data: BenchmarkData) -> int:
+    return _each_station(data, lambda station, daily: MetDataDailyCloudBySunshine(daily["SSD"], "SSD"))
+
+
+def stage_hamon(data: BenchmarkData) -> int:
+    return _each_station(data, lambda station, daily: PanEvaporationValueComputedByHamon(
+        daily["TMIN"], daily["TMAX"], True, data.latitudes[station]))
+
+
+def stage_penman(data: BenchmarkData) -> int:
+    return _each_station(data, lambda station, daily: PanEvaporationValueComputedByPenman(
+        daily["TMIN"], daily["TMAX"], daily["DPTP"], daily["DWND"], daily["DSOL"]))
+
+
+def stage_evaporation_batch(data: BenchmarkData) -> int:
+    """所有站点按日期对齐为MetDataset后一次计算Hamon和Penman蒸发，对齐的用时计入步骤"""
+    tstypes = ("TMIN", "TMAX", "DPTP", "DWND", "DSOL")
+    dataset = MetDataset.from_variables({tstype: {station: data.daily[station][tstype] for station in data.station_ids}
+                                         for tstype in tstypes}, data.station_ids, latitudes=data.latitudes)
+    PanEvaporationValueComputedByHamon(dataset, dataset, True, None)
+    PanEvaporationValueComputedByPenman(dataset, dataset, dataset, dataset, dataset)
+    return data.daily_rows()
+
+
+def _hourly_calls(data: BenchmarkData, station: str) -> dict:
+    """每个逐小时分解步骤的函数和参数"""
+    daily, lat = data.daily[station], data.latitudes[station]
+    return {"DisTemp": (DisTemp, (daily["TMIN"], daily["TMAX"], 24)),
+            "DisSolar": (DisSolar, (daily["DSOL"], lat)),
+            "DisPET": (DisPET, (daily["DEVT"], "DEVT", lat)),
+            "DisWnd": (DisWnd, (daily["DWND"],)),
+            "DistEqual": (DistEqual, (daily["PREC"],)),
+            "DistTriang": (DistTriang, (daily["PREC"],))}
+
+
+def _hourly_stage(name: str) -> Callable:
+    """逐小时分解步骤，结果类型为get_hourly_dtype()"""
+
+    def stage(data: BenchmarkData) -> int:
+        dtype = get_hourly_dtype()
+
+        def run(station, daily):
+            func, args = _hourly_calls(data, station)[name]
+            func(*args, dtype=dtype)
+
+        return _each_station(data, run)
+
+    return stage
+
+
+def check_hourly_tolerance(data: BenchmarkData, stations: int = 3):
+    """float32模式下检查前几个站点的逐小时分解结果与float64结果之差在容差内"""
+    for station in data.station_ids[:stations]:
+        for name, (func, args) in _hourly_calls(data, station).items():
+            error = check_hourly_dtype_tolerance(func, *args)
+            print(f"  ✅ {name} 站点 {station} float32最大误差 {error:.3g}")
+
+
+def _new_wdm(data: BenchmarkData, name: str) -> str:
+    wdmpath = os.path.join(data.work_dir, name)
+    for path in (wdmpath, wdmpath + ".dsnidx.json"):
+        if os.path.exists(path):
+            os.remove(path)
+    return wdmpath
+
+
+def stage_save_daily(data: BenchmarkData) -> int:
+    """SaveDataToWdm写入每个站点的逐日最高温度"""
+    wdmpath = _new_wdm(data, "bench_daily.wdm")
+    session = WdmWriteSession(wdmpath)
+    for i, station in enumerate(data.station_ids):
+        SaveDataToWdm(data.daily[station]["TMAX"], "TMAX", 19 + i * 20, wdmpath, station, 4, session=session)
+    session.flush()
+    return data.daily_rows()
+
+
+def stage_save_hourly(data: BenchmarkData) -> int:
+    """SaveDataToWdm写入每个站点的逐小时温度，返回写入的逐小时行数"""
+    wdmpath = _new_wdm(data, "bench_hourly.wdm")
+    session = WdmWriteSession(wdmpath)
+    rows = 0
+    for i, station in enumerate(data.station_ids):
+        atem = DisTemp(data.daily[station]["TMIN"], data.daily[station]["TMAX"], 24, dtype=get_hourly_dtype())
+        SaveDataToWdm(atem, "ATEM", 13 + i * 20, wdmpath, station, 3, scenario="COMPUTED", session=session)
+        rows += len(atem)
+    session.flush()
+    return rows
+
+
+def stage_pipeline(data: BenchmarkData) -> int:
+    """完整处理流程：16个步骤全部写入一个WDM文件，saveData只接受前10个站点的DSN，站点多时只处理前10个"""
+    wdmpath = _new_wdm(data, "bench_pipeline.wdm")
+    paths = data.paths
+    stations = data.station_ids[:PIPELINE_MAX_STATIONS]
+    pipeline = build_hspf_pipeline(wdmpath=wdmpath, stations=stations, station_2_latDeg=data.latitudes,
+                                   tempfile=paths["temp"], windfile=paths["win"], ssdfile=paths["ssd"],
+                                   rhumfile=paths["rhu"], radifile=paths["radi"], precipfile=paths["pre"])
+    pipeline.run()
+    return sum(len(data.daily[station]["TMAX"]) for station in stations)
+
+
+STAGES = {
+    "read_csv": stage_read_csv,
+    "read_cached": stage_read_cached,
+    "fill_missing_values_bymean": stage_fill_missing,
+    "decode_prec_special_values": stage_decode_prec,
+    "DewpointTemperatureByMagnusTetens": stage_dewpoint,
+    "MetDataDailyCloudBySunshine": stage_cloud,
+    "PanEvaporationValueComputedByHamon": stage_hamon,
+    "PanEvaporationValueComputedByPenman": stage_penman,
+    "PanEvaporationBatch": stage_evaporation_batch,
+    "DisTemp": _hourly_stage("DisTemp"),
+    "DisSolar": _hourly_stage("DisSolar"),
+    "DisPET": _hourly_stage("DisPET"),
+    "DisWnd": _hourly_stage("DisWnd"),
+    "DistEqual": _hourly_stage("DistEqual"),
+    "DistTriang": _hourly_stage("DistTriang"),
+    "SaveDataToWdm_daily": stage_save_daily,
+    "SaveDataToWdm_hourly": stage_save_hourly,
+    "pipeline": stage_pipeline,
+}
+# 完整流程写入16个序列，站点多时WDM文件很大，只在指定时运行
+OPTIONAL_STAGES = ("pipeline",)
+
+
+def measure(func: Callable, data: BenchmarkData, repeat: int = 1, quiet: bool = True) -> dict:
+    """
+    运行一个步骤repeat次，用时取最小值，峰值内存取最大值
+    :return: 用时(秒)、处理行数、每秒行数、峰值RSS(MB)、相对开始时的RSS增量(MB)
+    """
+    best, rows, peak, delta = None, 0, 0, 0
+    for _ in range(max(1, repeat)):
+        output = io.StringIO() if quiet else sys.stdout
+        with PeakRss() as rss, contextlib.redirect_stdout(output):
+            start = time.perf_counter()
+            rows = func(data)
+            seconds = time.perf_counter() - start
+        best = seconds if best is None else min(best, seconds)
+        peak = max(peak, rss.peak)
+        delta = max(delta, rss.peak - rss.baseline)
+    return {"seconds": round(best, 6), "rows": int(rows), "rows_per_s": round(rows / best, 1) if best > 0 else None,
+            "peak_rss_mb": round(peak / 1024 / 1024, 1), "rss_delta_mb": round(delta / 1024 / 1024, 1)}
+
+
+def run_benchmark(n_stations: int, years: int, missing_rate: float, special_rate: float, seed: int,
+                  stages: List[str], repeat: int = 1, work_dir: str = None, quiet: bool = True) -> dict:
+    """
+    生成一组合成数据并运行所有步骤
+    :return: 该站点数下各步骤的结果
+    """
+    own_dir = work_dir is None
+    work_dir = tempfile.mkdtemp(prefix=f"hspf_bench_{n_stations}_") if own_dir else work_dir
+    try:
+        print(f"⏳ 生成{n_stations}个站点×{years}年的合成数据: {work_dir}")
+        data = BenchmarkData(work_dir, n_stations, years, missing_rate, special_rate, seed)
+        data.load()
+        if get_hourly_dtype() == np.float32:
+            check_hourly_tolerance(data)
+        results = {}
+        for name in stages:
+            results[name] = measure(STAGES[name], data, repeat=repeat, quiet=quiet)
+            result = results[name]
+            print(f"  {name:<36} {result['seconds']:>9.3f}s {result['rows_per_s'] or 0:>14,.0f} 行/秒 "
+                  f"峰值 {result['peak_rss_mb']:>8.1f}MB")
+        return {"stations": n_stations, "days": data.daily_rows() // max(1, n_stations), "stages": results}
+    finally:
+        if own_dir:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+
+# ============================基线对比==================================
+def environment() -> dict:
+    return {"python": platform.python_version(), "numpy": np.__version__, "pandas": pd.__version__,
+            "platform": platform.platform(), "cpu_count": os.cpu_count()}
+
+
+def compare(current: dict, baseline: dict, time_tolerance: float = 0.2, rss_tolerance: float = 0.2) -> List[dict]:
+    """
+    对比两次结果，用时或峰值内存超过基线的(1 + 容差)倍且超过噪声下限时记为退化
+    :param current: 本次结果
+    :param baseline: 基线结果
+    :param time_tolerance: 用时容差，0.2表示允许慢20%
+    :param rss_tolerance: 峰值内存容差
+    :return: 每个可对比步骤的对比结果
+    """
+    if current.get("config") != baseline.get("config"):
+        print(f"⚠️ 本次配置{current.get('config')}与基线配置{baseline.get('config')}不同，对比结果仅供参考")
+    rows = []
+    for scale, run in current["runs"].items():
+        base_run = baseline.get("runs", {}).get(scale)
+        if base_run is None:
+            continue
+        for name, result in run["stages"].items():
+            base = base_run["stages"].get(name)
+            if base is None:
+                continue
+            time_ratio = result["seconds"] / base["seconds"] if base["seconds"] > 0 else float("inf")
+            rss_diff = result["peak_rss_mb"] - base["peak_rss_mb"]
+            slower = time_ratio > 1 + time_tolerance and result["seconds"] - base["seconds"] > MIN_SECONDS_DIFF
+            bigger = (result["peak_rss_mb"] > base["peak_rss_mb"] * (1 + rss_tolerance)
+                      and rss_diff > MIN_RSS_DIFF_MB)
+            rows.append({"stations": scale, "stage": name, "seconds": result["seconds"],
+                         "baseline_seconds": base["seconds"], "time_ratio": round(time_ratio, 3),
+                         "peak_rss_mb": result["peak_rss_mb"], "baseline_peak_rss_mb": base["peak_rss_mb"],
+                         "regression": slower or bigger, "slower": slower, "more_memory": bigger})
+    return rows
+
+
+def print_comparison(rows: List[dict]):
+    print(f"\n{'站点':>6} {'步骤':<36} {'基线(s)':>10} {'本次(s)':>10} {'倍数':>7} {'基线MB':>9} {'本次MB':>9}")
+    for row in rows:
+        mark = "❌" if row["regression"] else "  "
+        print(f"{row['stations']:>6} {row['stage']:<36} {row['baseline_seconds']:>10.3f} {row['seconds']:>10.3f} "
+              f"{row['time_ratio']:>7.2f} {row['baseline_peak_rss_mb']:>9.1f} {row['peak_rss_mb']:>9.1f} {mark}")
+    regressions = [row for row in rows if row["regression"]]
+    if regressions:
+        print(f"\n❌ {len(regressions)}个步骤退化")
+    else:
+        print(f"\n✅ 没有发现退化，共对比{len(rows)}个步骤")
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="HSPF气象数据处理基准测试")
+    parser.add_argument("--stations", type=int, nargs="+", default=[10, 100, 1000], help="站点数，可以有多个，例如 10 100 1000")
+    parser.add_argument("--years", type=int, default=10, help="每个站点的年数")
+    parser.add_argument("--missing-rate", type=float, default=0.02, help="随机缺测比例")
+    parser.add_argument("--special-rate", type=float, default=0.02, help="降水特殊值比例")
+    parser.add_argument("--seed", type=int, default=0, help="随机数种子")
+    parser.add_argument("--repeat", type=int, default=1, help="每个步骤的重复次数，用时取最小值")
+    parser.add_argument("--stages", nargs="+", choices=list(STAGES), help="只运行这些步骤，默认为完整流程以外的所有步骤")
+    parser.add_argument("--pipeline", action="store_true", help="同时运行完整处理流程")
+    parser.add_argument("--output", help="结果保存为JSON基线")
+    parser.add_argument("--compare", help="与JSON基线对比，有退化时返回码为1")
+    parser.add_argument("--time-tolerance", type=float, default=0.2, help="用时容差，0.2表示允许慢20%%")
+    parser.add_argument("--rss-tolerance", type=float, default=0.2, help="峰值内存容差")
+    parser.add_argument("--hourly-dtype", choices=HOURLY_DTYPES, default="float64",
+                        help="逐小时分解结果的数据类型，float32时先检查与float64结果的误差")
+    parser.add_argument("--work-dir", help="合成数据和WDM文件的目录，默认为临时目录并在结束后删除")
+    parser.add_argument("--verbose", action="store_true", help="显示各步骤自身的输出")
+    args = parser.parse_args(argv)
+
+    # 基准测试不使用结果缓存
+    os.environ.pop(ENV_MEMO, None)
+    set_default_memo(None)
+    set_default_hourly_dtype(args.hourly_dtype)
+
+    stages = args.stages or [name for name in STAGES if name not in OPTIONAL_STAGES]
+    if args.pipeline and "pipeline" not in stages:
+        stages.append("pipeline")
+    config = {"years": args.years, "missing_rate": args.missing_rate, "special_rate": args.special_rate,
+              "seed": args.seed, "repeat": args.repeat, "hourly_dtype": args.hourly_dtype}
+    report = {"version": BENCHMARK_VERSION, "created": datetime.now().isoformat(timespec="seconds"),
+              "environment": environment(), "config": config, "runs": {}}
+    for n_stations in args.stations:
+        work_dir = os.path.join(args.work_dir, str(n_stations)) if args.work_dir else None
+        report["runs"][str(n_stations)] = run_benchmark(n_stations, args.years, args.missing_rate, args.special_rate,
+                                                        args.seed, stages, repeat=args.repeat, work_dir=work_dir,
+                                                        quiet=not args.verbose)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"💾 结果已保存: {args.output}")
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        rows = compare(report, baseline, args.time_tolerance, args.rss_tolerance)
+        print_comparison(rows)
+        if any(row["regression"] for row in rows):
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
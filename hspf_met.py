@@ -1,5 +1,6 @@
 import os.path
-from typing import List, Dict
+import time
+from typing import Callable, Dict, Iterable, List, Tuple, Union
 
 import pandas as pd
 
@@ -9,266 +10,480 @@ import wdmtoolbox.wdmtoolbox as wdm
 from wdmtoolbox import wdmutil
 from Metcal import *
 from missingfill import *
-from pandarallel import pandarallel
-pandarallel.initialize(verbose=0)
+from MetReader import iter_station_frames
+from MetExecutor import MetExecutor, get_executor
+from MetSave import WdmWriteCollector, WdmWriteSession
+from MetCatalog import get_catalog
+from MetStore import SeriesStore, read_series
+from MetPipeline import MetPipeline, Stage
+from MetMemo import set_default_memo
+from MetDataset import MetDataset
+from MetInstrument import Instrument, JsonLinesSink, MemorySink, echo, emit_record, is_quiet, iter_spans, \
+    peak_rss_mb, set_default_instrument, set_quiet, span
+
+
+# ============================按站点执行==================================
+def _collect_station_writes(station_func: Callable, *args):
+    """在工作进程中执行一个站点的计算，返回记录的写入请求、计算用时和工作进程的峰值内存"""
+    collector = WdmWriteCollector()
+    start = time.perf_counter()
+    station_func(*args, session=collector)
+    return collector.writes, time.perf_counter() - start, peak_rss_mb()
+
+
+def run_stations(station_func: Callable, tasks: Iterable[tuple], session: WdmWriteSession,
+                 station_executor: Union[MetExecutor, str] = None):
+    """
+    逐站点执行计算并写入WDM文件。
+    station_executor为None时在当前进程中逐个站点计算并直接写入；否则站点计算在执行器中并行，
+    计算结果按站点顺序返回当前进程，由一个写入会话写入，WDM文件只有一个写入方，DSN分配与顺序执行一致。
+    :param station_func: 站点计算函数，参数为tasks中的元组和session关键字参数
+    :param tasks: 每个站点的参数元组，按站点顺序排列，可以是生成器
+    :param session: 写入会话，所有站点计算完成后写入
+    :param station_executor: 站点级执行器或执行器类型，例如"process"，站点函数及其参数需要可以被序列化
+    """
+    # 站点参数中包含读取的输入，记录每个站点读取输入的用时
+    tasks = iter_spans(tasks, "input", station=lambda args: args[1])
+    if station_executor is None:
+        for args in tasks:
+            with span("station", station=args[1]) as record:
+                queued = session.queued_rows
+                station_func(*args, session=session)
+                record["rows"] = session.queued_rows - queued
+    else:
+        executor = get_executor(station_executor)
+        station_writes = executor.istarmap(_collect_station_writes, ((station_func,) + tuple(args) for args in tasks))
+        for writes, seconds, worker_peak_rss in station_writes:
+            for write in writes:
+                session.add(*write)
+            if writes:
+                emit_record("station", seconds, station=writes[0][3], rows=sum(len(write[0]) for write in writes),
+                            peak_rss_mb=worker_peak_rss)
+    session.flush()
+
+
+# 追加模式下重新处理的输入天数：缺测填充需要重写起始日期前一天的数据
+APPEND_CONTEXT_DAYS = 1
+
+
+def _rows_since(station_df: pd.DataFrame, since: pd.Timestamp, context_days: int = APPEND_CONTEXT_DAYS):
+    """追加模式下只保留重写起始日期前context_days天及之后的原始数据行，since为None时返回全部数据"""
+    if since is None:
+        return station_df
+    dates = pd.to_datetime(pd.DataFrame({"year": station_df['f5'], "month": station_df['f6'],
+                                         "day": station_df['f7']}))
+    return station_df[(dates >= since - pd.Timedelta(days=context_days)).to_numpy()]
+
+
+def _series_since(data: pd.DataFrame, since: pd.Timestamp, context_days: int = 0):
+    """追加模式下只保留重写起始日期前context_days天及之后的逐日序列，since为None时返回全部数据"""
+    if since is None:
+        return data
+    return data[data.index >= since - pd.Timedelta(days=context_days)]
 
 
 # ============================逐日数据==================================
+def _stationTmax(i: int, station: str, station_df: pd.DataFrame, wdmpath: str, data_col: str, scale: float,
+                 since: pd.Timestamp = None, max_gap_length: int = None, session: WdmWriteSession = None):
+    echo(f"处理站点: {station}")
+    station_df = _rows_since(station_df, since)
+
+    if station_df.empty:
+        echo(f"❌ 站点 {station} 没有找到数据！")
+        return
+
+    station_df = fill_missing_values_bymean(station_df, station_column='f1', data_col=data_col,
+                                            stations=[station], max_gap_length=max_gap_length)
+    station_data = station_df[[data_col, 'time']].copy()
+    station_data.set_index('time', inplace=True)
+    station_data.loc[:, data_col] = station_data[data_col] * scale
+    # 修复：正确处理celsius_to_fahrenheit的返回值
+    fahrenheit_data = celsius_to_fahrenheit(station_data, data_col)
+    station_data[data_col] = fahrenheit_data.iloc[:, 0].astype('float64')
+    dsn = 19 + i * 20
+    MetDataDailyTMAX(station_data, wdmpath, str(station), dsn=dsn, column=data_col, session=session)
+    echo(f"✅ 站点 {station} 处理成功，数据行数: {len(station_data)}, DSN: {dsn}")
+
+
 def metTmax(inputfile: str, wdmpath: str, data_col: str, stations: List[str], invalid_value: int,
-            scale=0.1):
-    print(f"处理最大温度数据，数据列: {data_col}")
-    temp_df = pd.read_csv(inputfile)
-    temp_df.loc[temp_df[data_col] == invalid_value, data_col] = np.nan
-    temp_df = fill_missing_values_bymean(temp_df, station_column='f1', data_col=data_col, stations=stations)
-    
-    for i, station in enumerate(stations):
-        print(f"处理站点: {station}")
-        
-        # 修复：使用整数比较
-        station_data = temp_df.loc[temp_df['f1'] == int(station), [data_col, 'time']]
-        
-        if station_data.empty:
-            print(f"❌ 站点 {station} 没有找到数据！")
-            continue
-            
-        station_data.set_index('time', inplace=True)
-        station_data.loc[:, data_col] = station_data[data_col] * scale
-        # 修复：正确处理celsius_to_fahrenheit的返回值
-        fahrenheit_data = celsius_to_fahrenheit(station_data, data_col)
-        station_data[data_col] = fahrenheit_data.iloc[:, 0].astype('float64')
-        dsn = 19 + i * 20
-        MetDataDailyTMAX(station_data, wdmpath, str(station), dsn=dsn, column=data_col)
-        print(f"✅ 站点 {station} 处理成功，数据行数: {len(station_data)}, DSN: {dsn}")
-    return temp_df
+            scale=0.1, store: SeriesStore = None, station_executor: Union[MetExecutor, str] = None, append: bool = False,
+            fill_policy: Union[str, List[str]] = "mean",
+            station_2_coord: Dict[str, Tuple[float, float]] = None, max_gap_length: int = None):
+    echo(f"处理最大温度数据，数据列: {data_col}")
+    station_frames = iter_station_frames(inputfile, stations, data_cols=[data_col], invalid_value=invalid_value)
+    station_frames = fill_station_frames(station_frames, data_col, fill_policy, station_2_coord, max_gap_length)
+    session = WdmWriteSession(wdmpath, store=store, append=append)
+    tasks = ((i, station, station_df, wdmpath, data_col, scale, session.append_start(19 + i * 20), max_gap_length)
+             for i, (station, station_df) in enumerate(station_frames))
+    run_stations(_stationTmax, tasks, session, station_executor)
+
+
+def _stationTmin(i: int, station: str, station_df: pd.DataFrame, wdmpath: str, data_col: str, scale: float,
+                 since: pd.Timestamp = None, max_gap_length: int = None, session: WdmWriteSession = None):
+    echo(f"处理站点: {station}")
+    station_df = _rows_since(station_df, since)
+
+    if station_df.empty:
+        echo(f"❌ 站点 {station} 没有找到数据！")
+        return
+
+    station_df = fill_missing_values_bymean(station_df, station_column='f1', data_col=data_col,
+                                            stations=[station], max_gap_length=max_gap_length)
+    station_data = station_df[[data_col, 'time']].copy()
+    station_data.set_index('time', inplace=True)
+    station_data.loc[:, data_col] = station_data[data_col] * scale
+    # 修复：正确处理celsius_to_fahrenheit的返回值
+    fahrenheit_data = celsius_to_fahrenheit(station_data, data_col)
+    station_data[data_col] = fahrenheit_data.iloc[:, 0].astype('float64')
+    dsn = 20 + i * 20
+    MetDataDailyTMIN(station_data, wdmpath, str(station), dsn=dsn, column=data_col, session=session)
+    echo(f"✅ 站点 {station} 处理成功，数据行数: {len(station_data)}, DSN: {dsn}")
 
 
 def metTmin(inputfile: str, wdmpath: str, data_col: str, stations: List[str], invalid_value: int,
-            scale=0.1):
-    print(f"处理最小温度数据，数据列: {data_col}")
-    temp_df = pd.read_csv(inputfile)
-    temp_df.loc[temp_df[data_col] == invalid_value, data_col] = np.nan
-    temp_df = fill_missing_values_bymean(temp_df, station_column='f1', data_col=data_col, stations=stations)
-    # print(temp_df)
-    for i, station in enumerate(stations):
-        print(f"处理站点: {station}")
-        
-        station_data = temp_df.loc[temp_df['f1'] == int(station), [data_col, 'time']]
-        
-        if station_data.empty:
-            print(f"❌ 站点 {station} 没有找到数据！")
-            continue
-            
-        station_data.set_index('time', inplace=True)
-        station_data.loc[:, data_col] = station_data[data_col] * scale
-        # 修复：正确处理celsius_to_fahrenheit的返回值
-        fahrenheit_data = celsius_to_fahrenheit(station_data, data_col)
-        station_data[data_col] = fahrenheit_data.iloc[:, 0].astype('float64')
-        dsn = 20 + i * 20
-        MetDataDailyTMIN(station_data, wdmpath, str(station), dsn=dsn, column=data_col)
-        print(f"✅ 站点 {station} 处理成功，数据行数: {len(station_data)}, DSN: {dsn}")
+            scale=0.1, store: SeriesStore = None, station_executor: Union[MetExecutor, str] = None, append: bool = False,
+            fill_policy: Union[str, List[str]] = "mean",
+            station_2_coord: Dict[str, Tuple[float, float]] = None, max_gap_length: int = None):
+    echo(f"处理最小温度数据，数据列: {data_col}")
+    station_frames = iter_station_frames(inputfile, stations, data_cols=[data_col], invalid_value=invalid_value)
+    station_frames = fill_station_frames(station_frames, data_col, fill_policy, station_2_coord, max_gap_length)
+    session = WdmWriteSession(wdmpath, store=store, append=append)
+    tasks = ((i, station, station_df, wdmpath, data_col, scale, session.append_start(20 + i * 20), max_gap_length)
+             for i, (station, station_df) in enumerate(station_frames))
+    run_stations(_stationTmin, tasks, session, station_executor)
+
+
+def _stationDailyWind(i: int, station: str, station_df: pd.DataFrame, wdmpath: str, data_col: str, scale: float,
+                      since: pd.Timestamp = None, max_gap_length: int = None, session: WdmWriteSession = None):
+    echo(f"处理站点: {station}")
+    station_df = _rows_since(station_df, since)
+
+    if station_df.empty:
+        echo(f"❌ 站点 {station} 没有找到数据！")
+        return
+
+    station_df = fill_missing_values_bymean(station_df, station_column='f1', data_col=data_col,
+                                            stations=[station], max_gap_length=max_gap_length)
+    station_data = station_df[[data_col, 'time']].copy()
+    station_data.set_index('time', inplace=True)
+    station_data.loc[:, data_col] = station_data[data_col] * scale
+    # 修复：正确处理ms_to_mph的返回值
+    mph_data = ms_to_mph(station_data, data_col)
+    station_data[data_col] = mph_data.iloc[:, 0].astype('float64')
+    # 修复：正确处理windTravelFromWindSpeed的返回值
+    wind_travel_data = windTravelFromWindSpeed(station_data, data_col)
+    station_data[data_col] = wind_travel_data.iloc[:, 0].astype('float64')
+    dsn = 21 + i * 20
+    MetDataDailyDWND(station_data, wdmpath, str(station), dsn=dsn, column=data_col, session=session)
+    echo(f"✅ 站点 {station} 处理成功，数据行数: {len(station_data)}, DSN: {dsn}")
 
 
 def metDailyWind(inputfile: str, wdmpath: str, data_col: str, stations: List[str],
                  invalid_value: int,
-                 scale=0.1):
-    print(f"处理日风速数据，数据列: {data_col}")
-    data_df = pd.read_csv(inputfile)
-    data_df.loc[data_df[data_col] == invalid_value, data_col] = np.nan
-    data_df = fill_missing_values_bymean(data_df, station_column='f1', data_col=data_col, stations=stations)
-    # print(data_df)
-    for i, station in enumerate(stations):
-        print(f"处理站点: {station}")
-        
-        station_data = data_df.loc[data_df['f1'] == int(station), [data_col, 'time']]
-        
-        if station_data.empty:
-            print(f"❌ 站点 {station} 没有找到数据！")
-            continue
-            
-        station_data.set_index('time', inplace=True)
-        station_data.loc[:, data_col] = station_data[data_col] * scale
-        # 修复：正确处理ms_to_mph的返回值
-        mph_data = ms_to_mph(station_data, data_col)
-        station_data[data_col] = mph_data.iloc[:, 0].astype('float64')
-        # 修复：正确处理windTravelFromWindSpeed的返回值
-        wind_travel_data = windTravelFromWindSpeed(station_data, data_col)
-        station_data[data_col] = wind_travel_data.iloc[:, 0].astype('float64')
-        dsn = 21 + i * 20
-        MetDataDailyDWND(station_data, wdmpath, str(station), dsn=dsn, column=data_col)
-        print(f"✅ 站点 {station} 处理成功，数据行数: {len(station_data)}, DSN: {dsn}")
+                 scale=0.1, store: SeriesStore = None, station_executor: Union[MetExecutor, str] = None, append: bool = False,
+                 fill_policy: Union[str, List[str]] = "mean",
+                 station_2_coord: Dict[str, Tuple[float, float]] = None, max_gap_length: int = None):
+    echo(f"处理日风速数据，数据列: {data_col}")
+    station_frames = iter_station_frames(inputfile, stations, data_cols=[data_col], invalid_value=invalid_value)
+    station_frames = fill_station_frames(station_frames, data_col, fill_policy, station_2_coord, max_gap_length)
+    session = WdmWriteSession(wdmpath, store=store, append=append)
+    tasks = ((i, station, station_df, wdmpath, data_col, scale, session.append_start(21 + i * 20), max_gap_length)
+             for i, (station, station_df) in enumerate(station_frames))
+    run_stations(_stationDailyWind, tasks, session, station_executor)
+
+
+def _stationDailyCloud(i: int, station: str, station_df: pd.DataFrame, wdmpath: str, data_col: str, scale: float,
+                       since: pd.Timestamp = None, max_gap_length: int = None, session: WdmWriteSession = None):
+    echo(f"处理站点: {station}")
+    station_df = _rows_since(station_df, since)
+
+    if station_df.empty:
+        echo(f"❌ 站点 {station} 没有找到数据！")
+        return
+
+    station_df = fill_missing_values_bymean(station_df, station_column='f1', data_col=data_col,
+                                            stations=[station], max_gap_length=max_gap_length)
+    station_data = station_df[[data_col, 'time']].copy()
+    station_data.set_index('time', inplace=True)
+    station_data.loc[:, data_col] = station_data[data_col] * scale
+    # 修复：正确处理MetDataDailyCloudBySunshine的返回值
+    cloud_data = MetDataDailyCloudBySunshine(station_data, data_col)
+    station_data[data_col] = cloud_data.iloc[:, 0].astype('float64')
+    dsn = 22 + i * 20
+    MetDataDailyDCLO(station_data, wdmpath, str(station), dsn=dsn, column=data_col, session=session)
+    echo(f"✅ 站点 {station} 处理成功，数据行数: {len(station_data)}, DSN: {dsn}")
 
 
 def metDailyCloud(inputfile: str, wdmpath: str, data_col: str, stations: List[str],
                   invalid_value: int,
-                  scale=0.1):
-    print(f"处理日云量数据，数据列: {data_col}")
-    data_df = pd.read_csv(inputfile)
-    data_df.loc[data_df[data_col] == invalid_value, data_col] = np.nan
-    data_df = fill_missing_values_bymean(data_df, station_column='f1', data_col=data_col, stations=stations)
-    # print(data_df)
-    for i, station in enumerate(stations):
-        print(f"处理站点: {station}")
-        
-        station_data = data_df.loc[data_df['f1'] == int(station), [data_col, 'time']]
-        
-        if station_data.empty:
-            print(f"❌ 站点 {station} 没有找到数据！")
-            continue
-            
-        station_data.set_index('time', inplace=True)
-        station_data.loc[:, data_col] = station_data[data_col] * scale
-        # 修复：正确处理MetDataDailyCloudBySunshine的返回值
-        cloud_data = MetDataDailyCloudBySunshine(station_data, data_col)
-        station_data[data_col] = cloud_data.iloc[:, 0].astype('float64')
-        dsn = 22 + i * 20
-        MetDataDailyDCLO(station_data, wdmpath, str(station), dsn=dsn, column=data_col)
-        print(f"✅ 站点 {station} 处理成功，数据行数: {len(station_data)}, DSN: {dsn}")
+                  scale=0.1, store: SeriesStore = None, station_executor: Union[MetExecutor, str] = None, append: bool = False,
+                  fill_policy: Union[str, List[str]] = "mean",
+                  station_2_coord: Dict[str, Tuple[float, float]] = None, max_gap_length: int = None):
+    echo(f"处理日云量数据，数据列: {data_col}")
+    station_frames = iter_station_frames(inputfile, stations, data_cols=[data_col], invalid_value=invalid_value)
+    station_frames = fill_station_frames(station_frames, data_col, fill_policy, station_2_coord, max_gap_length)
+    session = WdmWriteSession(wdmpath, store=store, append=append)
+    tasks = ((i, station, station_df, wdmpath, data_col, scale, session.append_start(22 + i * 20), max_gap_length)
+             for i, (station, station_df) in enumerate(station_frames))
+    run_stations(_stationDailyCloud, tasks, session, station_executor)
+
+
+def _stationDailyDewpointTemperature(i: int, station: str, atem_df: pd.DataFrame, rhum_df: pd.DataFrame,
+                                     wdmpath: str, atem_col: str, rhum_col: str, scale: float,
+                                     since: pd.Timestamp = None, max_gap_length: int = None,
+                                     session: WdmWriteSession = None):
+    echo(f"处理站点: {station}")
+    atem_df = _rows_since(atem_df, since)
+    rhum_df = _rows_since(rhum_df, since)
+
+    if atem_df.empty or rhum_df.empty:
+        echo(f"❌ 站点 {station} 缺少温度或湿度数据！")
+        return
+
+    #空值处理
+    atem_df = fill_missing_values_bymean(atem_df, station_column='f1', data_col=atem_col, stations=[station],
+                                         max_gap_length=max_gap_length)
+    rhum_df = fill_missing_values_bymean(rhum_df, station_column='f1', data_col=rhum_col, stations=[station],
+                                         max_gap_length=max_gap_length)
+    #提取相应站点
+    atem_station_data = atem_df[[atem_col, 'time']].copy()
+    rhum_station_data = rhum_df[[rhum_col, 'time']].copy()
+    #设置时间为索引
+    atem_station_data.set_index('time', inplace=True)
+    rhum_station_data.set_index('time', inplace=True)
+    #缩放尺度
+    atem_station_data.loc[:, atem_col] = atem_station_data[atem_col] * scale
+    # 相对湿度scale = 1%
+    rhum_station_data.loc[:, rhum_col] = rhum_station_data[rhum_col]
+    # 计算露点温度
+    dptp_station_data = DewpointTemperatureByMagnusTetens(aAvgTmp=atem_station_data, temp_column=atem_col,
+                                                          aRelHum=rhum_station_data, rhu_column=rhum_col)
+    # 修复：正确处理celsius_to_fahrenheit的返回值
+    fahrenheit_data = celsius_to_fahrenheit(dptp_station_data, 'DPTP')
+    dptp_station_data['DPTP'] = fahrenheit_data.iloc[:, 0].astype('float64')
+    dsn = 23 + i * 20
+    MetDataDailyDPTP(dptp_station_data, wdmpath, str(station), dsn=dsn, column='DPTP', session=session)
+    echo(f"✅ 站点 {station} 处理成功，数据行数: {len(dptp_station_data)}, DSN: {dsn}")
 
 
 def metDailyDewpointTemperature(atem_file: str, atem_col: str, rhum_file: str, rhum_col: str, wdmpath: str,
-                                stations: List[str], invalid_value: int, scale=0.1):
-    #加载数据
-    print(f"处理日露点温度数据，温度列: {atem_col}, 湿度列: {rhum_col}")
-    atem_df = pd.read_csv(atem_file)
-    rhum_df = pd.read_csv(rhum_file)
-    #无效值处理为NAN
-    atem_df.loc[atem_df[atem_col] == invalid_value, atem_col] = np.nan
-    rhum_df.loc[rhum_df[rhum_col] == invalid_value, rhum_col] = np.nan
-    #空值处理
-    atem_df = fill_missing_values_bymean(atem_df, station_column='f1', data_col=atem_col, stations=stations)
-    rhum_df = fill_missing_values_bymean(rhum_df, station_column='f1', data_col=rhum_col, stations=stations)
-    # print(rhum_df)
-    for i, station in enumerate(stations):
-        print(f"处理站点: {station}")
-        
-        #提取相应站点
-        atem_station_data = atem_df.loc[atem_df['f1'] == int(station), [atem_col, 'time']]
-        rhum_station_data = rhum_df.loc[rhum_df['f1'] == int(station), [rhum_col, 'time']]
-        
-        if atem_station_data.empty or rhum_station_data.empty:
-            print(f"❌ 站点 {station} 缺少温度或湿度数据！")
-            continue
-            
-        #设置时间为索引
-        atem_station_data.set_index('time', inplace=True)
-        rhum_station_data.set_index('time', inplace=True)
-        #缩放尺度
-        atem_station_data.loc[:, atem_col] = atem_station_data[atem_col] * scale
-        # 相对湿度scale = 1%
-        rhum_station_data.loc[:, rhum_col] = rhum_station_data[rhum_col]
-        # 计算露点温度
-        dptp_station_data = DewpointTemperatureByMagnusTetens(aAvgTmp=atem_station_data, temp_column=atem_col,
-                                                              aRelHum=rhum_station_data, rhu_column=rhum_col)
-        # 修复：正确处理celsius_to_fahrenheit的返回值
-        fahrenheit_data = celsius_to_fahrenheit(dptp_station_data, 'DPTP')
-        dptp_station_data['DPTP'] = fahrenheit_data.iloc[:, 0].astype('float64')
-        dsn = 23 + i * 20
-        MetDataDailyDPTP(dptp_station_data, wdmpath, str(station), dsn=dsn, column='DPTP')
-        print(f"✅ 站点 {station} 处理成功，数据行数: {len(dptp_station_data)}, DSN: {dsn}")
-
-
-def metDailySolar(inputfile: str, wdmpath: str, data_col: str, stations: List[str], invalid_value: int, scale=0.01):
-    print(f"处理日太阳辐射数据，数据列: {data_col}")
-    data_df = pd.read_csv(inputfile)
-    data_df.loc[data_df[data_col] == invalid_value, data_col] = np.nan
-    data_df = fill_missing_values_bymean(data_df, station_column='f1', data_col=data_col, stations=stations)
+                                stations: List[str], invalid_value: int, scale=0.1, store: SeriesStore = None,
+                                station_executor: Union[MetExecutor, str] = None, append: bool = False,
+                                fill_policy: Union[str, List[str]] = "mean",
+                                station_2_coord: Dict[str, Tuple[float, float]] = None, max_gap_length: int = None):
+    echo(f"处理日露点温度数据，温度列: {atem_col}, 湿度列: {rhum_col}")
+    #加载数据，无效值处理为NAN
+    atem_frames = iter_station_frames(atem_file, stations, data_cols=[atem_col], invalid_value=invalid_value)
+    rhum_frames = iter_station_frames(rhum_file, stations, data_cols=[rhum_col], invalid_value=invalid_value)
+    atem_frames = fill_station_frames(atem_frames, atem_col, fill_policy, station_2_coord, max_gap_length)
+    rhum_frames = fill_station_frames(rhum_frames, rhum_col, fill_policy, station_2_coord, max_gap_length)
+    session = WdmWriteSession(wdmpath, store=store, append=append)
+    tasks = ((i, station, atem_df, rhum_df, wdmpath, atem_col, rhum_col, scale, session.append_start(23 + i * 20),
+              max_gap_length)
+             for i, ((station, atem_df), (_, rhum_df)) in enumerate(zip(atem_frames, rhum_frames)))
+    run_stations(_stationDailyDewpointTemperature, tasks, session, station_executor)
+
+
+def _stationDailySolar(i: int, station: str, station_df: pd.DataFrame, wdmpath: str, data_col: str, scale: float,
+                       since: pd.Timestamp = None, max_gap_length: int = None, session: WdmWriteSession = None):
+    echo(f"处理站点: {station}")
+    station_df = _rows_since(station_df, since)
+
+    if station_df.empty:
+        echo(f"❌ 站点 {station} 没有找到数据！")
+        return
+
+    station_df = fill_missing_values_bymean(station_df, station_column='f1', data_col=data_col,
+                                            stations=[station], max_gap_length=max_gap_length)
+    station_data = station_df[[data_col, 'time']].copy()
+    station_data.set_index('time', inplace=True)
+    station_data[data_col] = station_data[data_col] * scale
+    # 修复：正确处理mjm2_to_Ly的返回值
+    ly_data = mjm2_to_Ly(station_data, data_col)
+    station_data[data_col] = ly_data.iloc[:, 0].astype('float64')
+    dsn = 24 + i * 20
+    if station_data.empty:
+        raise ValueError(f"{station}站点数据为空")
+    MetDataDailyDSOL(station_data, wdmpath, station, dsn=dsn, column=data_col, session=session)
+    echo(f"✅ 站点 {station} 处理成功，数据行数: {len(station_data)}, DSN: {dsn}")
+
+
+def metDailySolar(inputfile: str, wdmpath: str, data_col: str, stations: List[str], invalid_value: int, scale=0.01,
+                  store: SeriesStore = None, station_executor: Union[MetExecutor, str] = None, append: bool = False,
+                  fill_policy: Union[str, List[str]] = "mean",
+                  station_2_coord: Dict[str, Tuple[float, float]] = None, max_gap_length: int = None):
+    echo(f"处理日太阳辐射数据，数据列: {data_col}")
+    station_frames = iter_station_frames(inputfile, stations, data_cols=[data_col], invalid_value=invalid_value)
+    station_frames = fill_station_frames(station_frames, data_col, fill_policy, station_2_coord, max_gap_length)
+    session = WdmWriteSession(wdmpath, store=store, append=append)
+    tasks = ((i, station, station_df, wdmpath, data_col, scale, session.append_start(24 + i * 20), max_gap_length)
+             for i, (station, station_df) in enumerate(station_frames))
+    run_stations(_stationDailySolar, tasks, session, station_executor)
+
+
+# 批量计算蒸发时每批的站点数，限制 站点数×天数 输入数组占用的内存
+EVAPORATION_BATCH_STATIONS = 256
+
+
+def _daily_dataset_batches(wdmpath: str, stations: List[str], tstypes: List[str], dsn_base: int,
+                           session: WdmWriteSession, store: SeriesStore = None, latitudes: Dict[str, float] = None,
+                           batch_stations: int = EVAPORATION_BATCH_STATIONS):
+    """
+    按批读取站点已有的逐日序列，按日期对齐为MetDataset。
+    每个变量、每个站点的序列按日期放入 站点数×天数 数组，序列中没有的日期为NaN并在coverage中记录，
+    追加模式下每个站点只读取结果DSN重写起始日期之后的数据。
+    :param wdmpath: wdm文件路径
+    :param stations: 站点列表，第i个站点的结果DSN为 dsn_base + i * 20
+    :param tstypes: 需要读取的时序类型
+    :param dsn_base: 结果的DSN基数
+    :param session: 写入会话，用于确定追加模式下的重写起始日期
+    :param store: 序列缓存
+    :param latitudes: 站点纬度
+    :param batch_stations: 每批的站点数
+    :return: 生成器，依次返回每批的MetDataset，缺少输入DSN的站点不在其中
+    """
+    catalog = get_catalog(wdmpath)
+    for tstype in tstypes:
+        catalog.check_stations(stations, tstype)
+    station_dsns = {tstype: catalog.stations_dsn(stations, tstype) for tstype in tstypes}
+
+    batch = []
     for i, station in enumerate(stations):
-        print(f"处理站点: {station}")
-        
-        station_data = data_df.loc[data_df['f1'] == int(station), [data_col, 'time']]
-        
-        if station_data.empty:
-            print(f"❌ 站点 {station} 没有找到数据！")
+        echo(f"处理站点: {station}")
+        dsns = {tstype: station_dsns[tstype].get(station) for tstype in tstypes}
+        missing = [tstype for tstype, dsn in dsns.items() if not dsn]
+        if missing:
+            echo(f"❌ 站点 {station} 缺少{'、'.join(missing)}数据DSN！")
             continue
-            
-        station_data.set_index('time', inplace=True)
-        station_data[data_col] = station_data[data_col] * scale
-        # 修复：正确处理mjm2_to_Ly的返回值
-        ly_data = mjm2_to_Ly(station_data, data_col)
-        station_data[data_col] = ly_data.iloc[:, 0].astype('float64')
-        dsn = 24 + i * 20
-        if station_data.empty:
-            raise ValueError(f"{station}站点数据为空")
-        MetDataDailyDSOL(station_data, wdmpath, station, dsn=dsn, column=data_col)
-        print(f"✅ 站点 {station} 处理成功，数据行数: {len(station_data)}, DSN: {dsn}")
+        with span("input", station=station):
+            since = session.append_start(dsn_base + i * 20)
+            series = {tstype: _series_since(read_series(wdmpath, station, dsn, tstype, store=store), since)
+                      for tstype, dsn in dsns.items()}
+        batch.append((i, station, series))
+        if len(batch) >= batch_stations:
+            yield from _aligned_dataset(batch, tstypes, latitudes)
+            batch = []
+    if batch:
+        yield from _aligned_dataset(batch, tstypes, latitudes)
+
+
+def _aligned_dataset(batch: List[tuple], tstypes: List[str], latitudes: Dict[str, float] = None):
+    """
+    把一批站点的序列(站点序号, 站点ID, 时序类型到序列的字典)对齐为MetDataset，DSN偏移为 站点序号 * 20
+    :return: 生成器，返回对齐的MetDataset，所有站点都没有数据(例如追加模式下没有新数据)时不返回
+    """
+    stations = [station for _, station, _ in batch]
+    variables = {tstype: {station: series[tstype] for _, station, series in batch} for tstype in tstypes}
+    if not any(len(frame) for by_station in variables.values() for frame in by_station.values()):
+        echo(f"站点 {', '.join(stations)} 没有需要计算的数据")
+        return
+    yield MetDataset.from_variables(variables, stations, latitudes=latitudes,
+                                    dsn_offsets=[i * 20 for i, _, _ in batch])
+
+
+def _run_daily_batches(datasets: Iterable[MetDataset], compute: Callable, tstype: str, wdmpath: str,
+                       save_func: Callable, session: WdmWriteSession):
+    """
+    逐批计算并把逐日结果逐站点加入写入会话，只写入所有输入序列都有记录的日期，最后提交写入
+    :param datasets: 每批对齐的输入，见_daily_dataset_batches
+    :param compute: 计算函数，参数为一批的MetDataset，返回包含tstype的MetDataset
+    :param tstype: 结果的时序类型
+    :param wdmpath: wdm文件路径
+    :param save_func: 保存函数，例如MetDataDailyDEVT
+    :param session: 写入会话
+    """
+    for dataset in datasets:
+        with span("batch", stations=len(dataset)) as record:
+            queued = session.queued_rows
+            result = compute(dataset)
+            for station in result.stations:
+                frame = result.station_frame(station, [tstype])[result.station_coverage(station)]
+                dsn = result.dsn(station, tstype)
+                save_func(frame, wdmpath, station, dsn, tstype, session=session)
+                echo(f"✅ 站点 {station} 处理成功，数据行数: {len(frame)}, DSN: {dsn}")
+            record["rows"] = session.queued_rows - queued
+    session.flush()
 
 
 def metDailyEvapotranspiration(wdmpath: str, stations: List[str], station_2_latDeg: Dict[str, float],
-                               hMonCoeff: List[float] = None):
-    print(f"处理日蒸散发数据，基于已有温度数据计算")
-    dsns = wdm.listdsns(wdmpath)
-    wdmts = wdmutil.WDM()
-    all_dsn_attrs = [wdmts.describe_dsn(wdmpath, dsn) for dsn in dsns]
-    checkStatios(stations, all_dsn_attrs, 'TMAX')
-    checkStatios(stations, all_dsn_attrs, 'TMIN')
-    tmax_LOCN_DSN = get_stns_dsn(stations, all_dsn_attrs, 'TMAX')
-    tmin_LOCN_DSN = get_stns_dsn(stations, all_dsn_attrs, 'TMIN')
-    for i, station in enumerate(stations):
-        print(f"处理站点: {station}")
-        
-        aLatDeg = station_2_latDeg.get(station)
-        tmax_dsn = tmax_LOCN_DSN.get(station)
-        tmin_dsn = tmin_LOCN_DSN.get(station)
-        
-        if not tmax_dsn or not tmin_dsn:
-            print(f"❌ 站点 {station} 缺少温度数据DSN！")
-            continue
-            
-        tmin = wdmts.read_dsn(wdmpath, tmin_dsn)
-        tmin_source_name = f'{os.path.basename(wdmpath)[:-4]}_DSN_{tmin_dsn}'
-        tmin.rename(columns={tmin_source_name: "TMIN"}, inplace=True)
-        tmax = wdmts.read_dsn(wdmpath, tmax_dsn)
-        tmax_source_name = f'{os.path.basename(wdmpath)[:-4]}_DSN_{tmax_dsn}'
-        tmax.rename(columns={tmax_source_name: "TMAX"}, inplace=True)
-        devt_df = PanEvaporationValueComputedByHamon(aTMinTS=tmin, aTMaxTS=tmax, aDegF=True, aLatDeg=aLatDeg,
-                                                     aCTS=hMonCoeff)
-        dsn = 25 + i * 20
-        MetDataDailyDEVT(devt_df, wdmpath, station, dsn, "DEVT")
-        print(f"✅ 站点 {station} 处理成功，数据行数: {len(devt_df)}, DSN: {dsn}")
-
-
-def metDailyEvaporation(wdmpath: str, stations: List[str]):
-    print(f"处理日蒸发量数据，基于Penman公式计算")
-    dsns = wdm.listdsns(wdmpath)
-    wdmts = wdmutil.WDM()
-    all_dsn_attrs = [wdmts.describe_dsn(wdmpath, dsn) for dsn in dsns]
-    checkStatios(stations, all_dsn_attrs, 'TMAX')
-    checkStatios(stations, all_dsn_attrs, 'TMIN')
-    checkStatios(stations, all_dsn_attrs, 'DPTP')
-    checkStatios(stations, all_dsn_attrs, 'DSOL')
-    checkStatios(stations, all_dsn_attrs, 'DWND')
-    tmax_LOCN_DSN = get_stns_dsn(stations, all_dsn_attrs, 'TMAX')
-    tmin_LOCN_DSN = get_stns_dsn(stations, all_dsn_attrs, 'TMIN')
-    dptp_LOCN_DSN = get_stns_dsn(stations, all_dsn_attrs, 'DPTP')
-    dsol_LOCN_DSN = get_stns_dsn(stations, all_dsn_attrs, 'DSOL')
-    dwnd_LOCN_DSN = get_stns_dsn(stations, all_dsn_attrs, 'DWND')
-    for i, station in enumerate(stations):
-        print(f"处理站点: {station}")
-        
-        tmax_dsn = tmax_LOCN_DSN.get(station)
-        tmin_dsn = tmin_LOCN_DSN.get(station)
-        dptp_dsn = dptp_LOCN_DSN.get(station)
-        dwnd_dsn = dwnd_LOCN_DSN.get(station)
-        dsol_dsn = dsol_LOCN_DSN.get(station)
-        
-        if not all([tmax_dsn, tmin_dsn, dptp_dsn, dwnd_dsn, dsol_dsn]):
-            print(f"❌ 站点 {station} 缺少必要的气象数据DSN！")
-            continue
-            
-        tmax = read_dsn(wdmpath, tmax_dsn, "TMAX")
-        tmin = read_dsn(wdmpath, tmin_dsn, "TMIN")
-        dptp = read_dsn(wdmpath, dptp_dsn, "DPTP")
-        dwnd = read_dsn(wdmpath, dwnd_dsn, "DWND")
-        dsol = read_dsn(wdmpath, dsol_dsn, "DSOL")
-        devp_df = PanEvaporationValueComputedByPenman(aMinTmp=tmin, aMaxTmp=tmax, aDewTmp=dptp, aWindSp=dwnd,
-                                                      aSolRad=dsol)
-        dsn = 26 + i * 20
-        MetDataDailyDEVP(devp_df, wdmpath, station, dsn, "DEVP")
-        print(f"✅ 站点 {station} 处理成功，数据行数: {len(devp_df)}, DSN: {dsn}")
+                               hMonCoeff: List[float] = None, store: SeriesStore = None,
+                               station_executor: Union[MetExecutor, str] = None, append: bool = False,
+                               batch_stations: int = EVAPORATION_BATCH_STATIONS):
+    """
+    根据已有的逐日最高、最低温度按Hamon公式计算逐日潜在蒸散(DEVT)。
+    站点按批对齐为 站点数×天数 数组，每批由HamonEvaporationArray一次计算。
+    :param station_executor: 已按站点批量计算，不再需要站点级执行器，保留该参数以兼容原调用
+    :param batch_stations: 每批的站点数
+    """
+    echo(f"处理日蒸散发数据，基于已有温度数据计算")
+    session = WdmWriteSession(wdmpath, store=store, append=append)
+    datasets = _daily_dataset_batches(wdmpath, stations, ['TMAX', 'TMIN'], 25, session, store=store,
+                                      latitudes=station_2_latDeg, batch_stations=batch_stations)
+    _run_daily_batches(datasets, lambda dataset: PanEvaporationValueComputedByHamon(
+        aTMinTS=dataset, aTMaxTS=dataset, aDegF=True, aLatDeg=None, aCTS=hMonCoeff), "DEVT", wdmpath,
+                       MetDataDailyDEVT, session)
+
+
+def metDailyEvaporation(wdmpath: str, stations: List[str], store: SeriesStore = None,
+                        station_executor: Union[MetExecutor, str] = None, append: bool = False,
+                        batch_stations: int = EVAPORATION_BATCH_STATIONS):
+    """
+    根据已有的逐日温度、露点温度、风速和辐射按Penman公式计算逐日蒸发(DEVP)。
+    站点按批对齐为 站点数×天数 数组，每批由PenmanEvaporationArray一次计算。
+    :param station_executor: 已按站点批量计算，不再需要站点级执行器，保留该参数以兼容原调用
+    :param batch_stations: 每批的站点数
+    """
+    echo(f"处理日蒸发量数据，基于Penman公式计算")
+    session = WdmWriteSession(wdmpath, store=store, append=append)
+    datasets = _daily_dataset_batches(wdmpath, stations, ['TMAX', 'TMIN', 'DPTP', 'DSOL', 'DWND'], 26, session,
+                                      store=store, batch_stations=batch_stations)
+    _run_daily_batches(datasets, lambda dataset: PanEvaporationValueComputedByPenman(
+        aMinTmp=dataset, aMaxTmp=dataset, aDewTmp=dataset, aWindSp=dataset, aSolRad=dataset), "DEVP", wdmpath,
+                       MetDataDailyDEVP, session)
 
 
 # ============================逐小时数据==================================
-def metHourlyPREC(prec_file: str, wdmpath: str, stations: List[str], data_col: str, scale=0.01, method: str = "equal"):
+def _decode_station_prec(station_frames: Iterable[tuple], data_col: str):
+    """逐个站点解码降水特殊值(缺测、微量、雨雪等编码)"""
+    for station, station_df in station_frames:
+        if not station_df.empty:
+            station_df[data_col] = decode_prec_special_values(station_df[data_col].to_numpy())[0]
+        yield station, station_df
+
+
+def _stationHourlyPREC(i: int, station: str, station_df: pd.DataFrame, wdmpath: str, data_col: str, scale: float,
+                       method: str, executor: Union[MetExecutor, str], weights: List[float],
+                       since: pd.Timestamp = None, max_gap_length: int = None, session: WdmWriteSession = None):
+    echo(f"  🔄 处理站点: {station}")
+    station_df = _rows_since(station_df, since)
+
+    if station_df.empty:
+        echo(f"    ❌ 站点 {station} 没有找到数据！")
+        return
+
+    # 解码降水特殊值(缺测、微量、雨雪等编码)
+    prec_values, _ = decode_prec_special_values(station_df[data_col].to_numpy())
+    station_df[data_col] = prec_values
+    station_df = fill_missing_values_bymean(station_df, station_column='f1', data_col=data_col,
+                                            stations=[station], max_gap_length=max_gap_length)
+    station_data = station_df[[data_col, 'time']].copy()
+    station_data.set_index('time', inplace=True)
+    # 毫米转为英寸
+    # 数据 = 原始数据 * 缩放尺度 * 单位转换系数
+    station_data = station_data * scale * 0.0393701
+    dsn = 11 + i * 20
+    #precip字段名称固定的，必须这样写。
+    station_data.rename(columns={data_col: 'precip'}, inplace=True)
+    MetDataHourlyPREC(aInTS=station_data, wdmpath=wdmpath, location=station, dsn=dsn, method=method,
+                      executor=executor, weights=weights, session=session)
+    echo(f"    ✅ 站点 {station} 处理成功，数据行数: {len(station_data)}, DSN: {dsn}")
+
+
+def metHourlyPREC(prec_file: str, wdmpath: str, stations: List[str], data_col: str, scale=0.01, method: str = "equal",
+                  executor: Union[MetExecutor, str] = None, weights: List[float] = None, store: SeriesStore = None,
+                  station_executor: Union[MetExecutor, str] = None, append: bool = False,
+                  fill_policy: Union[str, List[str]] = "mean",
+                  station_2_coord: Dict[str, Tuple[float, float]] = None, max_gap_length: int = None):
     """
     处理小时降水数据
     
@@ -277,196 +492,333 @@ def metHourlyPREC(prec_file: str, wdmpath: str, stations: List[str], data_col: s
     :param stations: 站点列表
     :param data_col: 数据列名
     :param scale: 数据缩放因子
-    :param method: 降雨分布方法 - "equal": 均匀分布, "triangular": 三角分布
+    :param method: 降雨分布方法 - "equal": 均匀分布, "fixed": 固定权重分布, "triangular": 三角分布
+    :param executor: 执行器或执行器类型，为None时使用默认执行器
+    :param weights: method为"fixed"时24小时的权重
+    :param store: 序列缓存
+    :param station_executor: 站点级执行器或执行器类型，为None时在当前进程中逐个站点计算
+    :param append: 追加模式，已有的DSN只重写最后一天并追加之后的数据
+    :param fill_policy: 缺失值填充方法，见fill_station_frames
+    :param station_2_coord: 站点到(纬度, 经度)的字典，idw方法需要
+    :param max_gap_length: 最大填充的连续缺失天数，更长的连续缺失保持为空，为None时不限制
     """
-    print(f"🌧️  处理小时降水数据，数据列: {data_col}, 分布方法: {method}")
-    data_df = pd.read_csv(prec_file)
-    # 修复：先转换为float类型避免数据类型兼容性警告
-    data_df[data_col] = data_df[data_col].astype('float64')
-    data_df.loc[:, [data_col]] = data_df[data_col].parallel_apply(prec_special_values)
-    data_df = fill_missing_values_bymean(data_df, station_column='f1', data_col=data_col, stations=stations)
-    for i, station in enumerate(stations):
-        print(f"  🔄 处理站点: {station}")
-        
-        station_data = data_df.loc[data_df['f1'] == int(station), [data_col, 'time']]
-        
-        if station_data.empty:
-            print(f"    ❌ 站点 {station} 没有找到数据！")
-            continue
-            
-        station_data.set_index('time', inplace=True)
-        # 毫米转为英寸
-        # 数据 = 原始数据 * 缩放尺度 * 单位转换系数
-        station_data = station_data * scale * 0.0393701
-        dsn = 11 + i * 20
-        #precip字段名称固定的，必须这样写。
-        station_data.rename(columns={data_col: 'precip'}, inplace=True)
-        MetDataHourlyPREC(aInTS=station_data, wdmpath=wdmpath, location=station, dsn=dsn, method=method)
-        print(f"    ✅ 站点 {station} 处理成功，数据行数: {len(station_data)}, DSN: {dsn}")
-
-
-def metHourlyEVAP(wdmpath: str, stations: List[str], station_2_latDeg: Dict[str, float], tstype:str='DEVP'):
-    print(f"处理小时蒸发数据，基于日蒸发数据分解")
-    dsns = wdm.listdsns(wdmpath)
-    wdmts = wdmutil.WDM()
-    all_dsn_attrs = [wdmts.describe_dsn(wdmpath, dsn) for dsn in dsns]
-    checkStatios(stations, all_dsn_attrs, tstype)
-    devp_LOCN_DSN = get_stns_dsn(stations, all_dsn_attrs, tstype)
-    for i, station in enumerate(stations):
-        print(f"处理站点: {station}")
-        
-        devp_dsn = devp_LOCN_DSN.get(station)
-        
-        if not devp_dsn:
-            print(f"❌ 站点 {station} 缺少蒸发数据DSN！")
-            continue
-            
-        devp = read_dsn(wdmpath, devp_dsn, tstype)
-        aLatDeg = station_2_latDeg.get(station)
-        dsn = 12 + i * 20
-        MetDataHourlyEVAP(aInTS=devp, wdmpath=wdmpath, location=station, aLatDeg=aLatDeg, dsn=dsn)
-        print(f"✅ 站点 {station} 处理成功，数据行数: {len(devp)}, DSN: {dsn}")
-
-
-def metHourlyATEM(wdmpath: str, stations: List[str], aObsTime:int, ):
-    print(f"处理小时温度数据，基于日最大最小温度分解，观测时间: {aObsTime}")
-    dsns = wdm.listdsns(wdmpath)
-    wdmts = wdmutil.WDM()
+    echo(f"🌧️  处理小时降水数据，数据列: {data_col}, 分布方法: {method}")
+    station_frames = iter_station_frames(prec_file, stations, data_cols=[data_col])
+    if fill_policy != "mean":
+        # 空间填充前先解码特殊值，站点计算中再次解码时取值不变
+        station_frames = _decode_station_prec(station_frames, data_col)
+    station_frames = fill_station_frames(station_frames, data_col, fill_policy, station_2_coord, max_gap_length)
+    session = WdmWriteSession(wdmpath, store=store, append=append)
+    tasks = ((i, station, station_df, wdmpath, data_col, scale, method, executor, weights,
+              session.append_start(11 + i * 20), max_gap_length)
+             for i, (station, station_df) in enumerate(station_frames))
+    run_stations(_stationHourlyPREC, tasks, session, station_executor)
+
+
+def _stationHourlyEVAP(i: int, station: str, devp: pd.DataFrame, wdmpath: str, aLatDeg: float,
+                       executor: Union[MetExecutor, str], session: WdmWriteSession = None):
+    dsn = 12 + i * 20
+    MetDataHourlyEVAP(aInTS=devp, wdmpath=wdmpath, location=station, aLatDeg=aLatDeg, dsn=dsn,
+                      executor=executor, session=session)
+    echo(f"✅ 站点 {station} 处理成功，数据行数: {len(devp)}, DSN: {dsn}")
+
+
+def metHourlyEVAP(wdmpath: str, stations: List[str], station_2_latDeg: Dict[str, float], tstype:str='DEVP',
+                  executor: Union[MetExecutor, str] = None, store: SeriesStore = None,
+                  station_executor: Union[MetExecutor, str] = None, append: bool = False):
+    echo(f"处理小时蒸发数据，基于日蒸发数据分解")
+    catalog = get_catalog(wdmpath)
+    catalog.check_stations(stations, tstype)
+    devp_LOCN_DSN = catalog.stations_dsn(stations, tstype)
+
+    session = WdmWriteSession(wdmpath, store=store, append=append)
+
+    def tasks():
+        for i, station in enumerate(stations):
+            echo(f"处理站点: {station}")
+
+            devp_dsn = devp_LOCN_DSN.get(station)
+
+            if not devp_dsn:
+                echo(f"❌ 站点 {station} 缺少蒸发数据DSN！")
+                continue
+
+            since = session.append_start(12 + i * 20)
+            devp = _series_since(read_series(wdmpath, station, devp_dsn, tstype, store=store), since)
+            yield i, station, devp, wdmpath, station_2_latDeg.get(station), executor
+
+    run_stations(_stationHourlyEVAP, tasks(), session, station_executor)
+
+
+def _stationHourlyATEM(i: int, station: str, temp: pd.DataFrame, wdmpath: str, aObsTime: int,
+                       session: WdmWriteSession = None):
+    dsn = 13 + i * 20
+    MetDataHourlyATM(aInTS=temp, aObsTime=aObsTime, wdmpath=wdmpath, location=station, dsn=dsn, session=session)
+    echo(f"✅ 站点 {station} 处理成功，数据行数: {len(temp)}, DSN: {dsn}")
+
+
+def metHourlyATEM(wdmpath: str, stations: List[str], aObsTime:int, store: SeriesStore = None,
+                  station_executor: Union[MetExecutor, str] = None, append: bool = False):
+    echo(f"处理小时温度数据，基于日最大最小温度分解，观测时间: {aObsTime}")
+    catalog = get_catalog(wdmpath)
     tstype_tmax = 'TMAX'
     tstype_tmin = 'TMIN'
-    all_dsn_attrs = [wdmts.describe_dsn(wdmpath, dsn) for dsn in dsns]
-    checkStatios(stations, all_dsn_attrs, tstype_tmax)
-    checkStatios(stations, all_dsn_attrs, tstype_tmin)
-    tmax_LOCN_DSN = get_stns_dsn(stations, all_dsn_attrs, tstype_tmax)
-    tmin_LOCN_DSN = get_stns_dsn(stations, all_dsn_attrs, tstype_tmin)
-    for i, station in enumerate(stations):
-        print(f"处理站点: {station}")
-        
-        tmax_dsn = tmax_LOCN_DSN.get(station)
-        tmin_dsn = tmin_LOCN_DSN.get(station)
-        
-        if not tmax_dsn or not tmin_dsn:
-            print(f"❌ 站点 {station} 缺少温度数据DSN！")
-            continue
-            
-        tmax = read_dsn(wdmpath, tmax_dsn, tstype_tmax)
-        tmin = read_dsn(wdmpath, tmin_dsn, tstype_tmin)
-        temp = pd.concat([tmax, tmin], axis=1)
-        dsn = 13 + i * 20
-        MetDataHourlyATM(aInTS=temp, aObsTime=aObsTime, wdmpath=wdmpath, location=station, dsn=dsn)
-        print(f"✅ 站点 {station} 处理成功，数据行数: {len(temp)}, DSN: {dsn}")
-
-
-def metHourlyWIND(wdmpath: str, stations: List[str], aDCurve:List[float]= None, tstype:str='DWND'):
-    print(f"处理小时风速数据，基于日风速数据分解")
-    dsns = wdm.listdsns(wdmpath)
-    wdmts = wdmutil.WDM()
-    all_dsn_attrs = [wdmts.describe_dsn(wdmpath, dsn) for dsn in dsns]
-    checkStatios(stations, all_dsn_attrs, tstype)
-    wind_LOCN_DSN = get_stns_dsn(stations, all_dsn_attrs, tstype)
-    for i, station in enumerate(stations):
-        print(f"处理站点: {station}")
-        
-        wind_dsn = wind_LOCN_DSN.get(station)
-        
-        if not wind_dsn:
-            print(f"❌ 站点 {station} 缺少风速数据DSN！")
-            continue
-            
-        wind = read_dsn(wdmpath, wind_dsn, tstype)
-        dsn = 14 + i * 20
-        MetDataHourlyWIND(aInTS=wind, wdmpath=wdmpath, location=station, dsn=dsn, aDCurve=aDCurve)
-        print(f"✅ 站点 {station} 处理成功，数据行数: {len(wind)}, DSN: {dsn}")
-
-
-def metHourlySOLR(wdmpath: str, stations: List[str], station_2_latDeg: Dict[str, float], tstype:str='DSOL'):
-    print(f"处理小时太阳辐射数据，基于日辐射数据分解")
-    dsns = wdm.listdsns(wdmpath)
-    wdmts = wdmutil.WDM()
-    all_dsn_attrs = [wdmts.describe_dsn(wdmpath, dsn) for dsn in dsns]
-    checkStatios(stations, all_dsn_attrs, tstype)
-    solar_LOCN_DSN = get_stns_dsn(stations, all_dsn_attrs, tstype)
-    for i, station in enumerate(stations):
-        print(f"处理站点: {station}")
-        
-        solar_dsn = solar_LOCN_DSN.get(station)
-        
-        if not solar_dsn:
-            print(f"❌ 站点 {station} 缺少太阳辐射数据DSN！")
-            continue
-            
-        aLatDeg = station_2_latDeg.get(station)
-        solar = read_dsn(wdmpath, solar_dsn, tstype)
-        dsn = 15 + i * 20
-        MetDataHourlySOLR(aInTS=solar, wdmpath=wdmpath, location=station, aLatDeg=aLatDeg, dsn=dsn)
-        print(f"✅ 站点 {station} 处理成功，数据行数: {len(solar)}, DSN: {dsn}")
-
-
-def metHourlyPEVT(wdmpath: str, stations: List[str], station_2_latDeg: Dict[str, float], tstype:str='DEVT'):
-    print(f"处理小时蒸散发数据，基于日蒸散发数据分解")
-    dsns = wdm.listdsns(wdmpath)
-    wdmts = wdmutil.WDM()
-    all_dsn_attrs = [wdmts.describe_dsn(wdmpath, dsn) for dsn in dsns]
-    checkStatios(stations, all_dsn_attrs, tstype)
-    devt_LOCN_DSN = get_stns_dsn(stations, all_dsn_attrs, tstype)
-    for i, station in enumerate(stations):
-        print(f"处理站点: {station}")
-        
-        devt_dsn = devt_LOCN_DSN.get(station)
-        
-        if not devt_dsn:
-            print(f"❌ 站点 {station} 缺少蒸散发数据DSN！")
-            continue
-            
-        devt = read_dsn(wdmpath, devt_dsn, tstype)
-        aLatDeg = station_2_latDeg.get(station)
-        dsn = 16 + i * 20
-        MetDataHourlyPEVT(devt, wdmpath, station, aLatDeg, dsn)
-        print(f"✅ 站点 {station} 处理成功，数据行数: {len(devt)}, DSN: {dsn}")
-
-
-def metHourlyDEWP(wdmpath: str, stations: List[str], tstype:str='DPTP'):
-    print(f"处理小时露点温度数据，基于日露点温度数据分解")
-    dsns = wdm.listdsns(wdmpath)
-    wdmts = wdmutil.WDM()
-    all_dsn_attrs = [wdmts.describe_dsn(wdmpath, dsn) for dsn in dsns]
-    checkStatios(stations, all_dsn_attrs, tstype)
-    dptp_LOCN_DSN = get_stns_dsn(stations, all_dsn_attrs, tstype)
-    for i, station in enumerate(stations):
-        print(f"处理站点: {station}")
-        
-        dptp_dsn = dptp_LOCN_DSN.get(station)
-        
-        if not dptp_dsn:
-            print(f"❌ 站点 {station} 缺少露点温度数据DSN！")
-            continue
-            
-        dptp = read_dsn(wdmpath, dptp_dsn, tstype)
-        dsn = 17 + i * 20
-        MetDataHourlyDEWP(dptp, wdmpath, station, dsn)
-        print(f"✅ 站点 {station} 处理成功，数据行数: {len(dptp)}, DSN: {dsn}")
-
-
-def metHourlyCLOU(wdmpath: str, stations: List[str], tstype:str='DCLO'):
-    print(f"处理小时云量数据，基于日云量数据分解")
-    dsns = wdm.listdsns(wdmpath)
-    wdmts = wdmutil.WDM()
-    all_dsn_attrs = [wdmts.describe_dsn(wdmpath, dsn) for dsn in dsns]
-    checkStatios(stations, all_dsn_attrs, tstype)
-    dclo_LOCN_DSN = get_stns_dsn(stations, all_dsn_attrs, tstype)
-    for i, station in enumerate(stations):
-        print(f"处理站点: {station}")
-        
-        dclo_dsn = dclo_LOCN_DSN.get(station)
-        
-        if not dclo_dsn:
-            print(f"❌ 站点 {station} 缺少云量数据DSN！")
-            continue
-            
-        dclo = read_dsn(wdmpath, dclo_dsn, tstype)
-        dsn = 18 + i * 20
-        MetDataHourlyCLOU(dclo, wdmpath, station, dsn)
-        print(f"✅ 站点 {station} 处理成功，数据行数: {len(dclo)}, DSN: {dsn}")
+    catalog.check_stations(stations, tstype_tmax)
+    catalog.check_stations(stations, tstype_tmin)
+    tmax_LOCN_DSN = catalog.stations_dsn(stations, tstype_tmax)
+    tmin_LOCN_DSN = catalog.stations_dsn(stations, tstype_tmin)
+
+    session = WdmWriteSession(wdmpath, store=store, append=append)
+
+    def tasks():
+        for i, station in enumerate(stations):
+            echo(f"处理站点: {station}")
+
+            tmax_dsn = tmax_LOCN_DSN.get(station)
+            tmin_dsn = tmin_LOCN_DSN.get(station)
+
+            if not tmax_dsn or not tmin_dsn:
+                echo(f"❌ 站点 {station} 缺少温度数据DSN！")
+                continue
+
+            # 最后两天的分解用到之后一至两天的最低温度(缺少时向前填充)，追加时重新计算，前一天的最高温度作为上下文
+            since = session.append_start(13 + i * 20, rewrite_days=2)
+            tmax = _series_since(read_series(wdmpath, station, tmax_dsn, tstype_tmax, store=store), since, 1)
+            tmin = _series_since(read_series(wdmpath, station, tmin_dsn, tstype_tmin, store=store), since, 1)
+            yield i, station, pd.concat([tmax, tmin], axis=1), wdmpath, aObsTime
+
+    run_stations(_stationHourlyATEM, tasks(), session, station_executor)
+
+
+def _stationHourlyWIND(i: int, station: str, wind: pd.DataFrame, wdmpath: str, aDCurve: List[float],
+                       session: WdmWriteSession = None):
+    dsn = 14 + i * 20
+    MetDataHourlyWIND(aInTS=wind, wdmpath=wdmpath, location=station, dsn=dsn, aDCurve=aDCurve, session=session)
+    echo(f"✅ 站点 {station} 处理成功，数据行数: {len(wind)}, DSN: {dsn}")
+
+
+def metHourlyWIND(wdmpath: str, stations: List[str], aDCurve:List[float]= None, tstype:str='DWND',
+                  store: SeriesStore = None, station_executor: Union[MetExecutor, str] = None, append: bool = False):
+    echo(f"处理小时风速数据，基于日风速数据分解")
+    catalog = get_catalog(wdmpath)
+    catalog.check_stations(stations, tstype)
+    wind_LOCN_DSN = catalog.stations_dsn(stations, tstype)
+
+    session = WdmWriteSession(wdmpath, store=store, append=append)
+
+    def tasks():
+        for i, station in enumerate(stations):
+            echo(f"处理站点: {station}")
+
+            wind_dsn = wind_LOCN_DSN.get(station)
+
+            if not wind_dsn:
+                echo(f"❌ 站点 {station} 缺少风速数据DSN！")
+                continue
+
+            since = session.append_start(14 + i * 20)
+            wind = _series_since(read_series(wdmpath, station, wind_dsn, tstype, store=store), since)
+            yield i, station, wind, wdmpath, aDCurve
+
+    run_stations(_stationHourlyWIND, tasks(), session, station_executor)
+
+
+def _stationHourlySOLR(i: int, station: str, solar: pd.DataFrame, wdmpath: str, aLatDeg: float,
+                       executor: Union[MetExecutor, str], session: WdmWriteSession = None):
+    dsn = 15 + i * 20
+    MetDataHourlySOLR(aInTS=solar, wdmpath=wdmpath, location=station, aLatDeg=aLatDeg, dsn=dsn,
+                      executor=executor, session=session)
+    echo(f"✅ 站点 {station} 处理成功，数据行数: {len(solar)}, DSN: {dsn}")
+
+
+def metHourlySOLR(wdmpath: str, stations: List[str], station_2_latDeg: Dict[str, float], tstype:str='DSOL',
+                  executor: Union[MetExecutor, str] = None, store: SeriesStore = None,
+                  station_executor: Union[MetExecutor, str] = None, append: bool = False):
+    echo(f"处理小时太阳辐射数据，基于日辐射数据分解")
+    catalog = get_catalog(wdmpath)
+    catalog.check_stations(stations, tstype)
+    solar_LOCN_DSN = catalog.stations_dsn(stations, tstype)
+
+    session = WdmWriteSession(wdmpath, store=store, append=append)
+
+    def tasks():
+        for i, station in enumerate(stations):
+            echo(f"处理站点: {station}")
+
+            solar_dsn = solar_LOCN_DSN.get(station)
+
+            if not solar_dsn:
+                echo(f"❌ 站点 {station} 缺少太阳辐射数据DSN！")
+                continue
+
+            since = session.append_start(15 + i * 20)
+            solar = _series_since(read_series(wdmpath, station, solar_dsn, tstype, store=store), since)
+            yield i, station, solar, wdmpath, station_2_latDeg.get(station), executor
+
+    run_stations(_stationHourlySOLR, tasks(), session, station_executor)
+
+
+def _stationHourlyPEVT(i: int, station: str, devt: pd.DataFrame, wdmpath: str, aLatDeg: float,
+                       executor: Union[MetExecutor, str], session: WdmWriteSession = None):
+    dsn = 16 + i * 20
+    MetDataHourlyPEVT(devt, wdmpath, station, aLatDeg, dsn, executor=executor, session=session)
+    echo(f"✅ 站点 {station} 处理成功，数据行数: {len(devt)}, DSN: {dsn}")
+
+
+def metHourlyPEVT(wdmpath: str, stations: List[str], station_2_latDeg: Dict[str, float], tstype:str='DEVT',
+                  executor: Union[MetExecutor, str] = None, store: SeriesStore = None,
+                  station_executor: Union[MetExecutor, str] = None, append: bool = False):
+    echo(f"处理小时蒸散发数据，基于日蒸散发数据分解")
+    catalog = get_catalog(wdmpath)
+    catalog.check_stations(stations, tstype)
+    devt_LOCN_DSN = catalog.stations_dsn(stations, tstype)
+
+    session = WdmWriteSession(wdmpath, store=store, append=append)
+
+    def tasks():
+        for i, station in enumerate(stations):
+            echo(f"处理站点: {station}")
+
+            devt_dsn = devt_LOCN_DSN.get(station)
+
+            if not devt_dsn:
+                echo(f"❌ 站点 {station} 缺少蒸散发数据DSN！")
+                continue
+
+            since = session.append_start(16 + i * 20)
+            devt = _series_since(read_series(wdmpath, station, devt_dsn, tstype, store=store), since)
+            yield i, station, devt, wdmpath, station_2_latDeg.get(station), executor
+
+    run_stations(_stationHourlyPEVT, tasks(), session, station_executor)
+
+
+def _stationHourlyDEWP(i: int, station: str, dptp: pd.DataFrame, wdmpath: str, session: WdmWriteSession = None):
+    dsn = 17 + i * 20
+    MetDataHourlyDEWP(dptp, wdmpath, station, dsn, session=session)
+    echo(f"✅ 站点 {station} 处理成功，数据行数: {len(dptp)}, DSN: {dsn}")
+
+
+def metHourlyDEWP(wdmpath: str, stations: List[str], tstype:str='DPTP', store: SeriesStore = None,
+                  station_executor: Union[MetExecutor, str] = None, append: bool = False):
+    echo(f"处理小时露点温度数据，基于日露点温度数据分解")
+    catalog = get_catalog(wdmpath)
+    catalog.check_stations(stations, tstype)
+    dptp_LOCN_DSN = catalog.stations_dsn(stations, tstype)
+
+    session = WdmWriteSession(wdmpath, store=store, append=append)
+
+    def tasks():
+        for i, station in enumerate(stations):
+            echo(f"处理站点: {station}")
+
+            dptp_dsn = dptp_LOCN_DSN.get(station)
+
+            if not dptp_dsn:
+                echo(f"❌ 站点 {station} 缺少露点温度数据DSN！")
+                continue
+
+            since = session.append_start(17 + i * 20)
+            dptp = _series_since(read_series(wdmpath, station, dptp_dsn, tstype, store=store), since)
+            yield i, station, dptp, wdmpath
+
+    run_stations(_stationHourlyDEWP, tasks(), session, station_executor)
+
+
+def _stationHourlyCLOU(i: int, station: str, dclo: pd.DataFrame, wdmpath: str, session: WdmWriteSession = None):
+    dsn = 18 + i * 20
+    MetDataHourlyCLOU(dclo, wdmpath, station, dsn, session=session)
+    echo(f"✅ 站点 {station} 处理成功，数据行数: {len(dclo)}, DSN: {dsn}")
+
+
+def metHourlyCLOU(wdmpath: str, stations: List[str], tstype:str='DCLO', store: SeriesStore = None,
+                  station_executor: Union[MetExecutor, str] = None, append: bool = False):
+    echo(f"处理小时云量数据，基于日云量数据分解")
+    catalog = get_catalog(wdmpath)
+    catalog.check_stations(stations, tstype)
+    dclo_LOCN_DSN = catalog.stations_dsn(stations, tstype)
+
+    session = WdmWriteSession(wdmpath, store=store, append=append)
+
+    def tasks():
+        for i, station in enumerate(stations):
+            echo(f"处理站点: {station}")
+
+            dclo_dsn = dclo_LOCN_DSN.get(station)
+
+            if not dclo_dsn:
+                echo(f"❌ 站点 {station} 缺少云量数据DSN！")
+                continue
+
+            since = session.append_start(18 + i * 20)
+            dclo = _series_since(read_series(wdmpath, station, dclo_dsn, tstype, store=store), since)
+            yield i, station, dclo, wdmpath
+
+    run_stations(_stationHourlyCLOU, tasks(), session, station_executor)
+
+
+# ============================处理流程==================================
+def build_hspf_pipeline(wdmpath: str, stations: List[str], station_2_latDeg: Dict[str, float], tempfile: str,
+                        windfile: str, ssdfile: str, rhumfile: str, radifile: str, precipfile: str,
+                        invalid_value: int = 32766, precipitation_method: str = "equal", aObsTime: int = 24,
+                        store: SeriesStore = None, station_executor: Union[MetExecutor, str] = None,
+                        append: bool = False, fill_policy: Union[str, List[str]] = "mean",
+                        station_2_coord: Dict[str, Tuple[float, float]] = None,
+                        max_gap_length: int = None) -> MetPipeline:
+    """
+    构建HSPF气象数据处理流程，每个步骤输出一种时序类型，依赖关系由步骤的输入决定
+    :param wdmpath: WDM文件路径
+    :param stations: 站点列表
+    :param station_2_latDeg: 站点到纬度(十进制角度)的字典
+    :param tempfile: 气温数据文件，f8平均、f9最高、f10最低气温
+    :param windfile: 风速数据文件
+    :param ssdfile: 日照时数数据文件
+    :param rhumfile: 相对湿度数据文件
+    :param radifile: 辐射数据文件
+    :param precipfile: 降水数据文件
+    :param invalid_value: 无效值
+    :param precipitation_method: 降雨分布方法
+    :param aObsTime: 气温观测时间
+    :param store: 序列缓存，为None时新建一个，供所有步骤共享
+    :param station_executor: 每个步骤内部的站点级执行器，例如"process"，为None时逐个站点计算
+    :param append: 追加模式，已有的DSN只重新计算末尾几天并追加新数据，不再重建整个序列
+    :param fill_policy: 输入数据的缺失值填充策略，"mean"为站点自身前后值填充；"idw"、"regression"、"climatology"
+                        或它们的列表先用多个站点填充，无法填充的缺失再由站点自身前后值填充，见fill_station_frames
+    :param station_2_coord: 站点到(纬度, 经度)的字典，idw方法需要，提供时regression方法同时使用反距离权重
+    :param max_gap_length: 最大填充的连续缺失天数，更长的连续缺失保持为空，为None时不限制
+    :return: 处理流程
+    """
+    store = store if store is not None else SeriesStore()
+    common = dict(wdmpath=wdmpath, stations=stations, store=store, station_executor=station_executor,
+                  append=append)
+    # 读取原始输入的步骤需要填充缺失值
+    filled = dict(common, fill_policy=fill_policy, station_2_coord=station_2_coord, max_gap_length=max_gap_length)
+    return MetPipeline([
+        # 逐日数据
+        Stage("TMAX", metTmax, kwargs=dict(filled, inputfile=tempfile, data_col='f9', invalid_value=invalid_value)),
+        Stage("TMIN", metTmin, kwargs=dict(filled, inputfile=tempfile, data_col='f10', invalid_value=invalid_value)),
+        Stage("DWND", metDailyWind, kwargs=dict(filled, inputfile=windfile, data_col='f8',
+                                                invalid_value=invalid_value)),
+        Stage("DCLO", metDailyCloud, kwargs=dict(filled, inputfile=ssdfile, data_col='f8',
+                                                 invalid_value=invalid_value)),
+        Stage("DPTP", metDailyDewpointTemperature,
+              kwargs=dict(filled, atem_file=tempfile, atem_col='f8', rhum_file=rhumfile, rhum_col='f8',
+                          invalid_value=invalid_value, scale=0.1)),
+        Stage("DSOL", metDailySolar, kwargs=dict(filled, inputfile=radifile, data_col='f8', invalid_value=999998,
+                                                 scale=0.01)),
+        Stage("DEVT", metDailyEvapotranspiration, inputs=["TMAX", "TMIN"],
+              kwargs=dict(common, station_2_latDeg=station_2_latDeg)),
+        Stage("DEVP", metDailyEvaporation, inputs=["TMAX", "TMIN", "DPTP", "DSOL", "DWND"], kwargs=common),
+        # 逐小时数据
+        Stage("PREC", metHourlyPREC, kwargs=dict(filled, prec_file=precipfile, data_col='f10', scale=0.1,
+                                                 method=precipitation_method)),
+        Stage("EVAP", metHourlyEVAP, inputs=["DEVP"], kwargs=dict(common, station_2_latDeg=station_2_latDeg)),
+        Stage("ATEM", metHourlyATEM, inputs=["TMAX", "TMIN"], kwargs=dict(common, aObsTime=aObsTime)),
+        Stage("WIND", metHourlyWIND, inputs=["DWND"], kwargs=common),
+        Stage("SOLR", metHourlySOLR, inputs=["DSOL"], kwargs=dict(common, station_2_latDeg=station_2_latDeg)),
+        Stage("PEVT", metHourlyPEVT, inputs=["DEVT"], kwargs=dict(common, station_2_latDeg=station_2_latDeg)),
+        Stage("DEWP", metHourlyDEWP, inputs=["DPTP"], kwargs=common),
+        Stage("CLOU", metHourlyCLOU, inputs=["DCLO"], kwargs=common),
+    ])
 
 
 if __name__ == '__main__':
@@ -486,84 +838,67 @@ if __name__ == '__main__':
     # "equal" = 均匀分布（每小时相等）
     # "triangular" = 三角分布（按小时变化）
     precipitation_method = "equal"  # 用户可根据需要修改此参数
-
-    print("=" * 60)
-    print("开始HSPF气象数据处理")
-    print(f"目标站点: {target_stations}")
-    print(f"输出文件: {wdmpath}")
-    print(f"降雨分布方法: {precipitation_method}")
-    print("=" * 60)
-    
-    # ============================逐日数据==================================
-    print("\n📅 开始处理日数据...")
+    # 日常更新时设为True：已有的DSN只重新计算末尾几天并追加新数据，不再重建整个序列
+    append = False
+    # 调参时设为缓存目录，输入和参数没有变化的站点计算直接读取上次的结果，例如 "data/.metmemo"
+    memo_dir = None
+    # 分析性能时设为JSON lines文件路径，记录每个步骤、站点、输入读取和WDM写入的用时和内存，例如 "data/trace.jsonl"
+    # profile_stage为需要用cProfile分析的步骤名称，例如 "ATEM"，分析结果保存在记录文件所在目录
+    trace_file = None
+    profile_stage = None
+    # 为True时不输出处理过程，为None时由环境变量HSPF_MET_QUIET决定
+    quiet = None
+    # 站点多、序列长时设为"float32"，逐小时分解结果直到写入WDM都保持单精度，内存约减半，写入WDM的取值不变
+    hourly_dtype = None
+
+    if quiet is not None:
+        set_quiet(quiet)
+    echo("=" * 60)
+    echo("开始HSPF气象数据处理")
+    echo(f"目标站点: {target_stations}")
+    echo(f"输出文件: {wdmpath}")
+    echo(f"降雨分布方法: {precipitation_method}")
+    echo("=" * 60)
+
+    if memo_dir:
+        set_default_memo(memo_dir)
+    trace_sink = MemorySink()
+    if trace_file:
+        set_default_instrument(Instrument([JsonLinesSink(trace_file), trace_sink], profile=profile_stage,
+                                          profile_dir=os.path.dirname(os.path.abspath(trace_file))))
+    set_default_hourly_dtype(hourly_dtype)
+
+    # 逐日结果保留在内存中，派生的逐日数据和逐小时数据不再从WDM读回
+    store = SeriesStore()
     
-    # DSN:19.最大温度:TMAX
-    metTmax(inputfile=tempfile, data_col='f9', stations=target_stations, invalid_value=invalid_value, wdmpath=wdmpath)
-
-    # DSN:20.最小温度:TMIN
-    metTmin(inputfile=tempfile, data_col='f10', stations=target_stations, invalid_value=invalid_value, wdmpath=wdmpath)
-
-    # DSN:21.风速:DWND
-    metDailyWind(inputfile=windfile, data_col='f8', stations=target_stations, invalid_value=invalid_value, wdmpath=wdmpath)
-
-    # DSN:22.云量:DCLO
-    metDailyCloud(inputfile=ssdfile, data_col='f8', stations=target_stations, invalid_value=invalid_value,wdmpath=wdmpath)
-    
-    # DSN:23.露点温度:DPTP
-    metDailyDewpointTemperature(atem_file=tempfile, atem_col='f8', rhum_file=rhumfile, rhum_col='f8', wdmpath=wdmpath,stations=target_stations, invalid_value=invalid_value, scale=0.1)
-
-    # DSN:24.DSOL太阳辐射:DSOL
-    metDailySolar(inputfile=radifile, wdmpath=wdmpath, data_col='f8', stations=target_stations, invalid_value=999998, scale=0.01)
-
-    #DSN:25.DEVT:DEVT
-    metDailyEvapotranspiration(wdmpath=wdmpath, station_2_latDeg=stns_2_letdeg, stations=target_stations)
-
-    #DSN:26.DEVP:DEVP
-    metDailyEvaporation(wdmpath=wdmpath, stations=target_stations)
-    
-    print("✅ 日数据处理完成")
-    
-    # ============================逐小时数据==================================
-    print("\n⏰ 开始处理小时数据...")
-    
-    #print("PREC")
-    metHourlyPREC(prec_file=precipfile, wdmpath=wdmpath, stations=target_stations, data_col='f10', scale=0.1, method=precipitation_method)
-
-    #print("EVAP")
-    metHourlyEVAP(wdmpath=wdmpath, stations=target_stations, station_2_latDeg=stns_2_letdeg)
-
-    #print("ATEM")
-    metHourlyATEM(wdmpath=wdmpath, stations=target_stations, aObsTime=24)
-
-    #print("WIND")
-    metHourlyWIND(wdmpath=wdmpath, stations=target_stations)
-
-    #print("SOLR")
-    metHourlySOLR(wdmpath=wdmpath, stations=target_stations, station_2_latDeg=stns_2_letdeg)
-
-    #print("PEVT")
-    metHourlyPEVT(wdmpath=wdmpath, stations=target_stations, station_2_latDeg=stns_2_letdeg)
-
-    #print("DEWP")
-    metHourlyDEWP(wdmpath=wdmpath, stations=target_stations)
-
-    #print("CLOU")
-    metHourlyCLOU(wdmpath=wdmpath, stations=target_stations)
-
-    print("✅ 小时数据处理完成")
+    # 没有依赖关系的步骤同时运行，只需要部分数据时把步骤名称传给run，例如 pipeline.run(["ATEM"])
+    # 站点较多时可以设置station_executor=create_executor("process", workers)，站点在进程池中计算，结果仍由主进程写入
+    pipeline = build_hspf_pipeline(wdmpath=wdmpath, stations=target_stations, station_2_latDeg=stns_2_letdeg,
+                                   tempfile=tempfile, windfile=windfile, ssdfile=ssdfile, rhumfile=rhumfile,
+                                   radifile=radifile, precipfile=precipfile, invalid_value=invalid_value,
+                                   precipitation_method=precipitation_method, store=store, append=append)
+    pipeline.run()
+    echo("✅ 日数据和小时数据处理完成")
+    echo(f"序列缓存: {store}")
+    if trace_file:
+        echo(f"\n⏱️ 各步骤用时(秒)，详细记录: {trace_file}")
+        for stage_name, kinds in trace_sink.summary().items():
+            if stage_name is not None:
+                echo(f"{stage_name:<6}" + "  ".join(f"{kind} {total['seconds']:.2f}" for kind, total in kinds.items()))
     
-    # 查看生成的DSN
-    print("\n📊 WDM文件统计信息:")
-    dsns = wdm.listdsns(wdmpath)
-    print(f"生成的DSN数量: {len(dsns)}")
-    print(f"DSN列表: {sorted(dsns)}")
-
-    # 显示每个DSN的信息
-    print("\n📋 DSN详细信息:")
-    for dsn in dsns:
-        print(f"\nDSN {dsn} 信息:")
-        print(wdm.describedsn(wdmpath, dsn))
-        
-    print("\n" + "=" * 60)
-    print("🎉 HSPF气象数据处理完成！")
-    print("=" * 60)
+    # 查看生成的DSN，quiet时不读取WDM文件
+    if not is_quiet():
+        echo("\n📊 WDM文件统计信息:")
+        dsns = wdm.listdsns(wdmpath)
+        echo(f"生成的DSN数量: {len(dsns)}")
+        echo(f"DSN列表: {sorted(dsns)}")
+
+        # 显示每个DSN的信息
+        echo("\n📋 DSN详细信息:")
+        for dsn in dsns:
+            echo(f"\nDSN {dsn} 信息:")
+            echo(wdm.describedsn(wdmpath, dsn))
+
+    echo("\n" + "=" * 60)
+    echo("🎉 HSPF气象数据处理完成！")
+    echo("=" * 60)
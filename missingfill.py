@@ -1,12 +1,12 @@
 import warnings
 import os
-from typing import List
+from typing import List, Dict, Tuple, Union
 
 import numpy as np
 import pandas as pd
 from wdmtoolbox import wdmtoolbox as wdm
-from pandarallel import pandarallel
-pandarallel.initialize(verbose=0)
+
+from MetMemo import memoize
 
 
 def miss_fill_mean(
@@ -18,45 +18,62 @@ def miss_fill_mean(
         data_column: str = "f8",
         station_id: int = 59843,
         invalid_value: int = 32766,
-) -> pd.DataFrame:
+        return_unfilled: bool = False,
+):
     """
-    这里是简单填充，如果缺测值的前后有值(非连续缺测)，如果是连续缺测则由有值的日期往前填充。
-    :param file_path: 文件路径
+    这里是简单填充，如果缺测值的前后有值(非连续缺测)，使用前一天和后一天的均值(取整)填充。
+    (站点, 日期)索引只建立一次，所有缺测一次性查找前后两天并填充。
+    前后一天不存在、同样缺测或日期重复时无法填充，保留原值并给出警告。
+    :param obs_data: 观测数据
     :param data_column: 需要填充的数据列
-    :param station_id:  站点编号
+    :param station_id:  站点编号，为None时处理所有站点
     :param invalid_value: 无效值
-    :param fill_value: 填写值
-    :return:
+    :param return_unfilled: 为True时同时返回无法填充的缺测记录
+    :return: 填充后的数据；return_unfilled为True时返回(填充后的数据, 无法填充的缺测记录)
     """
-    obs_data.loc[:, ["time"]] = pd.to_datetime(
-        obs_data[year_column].astype(str)
-        + obs_data[month_column].astype(str).str.zfill(2)
-        + obs_data[day_column].astype(str).str.zfill(2)
+    obs_data["time"] = pd.to_datetime(
+        pd.DataFrame({"year": obs_data[year_column], "month": obs_data[month_column], "day": obs_data[day_column]})
     )
-    miss_datas = obs_data[
-        (obs_data[station_column] == station_id)
-        & (obs_data[data_column] == invalid_value)
-        ]
-    if len(miss_datas) == 0:
+    station_ids = obs_data[station_column].to_numpy()
+    times = obs_data["time"].to_numpy()
+    values = obs_data[data_column].to_numpy()
+    is_miss = values == invalid_value
+    if station_id is not None:
+        is_miss &= station_ids == station_id
+    miss_rows = np.flatnonzero(is_miss)
+    if len(miss_rows) == 0:
         warnings.warn("没有缺测值")
+        if return_unfilled:
+            return obs_data, obs_data.iloc[[]][[station_column, "time"]]
         return obs_data
-    for miss_data in miss_datas.iterrows():
-        miss_time = miss_data[1]["time"]
-        day = pd.Timedelta(1, unit="D")
-        last_time = miss_time - day
-        next_time = miss_time + day
-        last_f8 = obs_data.loc[
-            (obs_data[station_column] == station_id) & (obs_data["time"] == last_time),
-            data_column,
-        ].values
-        next_f8 = obs_data.loc[
-            (obs_data[station_column] == station_id) & (obs_data["time"] == next_time),
-            data_column,
-        ].values
-        obs_data.loc[
-            (obs_data[station_column] == station_id) & (obs_data["time"] == miss_time),
-            data_column,
-        ] = int((last_f8.item() + next_f8.item()) / 2)
+
+    # (站点, 日期)索引，重复的日期不参与查找
+    keys = pd.MultiIndex.from_arrays([station_ids, times])
+    unique = ~keys.duplicated(keep=False)
+    unique_rows = np.flatnonzero(unique)
+    lookup = keys[unique]
+
+    day = np.timedelta64(1, "D")
+    miss_stations = station_ids[miss_rows]
+    last_pos = lookup.get_indexer(pd.MultiIndex.from_arrays([miss_stations, times[miss_rows] - day]))
+    next_pos = lookup.get_indexer(pd.MultiIndex.from_arrays([miss_stations, times[miss_rows] + day]))
+    ext_values = np.append(values[unique_rows].astype("float64"), np.nan)
+    last_value = ext_values[last_pos]
+    next_value = ext_values[next_pos]
+
+    fillable = (unique[miss_rows] & (last_pos >= 0) & (next_pos >= 0)
+                & (last_value != invalid_value) & (next_value != invalid_value)
+                & ~np.isnan(last_value) & ~np.isnan(next_value))
+    filled = np.trunc((last_value[fillable] + next_value[fillable]) / 2)
+    column = obs_data.columns.get_loc(data_column)
+    obs_data.iloc[miss_rows[fillable], column] = filled.astype(obs_data[data_column].dtype)
+
+    unfilled = obs_data.iloc[miss_rows[~fillable]][[station_column, "time"]]
+    if len(unfilled) > 0:
+        warnings.warn(f"{len(unfilled)}个缺测值前后没有有效值，无法填充: "
+                      f"{unfilled['time'].dt.strftime('%Y-%m-%d').head(10).tolist()}")
+    if return_unfilled:
+        return obs_data, unfilled
     return obs_data
 
 
@@ -64,13 +81,15 @@ import pandas as pd
 import numpy as np
 
 
+@memoize
 def fill_missing_values_bymean(df,
                                station_column: str = "f1",
                                data_col='f8',
                                year_col='f5',
                                month_col='f6',
                                day_col='f7',
-                               stations: List[str] = None):
+                               stations: List[str] = None,
+                               max_gap_length: int = None):
     """
     根据指定的年、月、日列构建日期列，并按日期升序排序后重构索引。
     针对指定站点的数据，按以下规则填充缺失值：
@@ -92,71 +111,45 @@ def fill_missing_values_bymean(df,
         天列名称。
     stations : list
         需要处理的站点值列表。如果为 None，处理所有站点。
+    max_gap_length : int
+        最大填充的连续缺失长度，更长的连续缺失保持为空。如果为 None，填充所有缺失。
+
+    返回：
+    DataFrame
+        填充后的数据，增加time列；输入的数据不会被修改。
     """
-    if stations is not None and not isinstance(stations, list):
-        stations = [stations]
-    # 创建日期列
-    stations = [int(station) for station in stations]
+    if stations is not None:
+        if not isinstance(stations, list):
+            stations = [stations]
+        stations = [int(station) for station in stations]
+    # 创建日期列，直接由年月日数值组合，避免逐行拼接字符串
+    # 使用assign得到新的数据表，不修改调用方的输入，缓存命中和未命中时行为一致
     if not isinstance(df.index, pd.DatetimeIndex):
-        df["time"] = pd.to_datetime(
-            df[year_col].astype(str)
-            + df[month_col].astype(str).str.zfill(2)
-            + df[day_col].astype(str).str.zfill(2)
-        )
+        df = df.assign(time=pd.to_datetime(
+            pd.DataFrame({"year": df[year_col], "month": df[month_col], "day": df[day_col]})
+        ))
 
     # 筛选需要处理的站点
     if stations is not None:
         process_df = df[df[station_column].isin(stations)]
     else:
         process_df = df
-    # 按站点分组并处理
-    def process_group(group):
-        group = group.sort_values(by='time').reset_index(drop=True)
-
-        # 缺失值处理逻辑
-        is_nan = group[data_col].isna().tolist()
-        result = []
-        count = 0
-
-        for i in range(len(group)):
-            if is_nan[i]:
-                count += 1
-            else:
-                if count > 1:  # 连续缺失
-                    result.extend(['backward_fill'] * count)
-                elif count == 1:  # 非连续缺失
-                    result.append('mean_fill')
-                result.append('valid')  # 有效数据
-                count = 0
-
-        # 处理最后一段缺失
-        if count > 1:
-            result.extend(['backward_fill'] * count)
-        elif count == 1:
-            result.append('mean_fill')
-
-        # 应用填充逻辑
-        method = pd.Series(result, index=group.index)
-
-        # 连续缺失用后向填充
-        group.loc[method == 'backward_fill', data_col] = group[data_col].bfill()
-
-        # 非连续缺失用前后值均值填充
-        for idx in group[method == 'mean_fill'].index:
-            prev_val = group.loc[idx - 1, data_col] if idx - 1 in group.index else np.nan
-            next_val = group.loc[idx + 1, data_col] if idx + 1 in group.index else np.nan
-
-            if pd.notna(prev_val) and pd.notna(next_val):
-                group.loc[idx, data_col] = (prev_val + next_val) / 2  # 取前后均值
-            elif pd.notna(prev_val):
-                group.loc[idx, data_col] = prev_val  # 只有前值
-            elif pd.notna(next_val):
-                group.loc[idx, data_col] = next_val  # 只有后值
-
-        return group
-
-    # 按站点分组处理
-    processed_df = process_df.groupby(station_column, group_keys=False).parallel_apply(process_group)
+    process_df = process_df[process_df[station_column].notna()]
+
+    # 按站点、时间排序，每个站点内的索引从0开始重构
+    order = np.lexsort((process_df["time"].to_numpy(), process_df[station_column].to_numpy()))
+    processed_df = process_df.take(order)
+    station_ids = processed_df[station_column].to_numpy()
+    group_start = np.ones(len(processed_df), dtype=bool)
+    group_start[1:] = station_ids[1:] != station_ids[:-1]
+    group_ids = np.cumsum(group_start) - 1
+    positions = np.arange(len(processed_df))
+    processed_df.index = positions - np.flatnonzero(group_start)[group_ids]
+
+    values = processed_df[data_col].to_numpy(dtype="float64")
+    if np.isnan(values).any():
+        processed_df[data_col] = _fill_gaps_bymean(values, group_ids, max_gap_length)
+
     # 合并处理后的数据和未处理的数据
     if stations is not None:
         unprocessed_df = df[~df[station_column].isin(stations)]
@@ -167,6 +160,308 @@ def fill_missing_values_bymean(df,
     # 返回结果
     return df
 
+
+def _gap_lengths(is_nan: np.ndarray, new_group: np.ndarray):
+    """
+    计算每个缺失值所在缺失游程(run-length)的长度，游程不跨越站点
+    :param is_nan: 是否缺失
+    :param new_group: 是否为站点的第一行
+    :return: 缺失值所在游程的长度，非缺失值为0
+    """
+    prev_nan = np.zeros(len(is_nan), dtype=bool)
+    prev_nan[1:] = is_nan[:-1]
+    run_start = is_nan & (new_group | ~prev_nan)
+    run_ids = np.cumsum(run_start) - 1
+    run_lengths = np.bincount(run_ids[is_nan])
+    gap_length = np.zeros(len(is_nan), dtype=np.int64)
+    gap_length[is_nan] = run_lengths[run_ids[is_nan]]
+    return gap_length
+
+
+def _fill_gaps_bymean(values: np.ndarray, group_ids: np.ndarray, max_gap_length: int = None):
+    """
+    按游程(run-length)一次性分类并填充所有站点的缺失值，数据需已按站点、时间排序。
+    1. 连续缺失(游程长度大于1)：使用同一站点后一个有效值填充，站点末尾的连续缺失保持为空。
+    2. 非连续缺失(游程长度等于1)：使用前后值的均值填充，只有一侧有值时使用该值。
+    :param values: 排序后的数据
+    :param group_ids: 每行所属站点的编号，相同站点连续排列
+    :param max_gap_length: 最大填充的游程长度，为None时不限制
+    :return: 填充后的数据
+    """
+    n = len(values)
+    is_nan = np.isnan(values)
+    new_group = np.ones(n, dtype=bool)
+    new_group[1:] = group_ids[1:] != group_ids[:-1]
+    gap_length = _gap_lengths(is_nan, new_group)
+    if max_gap_length is not None:
+        gap_length[gap_length > max_gap_length] = 0
+
+    # 末尾追加哨兵，越界或跨站点时取到空值
+    ext_values = np.append(values, np.nan)
+    ext_groups = np.append(group_ids, -1)
+    positions = np.arange(n)
+
+    # 连续缺失用后向填充
+    next_valid = np.where(is_nan, n, positions)
+    next_valid = np.minimum.accumulate(next_valid[::-1])[::-1]
+    backward = np.where(ext_groups[next_valid] == group_ids, ext_values[next_valid], np.nan)
+
+    # 非连续缺失用前后值均值填充
+    prev_pos = np.where(new_group, n, positions - 1)
+    next_pos = np.where(ext_groups[positions + 1] == group_ids, positions + 1, n)
+    prev_val = ext_values[prev_pos]
+    next_val = ext_values[next_pos]
+    mean = np.where(np.isnan(prev_val), next_val, np.where(np.isnan(next_val), prev_val, (prev_val + next_val) / 2))
+
+    filled = values.copy()
+    filled[gap_length > 1] = backward[gap_length > 1]
+    filled[gap_length == 1] = mean[gap_length == 1]
+    return filled
+
+
+FILL_POLICIES = ("mean", "idw", "regression", "climatology")
+EARTH_RADIUS_KM = 6371.0
+
+
+def _station_distance(lat: np.ndarray, lon: np.ndarray):
+    """
+    站点间的大圆距离(km)
+    :param lat: 纬度，单位为十进制角度
+    :param lon: 经度，单位为十进制角度
+    :return: 站点数×站点数的距离矩阵
+    """
+    lat = np.radians(lat)
+    lon = np.radians(lon)
+    dlat = lat[:, None] - lat[None, :]
+    dlon = lon[:, None] - lon[None, :]
+    h = np.sin(dlat / 2) ** 2 + np.cos(lat[:, None]) * np.cos(lat[None, :]) * np.sin(dlon / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(h, 0, 1)))
+
+
+def _distance_weights(station_keys, station_2_coord: Dict[str, Tuple[float, float]], power: float,
+                      max_neighbors: int = None):
+    """反距离权重矩阵，对角线(站点自身)为0，只保留最近的max_neighbors个站点"""
+    missing = [str(station) for station in station_keys if str(station) not in station_2_coord]
+    if missing:
+        raise ValueError(f"站点{missing}没有坐标")
+    coords = np.array([station_2_coord[str(station)] for station in station_keys], dtype="float64")
+    distance = np.maximum(_station_distance(coords[:, 0], coords[:, 1]), 1e-3)
+    weights = distance ** -power
+    np.fill_diagonal(weights, 0.0)
+    if max_neighbors is not None and max_neighbors < len(station_keys) - 1:
+        drop = np.argpartition(weights, -max_neighbors, axis=1)[:, :-max_neighbors]
+        np.put_along_axis(weights, drop, 0.0, axis=1)
+    return weights
+
+
+def _estimate_idw(matrix: np.ndarray, valid: np.ndarray, weights: np.ndarray):
+    """邻近站点同一天数值的反距离加权平均"""
+    values = np.where(valid, matrix, 0.0)
+    weight_sum = weights @ valid.astype("float64")
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(weight_sum > 0, (weights @ values) / weight_sum, np.nan)
+
+
+def _estimate_regression(matrix: np.ndarray, valid: np.ndarray, weights: np.ndarray = None, min_overlap: int = 30):
+    """
+    邻近站点回归估计：对每对站点(i, j)用共同有效日期拟合 x_i = a_ij + b_ij * x_j，
+    再以决定系数r²(乘以距离权重)加权平均各邻近站点的估计值。所有统计量都由矩阵乘法得到。
+    """
+    valid = valid.astype("float64")
+    values = np.where(valid > 0, matrix, 0.0)
+    squares = values ** 2
+    n = valid @ valid.T
+    sum_x = valid @ values.T  # 站点j在共同日期上的和
+    sum_y = values @ valid.T  # 站点i在共同日期上的和
+    sum_xx = valid @ squares.T
+    sum_yy = squares @ valid.T
+    sum_xy = values @ values.T
+    with np.errstate(invalid="ignore", divide="ignore"):
+        var_x = n * sum_xx - sum_x ** 2
+        var_y = n * sum_yy - sum_y ** 2
+        cov = n * sum_xy - sum_x * sum_y
+        slope = cov / var_x
+        intercept = (sum_y - slope * sum_x) / n
+        r2 = cov ** 2 / (var_x * var_y)
+    usable = (n >= min_overlap) & (var_x > 0) & (var_y > 0) & np.isfinite(r2)
+    pair_weights = np.where(usable, r2, 0.0)
+    if weights is not None:
+        pair_weights = pair_weights * weights
+    np.fill_diagonal(pair_weights, 0.0)
+    slope = np.where(usable, slope, 0.0)
+    intercept = np.where(usable, intercept, 0.0)
+    weight_sum = pair_weights @ valid
+    estimate = (pair_weights * intercept) @ valid + (pair_weights * slope) @ values
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(weight_sum > 0, estimate / weight_sum, np.nan)
+
+
+def _estimate_climatology(matrix: np.ndarray, valid: np.ndarray, dates: pd.DatetimeIndex):
+    """站点自身的逐日(年内第几天)多年平均值"""
+    doy = dates.dayofyear.to_numpy() - 1
+    n_stations = matrix.shape[0]
+    # 以 站点编号*366+年内日序 为键分组求和，避免构造 天数×366 的矩阵
+    keys = (np.arange(n_stations)[:, None] * 366 + doy[None, :])[valid]
+    sums = np.bincount(keys, weights=matrix[valid], minlength=n_stations * 366).reshape(n_stations, 366)
+    counts = np.bincount(keys, minlength=n_stations * 366).reshape(n_stations, 366)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        climatology = np.where(counts > 0, sums / counts, np.nan)
+    return climatology[:, doy]
+
+
+def fill_missing_values_spatial(df,
+                                station_2_coord: Dict[str, Tuple[float, float]] = None,
+                                method: Union[str, List[str]] = "idw",
+                                station_column: str = "f1",
+                                data_col='f8',
+                                year_col='f5',
+                                month_col='f6',
+                                day_col='f7',
+                                stations: List[str] = None,
+                                max_gap_length: int = None,
+                                power: float = 2.0,
+                                max_neighbors: int = None,
+                                min_overlap: int = 30):
+    """
+    基于多个站点的缺失值填充，适用于长时间缺测。数据整理为 站点数×天数 的矩阵后一次性计算所有站点。
+    1. idw：邻近站点同一天数值的反距离加权平均，需要站点坐标。
+    2. regression：邻近站点线性回归估计，以r²加权，提供站点坐标时再乘以反距离权重。
+    3. climatology：站点自身的逐日多年平均值。
+    method为列表时按顺序使用，前一种方法无法填充的缺失由后一种方法填充。
+    :param df: 输入的数据集
+    :param station_2_coord: 站点到(纬度, 经度)的字典，单位为十进制角度
+    :param method: 填充方法或方法列表
+    :param station_column: 站点列的列名
+    :param data_col: 需要填充缺失值的列名
+    :param year_col: 年份列名称
+    :param month_col: 月份列名称
+    :param day_col: 天列名称
+    :param stations: 参与计算及需要填充的站点列表，为None时使用所有站点
+    :param max_gap_length: 最大填充的连续缺失天数，更长的连续缺失保持为空，为None时不限制
+    :param power: 反距离权重的幂指数
+    :param max_neighbors: 每个站点最多使用的邻近站点数，为None时使用所有站点
+    :param min_overlap: 回归时两站点最少的共同有效天数
+    :return: 填充后的数据，行顺序和索引不变
+    """
+    methods = [method] if isinstance(method, str) else list(method)
+    for name in methods:
+        if name not in FILL_POLICIES or name == "mean":
+            raise ValueError(f"不支持的填充方法{name}，可选: idw, regression, climatology")
+    if "idw" in methods and station_2_coord is None:
+        raise ValueError("idw方法需要站点坐标station_2_coord")
+
+    df["time"] = pd.to_datetime(pd.DataFrame({"year": df[year_col], "month": df[month_col], "day": df[day_col]}))
+    if stations is not None:
+        if not isinstance(stations, list):
+            stations = [stations]
+        rows = np.flatnonzero(df[station_column].isin([int(station) for station in stations]).to_numpy())
+    else:
+        rows = np.flatnonzero(df[station_column].notna().to_numpy())
+    if len(rows) == 0:
+        return df
+
+    # 站点数×天数矩阵，文件中没有的日期同样视为缺失
+    station_codes, station_keys = pd.factorize(df[station_column].to_numpy()[rows], sort=True)
+    days = df["time"].to_numpy()[rows].astype("datetime64[D]")
+    start = days.min()
+    day_codes = (days - start).astype(np.int64)
+    dates = pd.date_range(pd.Timestamp(start), periods=day_codes.max() + 1, freq="D")
+    matrix = np.full((len(station_keys), len(dates)), np.nan)
+    matrix[station_codes, day_codes] = df[data_col].to_numpy(dtype="float64")[rows]
+    missing = np.isnan(matrix)
+    if not missing.any():
+        return df
+
+    filled = matrix.copy()
+    weights = None
+    if station_2_coord is not None and len(station_keys) > 1:
+        weights = _distance_weights(station_keys, station_2_coord, power, max_neighbors)
+    for name in methods:
+        # 每种方法只使用原始观测值估计，避免填充值相互传递
+        valid = ~missing
+        if name == "idw":
+            estimate = _estimate_idw(matrix, valid, weights) if weights is not None else np.full_like(matrix, np.nan)
+        elif name == "regression":
+            estimate = _estimate_regression(matrix, valid, weights, min_overlap)
+        else:
+            estimate = _estimate_climatology(matrix, valid, dates)
+        todo = np.isnan(filled)
+        filled[todo] = estimate[todo]
+
+    if max_gap_length is not None:
+        new_group = np.zeros(missing.shape, dtype=bool)
+        new_group[:, 0] = True
+        gap_length = _gap_lengths(missing.ravel(), new_group.ravel()).reshape(missing.shape)
+        filled[gap_length > max_gap_length] = np.nan
+
+    row_values = filled[station_codes, day_codes]
+    row_missing = missing[station_codes, day_codes]
+    column = df.columns.get_loc(data_col)
+    df.iloc[rows[row_missing], column] = row_values[row_missing]
+    return df
+
+
+def _spatial_methods(policy: Union[str, List[str]]):
+    """拆分填充策略：返回空间方法列表和是否最后使用站点自身前后值填充，"mean"只能作为最后一种方法"""
+    policies = [policy] if isinstance(policy, str) else list(policy)
+    if "mean" in policies[:-1]:
+        raise ValueError(f"填充策略{policies}中mean之后的方法不会生效，mean只能作为最后一种方法")
+    return [name for name in policies if name != "mean"], "mean" in policies
+
+
+def fill_missing_values_bypolicy(df, policy: Union[str, List[str]] = "mean", **kwargs):
+    """
+    按指定的策略填充缺失值
+    :param df: 输入的数据集
+    :param policy: "mean"使用fill_missing_values_bymean(站点自身前后值)，
+                   "idw"、"regression"、"climatology"或它们的列表使用fill_missing_values_spatial，
+                   列表最后为"mean"时空间方法无法填充的缺失再由站点自身前后值填充，例如["idw", "mean"]
+    :param kwargs: 对应填充函数的参数，如station_column、data_col、stations、max_gap_length、station_2_coord
+    :return: 填充后的数据
+    """
+    methods, by_mean = _spatial_methods(policy)
+    if methods:
+        df = fill_missing_values_spatial(df, method=methods, **kwargs)
+    if by_mean:
+        # 站点自身前后值填充不使用空间参数
+        mean_kwargs = {key: value for key, value in kwargs.items()
+                       if key not in ("station_2_coord", "power", "max_neighbors", "min_overlap")}
+        df = fill_missing_values_bymean(df, **mean_kwargs)
+    return df
+
+
+def fill_station_frames(station_frames, data_col: str, policy: Union[str, List[str]] = "mean",
+                        station_2_coord: Dict[str, Tuple[float, float]] = None, max_gap_length: int = None,
+                        station_column: str = "f1"):
+    """
+    按填充策略中的空间方法一次填充所有站点的缺失值，供逐站点计算的驱动函数使用。
+    空间方法需要同时使用所有站点，此时所有站点的数据同时保留在内存中；
+    策略只有"mean"时原样逐个返回，站点自身前后值的填充仍在站点计算中完成。
+    :param station_frames: 依次返回(站点编号, 站点数据)的可迭代对象，例如iter_station_frames的结果
+    :param data_col: 需要填充缺失值的列名
+    :param policy: 填充策略，见fill_missing_values_bypolicy
+    :param station_2_coord: 站点到(纬度, 经度)的字典，单位为十进制角度
+    :param max_gap_length: 最大填充的连续缺失天数，更长的连续缺失保持为空，为None时不限制
+    :param station_column: 站点列的列名
+    :return: 生成器，按原顺序依次返回(站点编号, 填充后的站点数据)
+    """
+    methods, _ = _spatial_methods(policy)
+    if not methods:
+        yield from station_frames
+        return
+    station_frames = list(station_frames)
+    frames = [station_df for _, station_df in station_frames if not station_df.empty]
+    groups = {}
+    if frames:
+        filled = fill_missing_values_spatial(pd.concat(frames), station_2_coord=station_2_coord, method=methods,
+                                             station_column=station_column, data_col=data_col,
+                                             max_gap_length=max_gap_length)
+        for station, index in filled.groupby(station_column, sort=False).indices.items():
+            groups[int(station)] = filled.iloc[index]
+    for station, station_df in station_frames:
+        yield station, groups.get(int(station), station_df)
+
+
 def fill_missing_values(df,
                         data_col='f8',
                         year_col='f5',
@@ -0,0 +1,202 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import wdmtoolbox.wdmtoolbox as wdm
+from benchmark_hspf_met import BenchmarkData, write_synthetic_inputs, station_latitudes
+from Metcalalg import DisPET, DisSolar, DisTemp, DistFixed, DistTriang, PanEvaporationValueComputedByHamon, \
+    PanEvaporationValueComputedByPenman
+from MetDataset import MetDataset
+from MetMemo import ResultMemo, set_default_memo
+from MetInstrument import set_quiet
+from hspf_met import build_hspf_pipeline
+
+"""
+合成数据回归测试：使用benchmark_hspf_met生成的CMA格式输入
+1. 逐小时分解(DisTemp、DisSolar、DisPET、DistTriang、DistFixed)和Hamon、Penman蒸发与原始实现的结果一致，
+   逐个站点计算和MetDataset批量计算都要检查
+2. 追加模式的结果与重新完整计算的结果一致
+3. 结果缓存命中时返回与未命中时相同的结果
+"""
+
+STATIONS = 3
+YEARS = 2
+SEED = 0
+
+# 原始实现(逐行apply/循环版本)在相同合成输入上的结果：
+# 长度、最后一个时刻、和、平方和、按小时位置加权的和，起始时刻都为1990-01-01 00:00
+EXPECTED = {
+    '50000': {
+        'Hamon': (730, '1991-12-31 00:00:00', 80.75604033323538, 11.88628764642007, 1011.3454697409151),
+        'Penman': (730, '1991-12-31 00:00:00', 129.04048050194734, 26.43984395584769, 1611.3186740772578),
+        'DisTemp': (17520, '1991-12-31 23:00:00', 1184937.9762000002, 83173837.46459244, 15275384.3022),
+        'DisSolar': (17497, '1991-12-31 00:00:00', 261936.40673670152, 10278417.402454346, 3143236.880840419),
+        'DisPET': (17497, '1991-12-31 00:00:00', 80.5692090764694, 1.0577271814795792, 966.8305089176329),
+        'DistTriang': (17520, '1991-12-31 23:00:00', 69.474446965, 18.468946637453858, 844.7202643600001),
+        'DistFixed': (17520, '1991-12-31 23:00:00', 69.474446965, 1.6553729683353855, 868.4305870625),
+    },
+    '50001': {
+        'Hamon': (730, '1991-12-31 00:00:00', 78.02344138814185, 10.481697782909118, 980.5707486867627),
+        'Penman': (730, '1991-12-31 00:00:00', 127.34641033563425, 26.027243051110492, 1580.2370557930433),
+        'DisTemp': (17520, '1991-12-31 23:00:00', 1184111.8086, 83046178.3945758, 15258483.4866),
+        'DisSolar': (17497, '1991-12-31 00:00:00', 263000.5113044068, 10363223.385358233, 3156006.135652882),
+        'DisPET': (17497, '1991-12-31 00:00:00', 78.03817921860548, 0.9722246079504512, 936.4581506232655),
+        'DistTriang': (17520, '1991-12-31 23:00:00', 64.667357755, 16.2342323947108, 790.0512898100001),
+        'DistFixed': (17520, '1991-12-31 23:00:00', 64.667357755, 1.4552573415631955, 808.3419719374999),
+    },
+    '50002': {
+        'Hamon': (730, '1991-12-31 00:00:00', 76.59458972269816, 9.775521961050671, 957.6192718253526),
+        'Penman': (730, '1991-12-31 00:00:00', 127.46138261814146, 25.876306844215954, 1578.2965898228586),
+        'DisTemp': (17520, '1991-12-31 23:00:00', 1185152.7252, 83041004.10307884, 15268652.7702),
+        'DisSolar': (17497, '1991-12-31 00:00:00', 264979.57761401136, 10628378.832757777, 3179754.931368136),
+        'DisPET': (17497, '1991-12-31 00:00:00', 76.70779714566335, 0.9260595166976593, 920.49356574796),
+        'DistTriang': (17520, '1991-12-31 23:00:00', 66.59452415000001, 17.092254382530275, 812.581925235),
+        'DistFixed': (17520, '1991-12-31 23:00:00', 66.59452415000001, 1.5287131980153439, 832.431551875),
+    },
+}
+
+
+def fingerprint(values) -> tuple:
+    a = np.asarray(values, dtype="float64")
+    weights = np.arange(len(a)) % 24 + 1
+    return float(np.nansum(a)), float(np.nansum(a * a)), float(np.nansum(a * weights))
+
+
+def check_expected(station: str, name: str, result):
+    """result为单列DataFrame或Series，与原始实现结果的指纹比较"""
+    series = result.iloc[:, 0] if isinstance(result, pd.DataFrame) else result
+    length, end, *expected = EXPECTED[station][name]
+    assert len(series) == length
+    assert series.index[0] == pd.Timestamp("1990-01-01")
+    assert series.index[-1] == pd.Timestamp(end)
+    assert fingerprint(series) == pytest.approx(tuple(expected), rel=1e-12)
+
+
+@pytest.fixture(scope="module")
+def synthetic(tmp_path_factory):
+    data = BenchmarkData(str(tmp_path_factory.mktemp("synthetic")), STATIONS, YEARS, missing_rate=0.02,
+                         special_rate=0.02, seed=SEED)
+    data.load()
+    return data
+
+
+def station_outputs(data: BenchmarkData, station: str) -> dict:
+    daily, lat = data.daily[station], data.latitudes[station]
+    devt = PanEvaporationValueComputedByHamon(daily["TMIN"], daily["TMAX"], True, lat)
+    return {
+        "Hamon": devt,
+        "Penman": PanEvaporationValueComputedByPenman(daily["TMIN"], daily["TMAX"], daily["DPTP"], daily["DWND"],
+                                                      daily["DSOL"]),
+        "DisTemp": DisTemp(daily["TMIN"], daily["TMAX"], 24),
+        "DisSolar": DisSolar(daily["DSOL"], lat),
+        "DisPET": DisPET(devt, "DEVT", lat),
+        "DistTriang": DistTriang(daily["PREC"]),
+        "DistFixed": DistFixed(daily["PREC"]),
+    }
+
+
+def test_station_outputs_match_original(synthetic):
+    for station in synthetic.station_ids:
+        for name, result in station_outputs(synthetic, station).items():
+            check_expected(station, name, result)
+
+
+def test_dataset_outputs_match_original(synthetic):
+    daily = synthetic.daily
+    stations = synthetic.station_ids
+    ds = MetDataset.from_variables({tstype: {station: daily[station][tstype] for station in stations}
+                                    for tstype in ("TMIN", "TMAX", "DPTP", "DWND", "DSOL", "PREC")},
+                                   stations, latitudes=synthetic.latitudes)
+    prec = ds.derive({"PREC": ds["PREC"]})
+    devt = PanEvaporationValueComputedByHamon(ds, ds, True, None)
+    outputs = {
+        "Hamon": devt,
+        "Penman": PanEvaporationValueComputedByPenman(ds, ds, ds, ds, ds),
+        "DisTemp": DisTemp(ds, ds, 24),
+        "DisSolar": DisSolar(ds, None),
+        "DisPET": DisPET(devt, "DEVT", None),
+        "DistTriang": DistTriang(prec),
+        "DistFixed": DistFixed(prec),
+    }
+    for station in stations:
+        for name, result in outputs.items():
+            check_expected(station, name, result.station_frame(station))
+
+
+def test_dist_fixed_weights(synthetic):
+    weights = np.arange(1.0, 25.0)
+    for station in synthetic.station_ids:
+        prec = synthetic.daily[station]["PREC"]
+        expected = prec.iloc[:, 0].to_numpy()[:, None] * (weights / weights.sum())[None, :]
+        result = DistFixed(prec, weights)
+        np.testing.assert_allclose(result.to_numpy(), expected.ravel(), rtol=1e-15)
+        assert result.sum() == pytest.approx(EXPECTED[station]["DistFixed"][2], rel=1e-12)
+
+
+def run_pipeline(wdmpath: str, paths: dict, stations: list, append: bool = False):
+    build_hspf_pipeline(wdmpath=wdmpath, stations=stations, station_2_latDeg=station_latitudes(
+        [int(station) for station in stations], SEED), tempfile=paths["temp"], windfile=paths["win"],
+                        ssdfile=paths["ssd"], rhumfile=paths["rhu"], radifile=paths["radi"],
+                        precipfile=paths["pre"], append=append).run()
+
+
+def test_append_matches_full_run(tmp_path):
+    stations = [50000, 50001]
+    station_ids = [str(station) for station in stations]
+    paths = write_synthetic_inputs(str(tmp_path / "full"), stations, YEARS, seed=SEED)
+    # 截止到第二年年中的输入，模拟上一次处理时的数据
+    cut_dir = tmp_path / "cut"
+    cut_dir.mkdir()
+    cut_paths = {}
+    for kind, path in paths.items():
+        df = pd.read_csv(path)
+        dates = pd.to_datetime(pd.DataFrame({"year": df["f5"], "month": df["f6"], "day": df["f7"]}))
+        cut_paths[kind] = str(cut_dir / os.path.basename(path))
+        df[(dates < "1991-07-01").to_numpy()].to_csv(cut_paths[kind], index=False)
+
+    set_quiet(True)
+    try:
+        full_wdm = str(tmp_path / "full.wdm")
+        append_wdm = str(tmp_path / "append.wdm")
+        run_pipeline(full_wdm, paths, station_ids)
+        run_pipeline(append_wdm, cut_paths, station_ids)
+        run_pipeline(append_wdm, paths, station_ids, append=True)
+    finally:
+        set_quiet(False)
+
+    dsns = sorted(wdm.listdsns(full_wdm))
+    assert dsns == sorted(wdm.listdsns(append_wdm))
+    assert len(dsns) == 16 * len(stations)
+    for dsn in dsns:
+        full = wdm.extract(full_wdm, dsn)
+        appended = wdm.extract(append_wdm, dsn)
+        pd.testing.assert_index_equal(appended.index, full.index)
+        np.testing.assert_array_equal(appended.to_numpy(), full.to_numpy(), err_msg=f"DSN {dsn}")
+
+
+def test_memo_hit_matches_miss(synthetic, tmp_path):
+    station = synthetic.station_ids[0]
+    daily = synthetic.daily[station]
+    direct = DisTemp(daily["TMIN"], daily["TMAX"], 24)
+    memo = ResultMemo(str(tmp_path / "memo"))
+    set_default_memo(memo)
+    try:
+        missed = DisTemp(daily["TMIN"], daily["TMAX"], 24)
+        assert (memo.hits, memo.misses) == (0, 1)
+        hit = DisTemp(daily["TMIN"], daily["TMAX"], 24)
+        assert (memo.hits, memo.misses) == (1, 1)
+        # 参数不同时不命中
+        DisTemp(daily["TMIN"], daily["TMAX"], 18)
+        assert (memo.hits, memo.misses) == (1, 2)
+        # 同一缓存目录的新实例读取磁盘上的结果
+        reopened = ResultMemo(str(tmp_path / "memo"))
+        set_default_memo(reopened)
+        from_disk = DisTemp(daily["TMIN"], daily["TMAX"], 24)
+        assert (reopened.hits, reopened.misses) == (1, 0)
+    finally:
+        set_default_memo(None)
+    pd.testing.assert_frame_equal(missed, direct)
+    pd.testing.assert_frame_equal(hit, direct)
+    pd.testing.assert_frame_equal(from_disk, direct)
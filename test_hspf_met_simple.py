@@ -9,12 +9,9 @@ import wdmtoolbox.wdmtoolbox as wdm
 from wdmtoolbox import wdmutil
 from Metcal import *
 from missingfill import *
-from pandarallel import pandarallel
 
 from hspf_met import *
 
-pandarallel.initialize(verbose=0)
-
 if __name__ == '__main__':
     #数据信息
     target_stations = ['59843', '59848', '59851', '59854']
@@ -34,7 +31,7 @@ if __name__ == '__main__':
         # ============================逐日数据==================================
         # DSN:19.最大温度
         print("处理最大温度数据...")
-        temp_df = metTmax(inputfile=tempfile, data_col='f10', stations=target_stations, invalid_value=invalid_value, wdmpath=wdmpath)
+        metTmax(inputfile=tempfile, data_col='f10', stations=target_stations, invalid_value=invalid_value, wdmpath=wdmpath)
         print("✓ 最大温度处理成功")
 
         # DSN:20.最小温度
@@ -0,0 +1,31 @@
+import MetMemo
+import Metcalalg
+from MetMemo import ResultMemo, _func_token, _project_modules
+
+"""
+结果缓存的函数标识测试：依赖的项目模块源码变化时旧结果不再命中
+"""
+
+
+def test_project_modules_include_dependencies():
+    names = [module.__name__ for module in _project_modules(Metcalalg)]
+    assert names == sorted(names)
+    for name in ("Metcalalg", "MetUtils", "MetDataset"):
+        assert name in names
+    # 第三方库不属于项目模块
+    assert "numpy" not in names and "pandas" not in names
+
+
+def test_dependency_change_invalidates_key(monkeypatch, tmp_path):
+    memo = ResultMemo(str(tmp_path))
+    source_hash = MetMemo._source_hash
+    monkeypatch.setattr(MetMemo, "_module_tokens", {})
+    token = _func_token(Metcalalg.DisTemp)
+    key = memo.key(Metcalalg.DisTemp, (1.0, 2.0, 24))
+    for edited in ("MetUtils", "MetDataset"):
+        # 只修改依赖模块的源码，函数所在模块Metcalalg不变
+        monkeypatch.setattr(MetMemo, "_module_tokens", {})
+        monkeypatch.setattr(MetMemo, "_source_hash",
+                            lambda module: "edited" if module.__name__ == edited else source_hash(module))
+        assert _func_token(Metcalalg.DisTemp) != token
+        assert memo.key(Metcalalg.DisTemp, (1.0, 2.0, 24)) != key
@@ -0,0 +1,36 @@
+import os
+
+import pandas as pd
+
+from MetReader import build_station_cache
+
+"""
+输入缓存测试：重建缓存时只删除同一输入文件的旧版本
+"""
+
+
+def write_input(path, value: int):
+    pd.DataFrame({"f1": [59843, 59848], "f5": 2020, "f6": 1, "f7": 1, "f8": [value, value + 1]}).to_csv(path,
+                                                                                                        index=False)
+
+
+def test_rebuild_keeps_other_inputs(tmp_path):
+    pre = str(tmp_path / "pre.csv")
+    pre_2019 = str(tmp_path / "pre.csv.2019")
+    write_input(pre, 1)
+    write_input(pre_2019, 2)
+    old_cache, _ = build_station_cache(pre)
+    other_cache, _ = build_station_cache(pre_2019)
+
+    write_input(pre, 10)
+    stat = os.stat(pre)
+    os.utime(pre, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+    new_cache, manifest = build_station_cache(pre)
+
+    assert new_cache != old_cache
+    assert manifest["source"] == os.path.abspath(pre)
+    assert not os.path.exists(old_cache)
+    assert os.path.isdir(new_cache)
+    assert os.path.isdir(other_cache)
+    # 其他文件的缓存仍然可以直接使用
+    assert build_station_cache(pre_2019)[0] == other_cache
@@ -0,0 +1,184 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from MetMemo import ResultMemo, set_default_memo
+from missingfill import fill_missing_values_bymean, fill_missing_values_bypolicy, fill_missing_values_spatial, \
+    fill_station_frames, _estimate_climatology
+
+"""
+缺失值填充策略测试：idw、regression、climatology及其组合、max_gap_length、逐站点驱动函数使用的fill_station_frames
+"""
+
+STATIONS = [59843, 59848, 59851]
+COORDS = {'59843': (19.7333, 109.0), '59848': (19.2333, 109.5), '59851': (19.7, 110.3)}
+
+
+def make_frame(values: dict, start: str = "2020-01-01"):
+    """由 站点->逐日数值 构造CMA格式的数据，f1为站点，f5/f6/f7为年月日，f8为数据"""
+    frames = []
+    for station, station_values in values.items():
+        dates = pd.date_range(start, periods=len(station_values), freq="D")
+        frames.append(pd.DataFrame({"f1": station, "f5": dates.year, "f6": dates.month, "f7": dates.day,
+                                    "f8": np.asarray(station_values, dtype="float64")}))
+    return pd.concat(frames, ignore_index=True)
+
+
+def station_values(df: pd.DataFrame, station: int):
+    return df.loc[df["f1"] == station, "f8"].to_numpy()
+
+
+def test_idw_uses_inverse_distance_weights():
+    df = make_frame({59843: [1.0, np.nan, 3.0], 59848: [2.0, 4.0, 6.0], 59851: [3.0, 8.0, 9.0]})
+    filled = fill_missing_values_spatial(df.copy(), station_2_coord=COORDS, method="idw")
+    distances = []
+    for station in ("59848", "59851"):
+        lat1, lon1 = np.radians(COORDS["59843"])
+        lat2, lon2 = np.radians(COORDS[station])
+        h = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+        distances.append(2 * 6371.0 * np.arcsin(np.sqrt(h)))
+    weights = np.array(distances) ** -2.0
+    expected = (weights * [4.0, 8.0]).sum() / weights.sum()
+    np.testing.assert_allclose(station_values(filled, 59843), [1.0, expected, 3.0])
+    # 其他站点没有缺失，保持不变
+    np.testing.assert_array_equal(station_values(filled, 59848), [2.0, 4.0, 6.0])
+
+
+def test_idw_requires_coordinates():
+    df = make_frame({59843: [1.0, np.nan], 59848: [2.0, 4.0]})
+    with pytest.raises(ValueError):
+        fill_missing_values_spatial(df, method="idw")
+
+
+def test_regression_recovers_linear_relation():
+    rng = np.random.default_rng(0)
+    base = rng.normal(20, 5, 60)
+    target = 2.0 * base + 1.0
+    target[30] = np.nan
+    df = make_frame({59843: base, 59848: target})
+    filled = fill_missing_values_spatial(df, method="regression", min_overlap=30)
+    np.testing.assert_allclose(station_values(filled, 59848)[30], 2.0 * base[30] + 1.0)
+
+
+def test_regression_needs_min_overlap():
+    base = np.arange(10, dtype="float64")
+    target = base * 3.0
+    target[5] = np.nan
+    df = make_frame({59843: base, 59848: target})
+    filled = fill_missing_values_spatial(df, method="regression", min_overlap=30)
+    assert np.isnan(station_values(filled, 59848)[5])
+
+
+def test_climatology_is_day_of_year_mean():
+    dates = pd.date_range("2019-01-01", "2021-12-31", freq="D")
+    values = dates.dayofyear.to_numpy().astype("float64") + (dates.year.to_numpy() - 2019) * 10.0
+    missing = dates.get_loc(pd.Timestamp("2021-03-01"))
+    values[missing] = np.nan
+    df = make_frame({59843: values}, start="2019-01-01")
+    filled = fill_missing_values_spatial(df, method="climatology")
+    # 2019、2020年同一年内日序的平均值，2020年为闰年，3月1日的年内日序与2019年不同
+    doy = dates[missing].dayofyear
+    same_doy = (dates.dayofyear == doy) & (dates.year < 2021)
+    np.testing.assert_allclose(station_values(filled, 59843)[missing], values[same_doy].mean())
+
+
+def test_climatology_matches_dense_reference():
+    rng = np.random.default_rng(1)
+    dates = pd.date_range("2018-06-01", periods=900, freq="D")
+    matrix = rng.normal(size=(4, len(dates)))
+    valid = rng.random(matrix.shape) > 0.3
+    doy = dates.dayofyear.to_numpy() - 1
+    onehot = np.zeros((len(dates), 366))
+    onehot[np.arange(len(dates)), doy] = 1.0
+    sums = np.where(valid, matrix, 0.0) @ onehot
+    counts = valid.astype("float64") @ onehot
+    with np.errstate(invalid="ignore", divide="ignore"):
+        expected = np.where(counts > 0, sums / counts, np.nan)[:, doy]
+    np.testing.assert_allclose(_estimate_climatology(matrix, valid, dates), expected, equal_nan=True)
+
+
+def test_methods_chain_in_order():
+    # 第3天由idw填充；第2天所有站点都缺测，idw无法填充，只有一年数据时climatology同样无法填充
+    df = make_frame({59843: [1.0, np.nan, np.nan, 5.0], 59848: [2.0, np.nan, 7.0, 4.0]})
+    filled = fill_missing_values_spatial(df.copy(), station_2_coord=COORDS, method=["idw", "climatology"])
+    np.testing.assert_allclose(station_values(filled, 59843), [1.0, np.nan, 7.0, 5.0])
+    np.testing.assert_allclose(station_values(filled, 59848), [2.0, np.nan, 7.0, 4.0])
+
+
+def test_climatology_fills_what_idw_cannot():
+    values = {59843: [1.0, 2.0, 3.0, 4.0], 59848: [5.0, 6.0, 7.0, 8.0]}
+    df = make_frame(values, start="2020-01-01")
+    df = pd.concat([df, make_frame({59843: [np.nan, 2.0, 3.0, 4.0], 59848: [np.nan, 6.0, 7.0, 8.0]},
+                                   start="2021-01-01")], ignore_index=True)
+    filled = fill_missing_values_spatial(df.copy(), station_2_coord=COORDS, method=["idw", "climatology"])
+    # 2021年1月1日两个站点都缺测，使用各站点2020年1月1日的数值
+    assert station_values(filled, 59843)[4] == 1.0
+    assert station_values(filled, 59848)[4] == 5.0
+
+
+def test_max_gap_length_keeps_long_gaps():
+    values = np.arange(1.0, 13.0)
+    gappy = values.copy()
+    gappy[2:4] = np.nan  # 2天缺测
+    gappy[6:10] = np.nan  # 4天缺测
+    df = make_frame({59843: gappy, 59848: values * 2})
+    filled = fill_missing_values_spatial(df, station_2_coord=COORDS, method="idw", max_gap_length=3)
+    result = station_values(filled, 59843)
+    np.testing.assert_allclose(result[2:4], values[2:4] * 2)
+    assert np.isnan(result[6:10]).all()
+
+    df = make_frame({59843: gappy})
+    filled = fill_missing_values_bypolicy(df, policy="mean", station_column="f1", data_col="f8", max_gap_length=3)
+    result = station_values(filled, 59843)
+    assert not np.isnan(result[2:4]).any()
+    assert np.isnan(result[6:10]).all()
+
+
+def test_policy_mean_and_chaining_with_mean():
+    df = make_frame({59843: [1.0, np.nan, 3.0, np.nan, np.nan, 6.0], 59848: [2.0, 4.0, 6.0, np.nan, np.nan, 9.0]})
+    by_mean = fill_missing_values_bypolicy(df.copy(), policy="mean", station_column="f1", data_col="f8",
+                                           station_2_coord=COORDS)
+    np.testing.assert_allclose(station_values(by_mean, 59843), [1.0, 2.0, 3.0, 6.0, 6.0, 6.0])
+
+    chained = fill_missing_values_bypolicy(df.copy(), policy=["idw", "mean"], station_column="f1", data_col="f8",
+                                           station_2_coord=COORDS)
+    # 第2天由idw填充，第4、5天两个站点都缺测，由站点自身前后值填充
+    np.testing.assert_allclose(station_values(chained, 59843), [1.0, 4.0, 3.0, 6.0, 6.0, 6.0])
+
+    with pytest.raises(ValueError):
+        fill_missing_values_bypolicy(df.copy(), policy=["mean", "idw"], station_2_coord=COORDS)
+
+
+def test_fill_station_frames():
+    df = make_frame({59843: [1.0, np.nan, 3.0], 59848: [2.0, 4.0, 6.0]})
+    frames = [(str(station), df[df["f1"] == station].copy()) for station in STATIONS[:2]]
+    frames.append(("59851", pd.DataFrame(columns=df.columns)))
+
+    # 只有mean时原样返回，填充在站点计算中完成
+    passed = list(fill_station_frames(iter(frames), "f8", policy="mean"))
+    assert [station for station, _ in passed] == ["59843", "59848", "59851"]
+    assert all(a is b for (_, a), (_, b) in zip(passed, frames))
+
+    filled = list(fill_station_frames(iter(frames), "f8", policy="idw", station_2_coord=COORDS))
+    assert [station for station, _ in filled] == ["59843", "59848", "59851"]
+    np.testing.assert_allclose(filled[0][1]["f8"].to_numpy(), [1.0, 4.0, 3.0])
+    np.testing.assert_array_equal(filled[0][1].index, frames[0][1].index)
+    assert filled[2][1].empty
+
+
+def test_bymean_does_not_modify_input(tmp_path):
+    df = make_frame({59843: [1.0, np.nan, 3.0, np.nan, np.nan, 6.0]})
+    original = df.copy()
+    memo = ResultMemo(str(tmp_path))
+    set_default_memo(memo)
+    try:
+        # 第一次未命中缓存，第二次命中，两次都不修改输入
+        missed = fill_missing_values_bymean(df, station_column="f1", data_col="f8", stations=[59843])
+        pd.testing.assert_frame_equal(df, original)
+        hit = fill_missing_values_bymean(df, station_column="f1", data_col="f8", stations=[59843])
+        pd.testing.assert_frame_equal(df, original)
+        assert (memo.hits, memo.misses) == (1, 1)
+    finally:
+        set_default_memo(None)
+    pd.testing.assert_frame_equal(hit, missed)
+    assert "time" in missed.columns
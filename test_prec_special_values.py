@@ -0,0 +1,39 @@
+import numpy as np
+import pandas as pd
+
+from MetUtils import PREC_SPECIAL_CODES, decode_prec_special_values, prec_special_values
+
+"""
+降水特殊值解码表(PREC_SPECIAL_CODES)的固定取值，编码含义见CMA逐日降水数据说明
+"""
+
+
+def test_decode_special_codes():
+    raw = np.array([32766, 32744, 32700, 31012, 30008, 32005])
+    decoded, flags = decode_prec_special_values(raw)
+    np.testing.assert_array_equal(decoded, [np.nan, np.nan, 0.0, 12.0, 8.0, 5.0])
+    np.testing.assert_array_equal(flags, [1, 2, 3, 5, 6, 4])
+
+
+def test_ordinary_values_unchanged():
+    raw = np.array([0, 1, 125, 3200, 3500, 29999])
+    decoded, flags = decode_prec_special_values(raw)
+    np.testing.assert_array_equal(decoded, raw.astype("float64"))
+    assert not flags.any()
+
+
+def test_series_input_and_scalar_wrapper():
+    decoded, _ = decode_prec_special_values(pd.Series([31012, 42]))
+    np.testing.assert_array_equal(decoded, [12.0, 42.0])
+    assert np.isnan(prec_special_values(32766))
+    assert prec_special_values(32700) == 0.0
+    assert prec_special_values(30008) == 8.0
+
+
+def test_first_matching_rule_wins():
+    # 32766在32000-32999的范围内，按表中顺序先匹配“缺测”
+    table = [rule for rule in PREC_SPECIAL_CODES if rule[0] == 32000] + list(PREC_SPECIAL_CODES)
+    decoded, _ = decode_prec_special_values(np.array([32766]), table)
+    assert decoded[0] == 766.0
+    decoded, _ = decode_prec_special_values(np.array([32766]))
+    assert np.isnan(decoded[0])